@@ -3,7 +3,7 @@ class BaseFilter(object):
     Base Filter class.
 
     All filters need to derive from it and implement their version of
-    filterArgs, accept, and optionally skipRemaining.
+    filterArgs, accept, and optionally accept_batch and skipRemaining.
 
     filterArgs needs to be a list of tuples with 2 elements each. The
     first tuple element is the filter argument, e.g. --xyz. The second
@@ -42,6 +42,16 @@ class BaseFilter(object):
         """
         return True
 
+    def accept_batch(self, logevents):
+        """
+        Process a list of lines.
+
+        Return a list with the result of accept() for each logevent.
+        Overwrite this method in subclass if a whole batch can be checked
+        faster than line by line.
+        """
+        return list(map(self.accept, logevents))
+
     def skipRemaining(self):
         """
         Skip remaining lines.
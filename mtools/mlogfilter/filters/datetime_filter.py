@@ -5,6 +5,7 @@ from dateutil.tz import tzutc
 from .base_filter import BaseFilter
 from mtools.util import OrderedDict
 from mtools.util.hci import DateTimeBoundaries
+from mtools.util.logfile import LogFile
 
 
 def custom_parse_dt(value):
@@ -135,20 +136,18 @@ class DateTimeFilter(BaseFilter):
         # define start_limit for mlogfilter's fast_forward method
         self.start_limit = self.fromDateTime
 
-        # for single logfile, get file seek position of `to` datetime
-        if (len(self.mlogfilter.args['logfile']) == 1 and not
-                self.mlogfilter.is_stdin):
+        # and end_limit to skip files that only contain later lines
+        if self.mlogfilter.args['to'] != 'end':
+            self.end_limit = self.toDateTime
 
-            if self.mlogfilter.args['to'] != "end":
-                # fast forward, get seek value, then reset file
-                logfile = self.mlogfilter.args['logfile'][0]
-                logfile.fast_forward(self.toDateTime)
-                self.seek_to = logfile.filehandle.tell()
-                logfile.filehandle.seek(0)
-            else:
-                self.seek_to = -1
-        else:
-            self.seek_to = False
+        # a single logfile only returns the lines between from and to (as
+        # bisected byte range), after the first line no more checks needed
+        logfiles = self.mlogfilter.args['logfile']
+        self.bounded = (len(logfiles) == 1 and not
+                        self.mlogfilter.is_stdin and not
+                        self.mlogfilter.args['exclude'] and not
+                        self.mlogfilter.args['follow'] and
+                        isinstance(logfiles[0], LogFile))
 
     def accept(self, logevent):
         """
@@ -157,10 +156,7 @@ class DateTimeFilter(BaseFilter):
         Overwrite BaseFilter.accept() and return True if the provided
         logevent should be accepted (causing output), or False if not.
         """
-        if self.fromReached and self.seek_to:
-            if self.seek_to != -1:
-                self.toReached = (self.mlogfilter.args['logfile'][0]
-                                  .filehandle.tell() >= self.seek_to)
+        if self.fromReached and self.bounded:
             return True
         else:
             # slow version has to check each datetime
@@ -182,6 +178,17 @@ class DateTimeFilter(BaseFilter):
             else:
                 return False
 
+    def accept_batch(self, logevents):
+        """
+        Process a list of lines.
+
+        Overwrite BaseFilter.accept_batch(), within the byte range of a
+        single logfile all lines after the first one are accepted.
+        """
+        if self.fromReached and self.bounded:
+            return [True] * len(logevents)
+        return BaseFilter.accept_batch(self, logevents)
+
     def skipRemaining(self):
         """
         Skip remaining lines.
@@ -121,6 +121,24 @@ class LogLineFilter(BaseFilter):
                                                     .args['planSummary'])
             self.active = True
 
+    def index_keys(self):
+        """
+        Return the sidecar index keys of the lines this filter accepts.
+
+        A line is only accepted if it has one key of each returned group, see
+        mtools.util.logindex.LogIndex.
+        """
+        groups = []
+        if self.namespaces:
+            groups.append(['namespace:' + ns for ns in self.namespaces])
+        if self.threads:
+            groups.append(['thread:' + t for t in self.threads])
+        if self.components:
+            groups.append(['component:' + c for c in self.components])
+        if self.pattern:
+            groups.append(['pattern:' + self.pattern])
+        return groups
+
     def accept(self, logevent):
         """
         Process line.
@@ -3,16 +3,41 @@
 import inspect
 import re
 import sys
+import time
 from datetime import MAXYEAR, MINYEAR, datetime, timedelta
 
 from dateutil.tz import tzutc
 
 import mtools.mlogfilter.filters as filters
+from mtools.util import OrderedDict
 from mtools.util.cmdlinetool import LogFileTool
+from mtools.util.input_source import batched
+from mtools.util.logfile import LogFile
+from mtools.util.logindex import LogIndex
+from mtools.util.mtbin import MtbinWriter
+from mtools.util.print_table import print_table
+from mtools.util.stats import StreamingStats, sample_note, scale_count
 
 
 class MLogFilterTool(LogFileTool):
 
+    # numeric logevent attributes that can be summarized with --stats
+    stats_fields = ['duration', 'nscanned', 'nscannedObjects', 'ntoreturn',
+                    'nreturned', 'ninserted', 'nupdated', 'ndeleted',
+                    'numYields', 'writeConflicts', 'r', 'w', 'bytesRead',
+                    'bytesWritten', 'timeReadingMicros', 'timeWritingMicros',
+                    'timeActiveMicros', 'timeInactiveMicros']
+
+    # logevent attributes that can be used as key for --group-by
+    group_fields = ['namespace', 'operation', 'command', 'thread', 'conn',
+                    'component', 'level', 'pattern', 'planSummary']
+
+    # seconds to wait between checks for new lines with --follow
+    follow_poll_interval = 1.0
+
+    # number of log events that are read and filtered at once
+    batch_size = 1000
+
     def __init__(self):
         LogFileTool.__init__(self, multiple_logfiles=True, stdin_allowed=True)
 
@@ -20,6 +45,9 @@ class MLogFilterTool(LogFileTool):
         self.filters = [c[1] for c in inspect.getmembers(filters,
                                                          inspect.isclass)]
 
+        # writer for --output-format mtbin
+        self._mtbin = None
+
         self.argparser.description = ('mongod/mongos log file parser. Use '
                                       'parameters to enable filters. A line '
                                       'only gets printed if it passes all '
@@ -71,6 +99,50 @@ class MLogFilterTool(LogFileTool):
                                                              'iso8601-local'],
                                     help=("choose datetime format for "
                                           "log output"))
+        self.argparser.add_argument('--count', action='store_true',
+                                    default=False,
+                                    help=('only output the number of '
+                                          'matching lines instead of the '
+                                          'lines themselves.'))
+        self.argparser.add_argument('--stats', action='store', nargs='?',
+                                    default=False, const='duration',
+                                    choices=self.stats_fields,
+                                    metavar='FIELD',
+                                    help=('only output count, min, max, '
+                                          'mean and percentiles of FIELD '
+                                          'over all matching lines '
+                                          '(default duration).'))
+        self.argparser.add_argument('--group-by', action='store',
+                                    default=None, choices=self.group_fields,
+                                    metavar='KEY',
+                                    help=('group the output of --count or '
+                                          '--stats by KEY, one of %s.'
+                                          % ', '.join(self.group_fields)))
+        self.argparser.add_argument('--follow', action='store_true',
+                                    default=False,
+                                    help=('keep watching the log file(s) for '
+                                          'new lines, like tail -F. Handles '
+                                          'log rotation. Without --from, '
+                                          'only new lines are shown.'))
+        self.argparser.add_argument('--output-format', action='store',
+                                    default='text',
+                                    choices=['text', 'mtbin'],
+                                    help=('output format. mtbin is a binary '
+                                          'format with the already parsed '
+                                          'lines and the bounds of the log '
+                                          'file, for piping into other '
+                                          'mtools, e.g. mloginfo or '
+                                          'mplotqueries.'))
+        self.argparser.add_argument('--build-index', action='store_true',
+                                    default=False,
+                                    help=('build or update a sidecar index '
+                                          '(<logfile>.mtindex) of each log '
+                                          'file. A fresh index is used to '
+                                          'only read the parts of the file '
+                                          'that can match --namespace, '
+                                          '--thread, --component or '
+                                          '--pattern.'))
+        self._add_sample_arguments()
 
     def addFilter(self, filterclass):
         """Add a filter class to the parser."""
@@ -100,6 +172,9 @@ class MLogFilterTool(LogFileTool):
             logevent._reformat_timestamp(self.args['timestamp_format'],
                                          force=True)
 
+        if self._mtbin:
+            self._mtbin.write(logevent)
+            return
         if self.args['json']:
             print(logevent.to_json(self.args['pretty']))
             return
@@ -115,6 +190,95 @@ class MLogFilterTool(LogFileTool):
 
         print(line)
 
+    def _aggregateLine(self, logevent):
+        """
+        Add the line to the --count / --stats aggregates.
+
+        The line is never formatted, only the group key and (for --stats)
+        the summarized field are extracted.
+        """
+        if self.args['group_by']:
+            key = getattr(logevent, self.args['group_by'])
+        else:
+            key = None
+
+        if key not in self._aggregates:
+            self._aggregates[key] = [0, StreamingStats()]
+        aggregate = self._aggregates[key]
+        aggregate[0] += 1
+
+        if self.args['stats']:
+            value = getattr(logevent, self.args['stats'])
+            if value is not None:
+                aggregate[1].add(value)
+
+    def _sampleFraction(self):
+        """Return the fraction of all log files covered by sampling."""
+        sampled = total = 0
+        for logfile in self.args['logfile']:
+            if getattr(logfile, 'sample_fraction', None) is None:
+                return None
+            file_sampled, file_total = logfile.sample_counts
+            sampled += file_sampled
+            total += file_total
+        if not total:
+            return None
+        return min(1., float(sampled) / total)
+
+    def _printAggregates(self):
+        """Print the result of --count or --stats."""
+        group_by = self.args['group_by']
+        fraction = self._sampleFraction()
+        sampled = fraction is not None and fraction < 1
+
+        if not self.args['stats'] and not group_by:
+            count = self._aggregates[None][0] if self._aggregates else 0
+            if sampled:
+                estimate, margin = scale_count(count, fraction)
+                print('%i +/- %i' % (round(estimate), round(margin)))
+                print(sample_note(fraction))
+            else:
+                print(count)
+            return
+
+        table_rows = []
+        for key, (count, stats) in sorted(self._aggregates.items(),
+                                          key=lambda x: x[1][0],
+                                          reverse=True):
+            row = OrderedDict()
+            if group_by:
+                row[group_by] = key
+            if sampled:
+                estimate, margin = scale_count(count, fraction)
+                row['count'] = int(round(estimate))
+                row['+/-'] = int(round(margin))
+            else:
+                row['count'] = count
+            if self.args['stats']:
+                row['values'] = stats.count
+                total = stats.sum / fraction if sampled else stats.sum
+                for label, value in [('min', stats.min),
+                                     ('max', stats.max),
+                                     ('mean', stats.mean),
+                                     ('50%', stats.percentile(50)),
+                                     ('95%', stats.percentile(95)),
+                                     ('99%', stats.percentile(99)),
+                                     ('sum', total)]:
+                    row[label] = (round(value, 1)
+                                  if value is not None else '-')
+            table_rows.append(row)
+
+        if not table_rows:
+            print('no matching lines found.')
+            return
+
+        if self.args['stats']:
+            print("%s:" % self.args['stats'])
+        print_table(table_rows, uppercase_headers=False)
+        if sampled:
+            print('')
+            print(sample_note(fraction))
+
     def _msToString(self, ms):
         """Change milliseconds to hours min sec ms format."""
         hr, ms = divmod(ms, 3600000)
@@ -187,17 +351,18 @@ class MLogFilterTool(LogFileTool):
         return logevent.datetime or datetime(MINYEAR, 1, 1, 0, 0, 0, 0,
                                              tzutc())
 
-    def _merge_logfiles(self):
+    def _merge_logfiles(self, iterators=None):
         """Helper method to merge several files together by datetime."""
         # open files, read first lines, extract first dates
-        lines = [next(iter(logfile), None) for logfile in self.args['logfile']]
+        if iterators is None:
+            iterators = [iter(logfile) for logfile in self.args['logfile']]
+        lines = [next(it, None) for it in iterators]
 
         # adjust lines by timezone
+        shifts = self._timezone_shifts
         for i in range(len(lines)):
             if lines[i] and lines[i].datetime:
-                lines[i]._datetime = (lines[i].datetime +
-                                      timedelta(hours=self.args['timezone']
-                                                [i]))
+                lines[i]._datetime = lines[i].datetime + shifts[i]
 
         while any(lines):
             min_line = min(lines, key=self._datetime_key_for_merge)
@@ -209,14 +374,79 @@ class MLogFilterTool(LogFileTool):
             yield min_line
 
             # update lines array with a new line from the min_idx'th logfile
-            lines[min_idx] = next(iter(self.args['logfile'][min_idx]), None)
+            lines[min_idx] = next(iterators[min_idx], None)
             if lines[min_idx] and lines[min_idx].datetime:
-                lines[min_idx]._datetime = (
-                    lines[min_idx].datetime +
-                    timedelta(hours=self.args['timezone'][min_idx]))
+                lines[min_idx]._datetime = (lines[min_idx].datetime +
+                                            shifts[min_idx])
+
+    def _follow_logfiles(self, from_end):
+        """Helper method to follow growing files, merging new lines by time."""
+        logfiles = self.args['logfile']
+        if len(logfiles) == 1:
+            shift = self._timezone_shifts[0]
+            for logevent in logfiles[0].follow(self.follow_poll_interval,
+                                               from_end):
+                if shift and logevent.datetime:
+                    logevent._datetime = logevent.datetime + shift
+                yield logevent
+            return
 
-    def logfile_generator(self):
-        """Yield each line of the file, or the next line if several files."""
+        if not all(hasattr(logfile, 'poll') for logfile in logfiles):
+            raise SystemExit('Error: --follow with several inputs only '
+                             'supports single log files.')
+
+        if from_end:
+            for logfile in logfiles:
+                logfile.seek_end()
+
+        while True:
+            # poll all files in turn and merge whatever arrived since the
+            # last round
+            batches = [logfile.poll() for logfile in logfiles]
+            if any(batches):
+                for logevent in self._merge_logfiles([iter(batch) for batch
+                                                      in batches]):
+                    yield logevent
+            else:
+                time.sleep(self.follow_poll_interval)
+
+    def _build_indexes(self):
+        """Build or update the sidecar index of each log file."""
+        for logfile in self.args['logfile']:
+            if not isinstance(logfile, LogFile) or logfile.from_stdin:
+                raise SystemExit('Error: --build-index only supports log '
+                                 'files.')
+            index = LogIndex.load(logfile.name) or LogIndex(logfile.name)
+            try:
+                index.update()
+                index.save()
+            except OSError as e:
+                raise SystemExit('Error: cannot write index for %s: %s'
+                                 % (logfile.name, e))
+
+    def _iterate(self, logfile):
+        """Return the log file, or an iterator using its index if useful."""
+        if (self.args['exclude'] or not isinstance(logfile, LogFile) or
+                logfile.from_stdin or
+                any(self.args[a] is not None for a in
+                    ('sample', 'sample_lines', 'sample_seek'))):
+            return logfile
+
+        key_groups = []
+        for f in self.filters:
+            if hasattr(f, 'index_keys'):
+                key_groups.extend(f.index_keys())
+        if not key_groups:
+            return logfile
+
+        index = LogIndex.load(logfile.name)
+        if index is None or not index.is_fresh():
+            return logfile
+        return logfile.iter_ranges(index.ranges(key_groups))
+
+    def _set_limits(self):
+        """Limit the log files to the time range of the filters."""
+        start_limits = []
         if not self.args['exclude']:
             # ask all filters for a start_limit and fast-forward to the maximum
             start_limits = [f.start_limit for f in self.filters
@@ -226,9 +456,33 @@ class MLogFilterTool(LogFileTool):
                 for logfile in self.args['logfile']:
                     logfile.fast_forward(max(start_limits))
 
-        if len(self.args['logfile']) > 1:
+            # and for an end_limit to skip files that start after it
+            end_limits = [f.end_limit for f in self.filters
+                          if hasattr(f, 'end_limit')]
+
+            if end_limits:
+                for logfile in self.args['logfile']:
+                    logfile.set_end_limit(min(end_limits))
+
+        return start_limits
+
+    def logfile_generator(self):
+        """Yield each line of the file, or the next line if several files."""
+        start_limits = self._set_limits()
+
+        if self.args['follow']:
+            # without a start time, only show lines written from now on
+            for logevent in self._follow_logfiles(from_end=not start_limits):
+                try:
+                    yield logevent
+                except StopIteration:
+                    return
+
+        elif len(self.args['logfile']) > 1:
             # merge log files by time
-            for logevent in self._merge_logfiles():
+            for logevent in self._merge_logfiles(
+                    [iter(self._iterate(logfile))
+                     for logfile in self.args['logfile']]):
                 try:
                     yield logevent
                 except StopIteration:
@@ -236,16 +490,71 @@ class MLogFilterTool(LogFileTool):
 
         else:
             # only one file
-            for logevent in self.args['logfile'][0]:
-                if self.args['timezone'][0] != 0 and logevent.datetime:
-                    logevent._datetime = (logevent.datetime +
-                                          timedelta(hours=self
-                                                    .args['timezone'][0]))
+            shift = self._timezone_shifts[0]
+            for logevent in self._iterate(self.args['logfile'][0]):
+                if shift and logevent.datetime:
+                    logevent._datetime = logevent.datetime + shift
                 try:
                     yield logevent
                 except StopIteration:
                     return
 
+    def _event_batches(self):
+        """Yield lists of log events, see logfile_generator()."""
+        logfiles = self.args['logfile']
+        if (self.args['follow'] or len(logfiles) > 1 or
+                self.args['timezone'][0]):
+            # lines are adjusted one by one, and shown as soon as they
+            # arrive when following
+            size = 1 if self.args['follow'] else self.batch_size
+            return batched(self.logfile_generator(), size)
+
+        self._set_limits()
+        source = self._iterate(logfiles[0])
+        if source is logfiles[0]:
+            if hasattr(source, 'set_reuse_events'):
+                # lines are printed or aggregated before the next batch
+                source.set_reuse_events(self.batch_size)
+            return source.iter_batches(self.batch_size)
+        return batched(source, self.batch_size)
+
+    def _filterLines(self, aggregate):
+        """Ask each filter if it accepts a batch of lines and output them."""
+        follow = self.args['follow']
+        exclude = self.args['exclude']
+        for batch in self._event_batches():
+            masks = [f.accept_batch(batch) for f in self.filters]
+            if exclude:
+                # print line if any filter disagrees
+                accepted = [le for le, *mask in zip(batch, *masks)
+                            if not all(mask)]
+            elif masks:
+                # only print line if all filters agree
+                accepted = [le for le, *mask in zip(batch, *masks)
+                            if all(mask)]
+            else:
+                accepted = batch
+
+            for logevent in accepted:
+                if aggregate:
+                    self._aggregateLine(logevent)
+                else:
+                    self._outputLine(logevent, self.args['shorten'],
+                                     self.args['human'])
+
+            # if at least one filter refuses to accept any remaining
+            # lines, stop
+            if not exclude and any([f.skipRemaining() for f in self.filters]):
+                # if input is not stdin, or if following (the end would
+                # never be reached otherwise)
+                if sys.stdin.isatty() or follow:
+                    break
+
+            if follow and not aggregate:
+                sys.stdout.flush()
+                if self._mtbin:
+                    self._mtbin.flush()
+
     def run(self, arguments=None):
         """
         Parse the logfile.
@@ -274,6 +583,8 @@ class MLogFilterTool(LogFileTool):
             raise SystemExit('Error: Need at least 1 log file, either as '
                              'command line parameter or through stdin.')
 
+        self._setup_sample(self.args['logfile'])
+
         # handle timezone parameter
         if len(self.args['timezone']) == 1:
             self.args['timezone'] = (self.args['timezone'] *
@@ -287,6 +598,8 @@ class MLogFilterTool(LogFileTool):
                              'Use either one parameter (for global '
                              'adjustment) or the number of log files '
                              '(for individual adjustments).')
+        self._timezone_shifts = [timedelta(hours=hours)
+                                 for hours in self.args['timezone']]
 
         # create filter objects from classes and pass args
         self.filters = [f(self) for f in self.filters]
@@ -340,25 +653,43 @@ class MLogFilterTool(LogFileTool):
         if 'logfile' not in self.args or not self.args['logfile']:
             raise SystemExit('no logfile found.')
 
-        for logevent in self.logfile_generator():
-            if self.args['exclude']:
-                # print line if any filter disagrees
-                if any([not f.accept(logevent) for f in self.filters]):
-                    self._outputLine(logevent, self.args['shorten'],
-                                     self.args['human'])
-
-            else:
-                # only print line if all filters agree
-                if all([f.accept(logevent) for f in self.filters]):
-                    self._outputLine(logevent, self.args['shorten'],
-                                     self.args['human'])
+        # with --count or --stats, aggregate lines instead of printing them
+        aggregate = self.args['count'] or self.args['stats']
+        if aggregate:
+            self._aggregates = OrderedDict()
+        elif self.args['group_by']:
+            raise SystemExit('Error: --group-by requires --count or --stats.')
+
+        if self.args['follow'] and any(self.args[a] is not None for a in
+                                       ('sample', 'sample_lines',
+                                        'sample_seek')):
+            raise SystemExit('Error: --follow can not be combined with '
+                             'sampling.')
+
+        self._mtbin = None
+        if self.args['output_format'] == 'mtbin':
+            if aggregate or self.args['json']:
+                raise SystemExit('Error: --output-format mtbin can not be '
+                                 'combined with --json, --count or --stats.')
+            sys.stdout.flush()
+            self._mtbin = MtbinWriter(sys.stdout.buffer,
+                                      MtbinWriter.header_for(
+                                          self.args['logfile']))
+
+        if self.args['build_index']:
+            self._build_indexes()
 
-                # if at least one filter refuses to accept any
-                # remaining lines, stop
-                if any([f.skipRemaining() for f in self.filters]):
-                    # if input is not stdin
-                    if sys.stdin.isatty():
-                        break
+        try:
+            self._filterLines(aggregate)
+        except KeyboardInterrupt:
+            # the usual way to stop --follow, still print aggregates
+            if not self.args['follow']:
+                raise
+
+        if aggregate:
+            self._printAggregates()
+        if self._mtbin:
+            self._mtbin.flush()
 
 
 def main():
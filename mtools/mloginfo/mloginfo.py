@@ -1,15 +1,77 @@
 #!/usr/bin/env python3
 
+import contextlib
 import datetime
+import hashlib
 import inspect
+import io
+import multiprocessing
+import os
+import pickle
 import sys
+import tempfile
+import time
 
 import mtools.mloginfo.sections as sections
 from mtools.util.cmdlinetool import LogFileTool
+from mtools.util.logfile import LogFile
 from mtools.util.logformat import LogFormat
 
+# the tool, progress and byte ranges during a parallel run, inherited by
+# the forked worker processes, see MLogInfoTool._run_parallel() and
+# MLogInfoTool._process_ranges()
+_parallel = None
+
+
+def _file_report(index):
+    """Return the report of one log file, run in a worker process."""
+    tool, progress, _ = _parallel
+    tool.logfile = tool.args['logfile'][index]
+    tool._progress_slot = (progress, index)
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            tool._info()
+    except SystemExit as e:
+        # would terminate the worker instead of the tool
+        return out.getvalue(), e.code
+    return out.getvalue(), None
+
+
+def _range_partials(index):
+    """Return the partial section states of one byte range of a log file."""
+    tool, progress, ranges = _parallel
+    tool._progress_slot = (progress, index)
+    try:
+        return tool._partials(*ranges[index]), None
+    except SystemExit as e:
+        return None, e.code
+
+
 class MLogInfoTool(LogFileTool):
 
+    # seconds to wait between checks for new lines with --follow
+    follow_poll_interval = 1.0
+
+    # number of lines read at once when following a log file
+    follow_batch_size = 10000
+
+    # number of lines passed to the sections at once
+    batch_size = 1000
+
+    # minimum size in bytes of a log file to split it into byte ranges for
+    # --jobs
+    split_min_size = 16 * 1024 * 1024
+
+    # format version of --state-file, older states are ignored
+    state_version = 2
+
+    # arguments that do not change the saved section states
+    state_ignored_args = ('logfile', 'state_file', 'jobs', 'no_progressbar')
+
+    # number of bytes at the start of the log file that identify it
+    state_head_bytes = 4096
+
     def __init__(self):
         """Constructor: add description to argparser."""
         LogFileTool.__init__(self, multiple_logfiles=True, stdin_allowed=False)
@@ -22,12 +84,44 @@ class MLogInfoTool(LogFileTool):
         self.argparser.add_argument('--verbose', action='store_true',
                                     help=('show more verbose output '
                                           '(depends on info section)'))
+        self.argparser.add_argument('--follow', action='store', nargs='?',
+                                    type=float, default=None, const=10.,
+                                    metavar='SECONDS',
+                                    help=('keep watching the log file for '
+                                          'new lines and print updated '
+                                          'sections every SECONDS (default '
+                                          '10). Handles log rotation.'))
+        self.argparser.add_argument('--jobs', action='store', type=int,
+                                    default=1, metavar='N',
+                                    help=('process up to N log files, or '
+                                          'parts of a large log file, in '
+                                          'parallel, 0 for one per CPU '
+                                          '(default 1). The output is the '
+                                          'same as processing them one '
+                                          'after another.'))
+        self.argparser.add_argument('--state-file', action='store',
+                                    default=None, metavar='PATH',
+                                    help=('save the state of the sections '
+                                          'to PATH and only read the lines '
+                                          'added since the last run with '
+                                          'the same arguments. Starts over '
+                                          'if the log file was rotated or '
+                                          'truncated.'))
+
+        # shared progress of a log file or byte range in a worker process,
+        # see _run_parallel() and _process_ranges()
+        self._progress_slot = None
+
+        # byte range of the log file fed to the streaming sections, only
+        # the new lines with --state-file
+        self._byte_range = (0, None)
 
         inf = 'info sections'
         cmds = ('Below commands activate additional info sections for the '
                 'log file.')
         self.argparser_sectiongroup = self.argparser.add_argument_group(inf,
                                                                         cmds)
+        self._add_sample_arguments()
 
         # add all filter classes from the filters module
         self.sections = ([c[1](self)
@@ -38,82 +132,489 @@ class MLogInfoTool(LogFileTool):
         """Print useful information about the log file."""
         LogFileTool.run(self, arguments)
 
+        # a single input from stdin is not passed as list
+        if (self.args['logfile'] is not None and
+                not isinstance(self.args['logfile'], list)):
+            self.args['logfile'] = [self.args['logfile']]
+
         if (self.args['logfile'] is None or len(self.args['logfile']) == 0):
             self.argparser.print_usage()
             print("\nERROR: At least one logfile argument must be provided")
             self.argparser.exit()
 
+        self._setup_sample(self.args['logfile'])
+
+        if self.args['follow'] is not None:
+            self._check_follow()
+        if self.args['state_file'] is not None:
+            self._check_state_file()
+
+        jobs = self._jobs()
+        if jobs > 1:
+            self._run_parallel(jobs)
+            return
+
         for i, self.logfile in enumerate(self.args['logfile']):
             if i > 0:
                 print("\n ------------------------------------------\n")
+            self._info()
 
-            if self.logfile.datetime_format == 'ctime-pre2.4':
-                # no milliseconds when datetime format doesn't support it
-                start_time = (self.logfile.start.strftime("%Y %b %d %H:%M:%S")
-                              if self.logfile.start else "unknown")
-                end_time = (self.logfile.end.strftime("%Y %b %d %H:%M:%S")
-                            if self.logfile.start else "unknown")
-            else:
-                # include milliseconds
-                start_time = (self.logfile.start.strftime("%Y %b %d "
-                                                          "%H:%M:%S.%f")[:-3]
-                              if self.logfile.start else "unknown")
-                end_time = (self.logfile.end.strftime("%Y %b %d "
+    def _info(self):
+        """Print the general information and all sections of self.logfile."""
+        state = None
+        if self.args['state_file'] is not None:
+            state = self._load_state()
+
+        if self.logfile.datetime_format == 'ctime-pre2.4':
+            # no milliseconds when datetime format doesn't support it
+            start_time = (self.logfile.start.strftime("%Y %b %d %H:%M:%S")
+                          if self.logfile.start else "unknown")
+            end_time = (self.logfile.end.strftime("%Y %b %d %H:%M:%S")
+                        if self.logfile.start else "unknown")
+        else:
+            # include milliseconds
+            start_time = (self.logfile.start.strftime("%Y %b %d "
                                                       "%H:%M:%S.%f")[:-3]
-                            if self.logfile.start else "unknown")
+                          if self.logfile.start else "unknown")
+            end_time = (self.logfile.end.strftime("%Y %b %d "
+                                                  "%H:%M:%S.%f")[:-3]
+                        if self.logfile.start else "unknown")
 
-            print(f"     source: {self.logfile.name}")
-            print(f"     format: {self.logfile.logformat}")
-            print(f"       host: %s"
-                  % (self.logfile.hostname + ':' + str(self.logfile.port)
-                     if self.logfile.hostname else "unknown"))
+        print(f"     source: {self.logfile.name}")
+        print(f"     format: {self.logfile.logformat}")
+        print(f"       host: %s"
+              % (self.logfile.hostname + ':' + str(self.logfile.port)
+                 if self.logfile.hostname else "unknown"))
 
-            if self.logfile.repl_set:
-                print(f"    replSet: {self.logfile.repl_set}")
+        if self.logfile.repl_set:
+            print(f"    replSet: {self.logfile.repl_set}")
 
-            print(f"      start: {start_time}")
-            print(f"        end: {end_time}")
+        print(f"      start: {start_time}")
+        print(f"        end: {end_time}")
 
-            print(f"date format: {self.logfile.datetime_format}")
+        print(f"date format: {self.logfile.datetime_format}")
 
-            # self.logfile.timezone is a dateutil.tzinfo object
-            tzdt = datetime.datetime.now(self.logfile.timezone)
-            if (tzdt.tzname()):
-                timezone = tzdt.tzname()
-            else:
-                timezone = f"UTC {tzdt.strftime('%z')}"
-            print(f"   timezone: {timezone}")
+        # self.logfile.timezone is a dateutil.tzinfo object
+        tzdt = datetime.datetime.now(self.logfile.timezone)
+        if (tzdt.tzname()):
+            timezone = tzdt.tzname()
+        else:
+            timezone = f"UTC {tzdt.strftime('%z')}"
+        print(f"   timezone: {timezone}")
+        # one pass for all streaming sections, one for each of the others
+        active = [section for section in self.sections if section.active]
+        streaming = [section for section in active if section.streaming]
+        self.logfile.expect_passes(len(active) - len(streaming) +
+                                   (1 if streaming else 0))
+
+        if getattr(self.logfile, 'num_lines_unknown', False):
+            print("     length: unknown")
+        elif self.logfile.num_lines_estimated:
+            print(f"     length: ~{len(self.logfile)} (estimated)")
+        else:
             print(f"     length: {len(self.logfile)}")
-            print(f"     binary: %s" % (self.logfile.binary or "unknown"))
-            if self.logfile.clusterrole:
-                print(f"clusterRole: {self.logfile.clusterrole}")
-
-            version = (' -> '.join(self.logfile.versions) or "unknown")
-
-            # if version is unknown, go by date
-            if version == 'unknown':
-                if self.logfile.datetime_format == 'ctime-pre2.4':
-                    version = '< 2.4 (no milliseconds)'
-                elif self.logfile.datetime_format == 'ctime':
-                    version = '>= 2.4.x ctime (milliseconds present)'
-                elif (self.logfile.datetime_format == "iso8601-utc" or
-                      self.logfile.datetime_format == "iso8601-local"):
-                    if self.logfile.logformat == LogFormat.LOGV2:
-                        version = '>= 4.4 (iso8601 format, level, component)'
-                    elif self.logfile.has_level:
-                        version = '>= 3.0 (iso8601 format, level, component)'
-                    else:
-                        version = '= 2.6.x (iso8601 format)'
-
-            print("    version: %s" % version)
-            print("    storage: %s"
-                  % (self.logfile.storage_engine or 'unknown'))
-
-            # now run all sections
-            for section in self.sections:
-                if section.active:
-                    print("\n%s" % section.name.upper())
-                    section.run()
+        print(f"     binary: %s" % (self.logfile.binary or "unknown"))
+        if self.logfile.clusterrole:
+            print(f"clusterRole: {self.logfile.clusterrole}")
+
+        version = (' -> '.join(self.logfile.versions) or "unknown")
+
+        # if version is unknown, go by date
+        if version == 'unknown':
+            if self.logfile.datetime_format == 'ctime-pre2.4':
+                version = '< 2.4 (no milliseconds)'
+            elif self.logfile.datetime_format == 'ctime':
+                version = '>= 2.4.x ctime (milliseconds present)'
+            elif (self.logfile.datetime_format == "iso8601-utc" or
+                  self.logfile.datetime_format == "iso8601-local"):
+                if self.logfile.logformat == LogFormat.LOGV2:
+                    version = '>= 4.4 (iso8601 format, level, component)'
+                elif self.logfile.has_level:
+                    version = '>= 3.0 (iso8601 format, level, component)'
+                else:
+                    version = '= 2.6.x (iso8601 format)'
+
+        print("    version: %s" % version)
+        print("    storage: %s"
+              % (self.logfile.storage_engine or 'unknown'))
+
+        # feed all streaming sections from a single pass over the file
+        for section in streaming:
+            section.setup()
+            if state is not None:
+                section.restore(state['sections'][section.name])
+        if streaming:
+            jobs = self._range_jobs(streaming)
+            if jobs > 1:
+                self._process_ranges(streaming, jobs)
+            elif self.args['state_file'] is not None:
+                self.logfile.set_range(*self._byte_range)
+                try:
+                    self._process(streaming)
+                finally:
+                    self.logfile.set_range(0)
+            else:
+                self._process(streaming)
+
+        # now run all sections
+        for section in active:
+            print("\n%s" % section.name.upper())
+            if section.streaming:
+                section.report()
+            else:
+                section.run()
+
+        if self.args['follow'] is not None:
+            self._follow(streaming)
+        if self.args['state_file'] is not None:
+            self._save_state(streaming)
+
+    def _job_count(self):
+        """Return the number of worker processes that may be used."""
+        jobs = self.args['jobs']
+        if jobs == 0:
+            jobs = os.cpu_count() or 1
+        if (jobs < 2 or self.args['follow'] is not None or
+                self._progress_slot is not None or
+                'fork' not in multiprocessing.get_all_start_methods()):
+            # workers can not start workers of their own
+            return 1
+        return jobs
+
+    def _jobs(self):
+        """Return the number of log files to process in parallel."""
+        jobs = self._job_count()
+        logfiles = self.args['logfile']
+        if (jobs < 2 or len(logfiles) < 2 or
+                not all(isinstance(logfile, LogFile) and
+                        not logfile.from_stdin for logfile in logfiles)):
+            return 1
+        return min(jobs, len(logfiles))
+
+    def _range_jobs(self, sections):
+        """Return the number of byte ranges to split the log file into."""
+        jobs = self._job_count()
+        logfile = self.logfile
+        if (jobs < 2 or
+                not all(section.mergeable for section in sections) or
+                not isinstance(logfile, LogFile) or logfile.from_stdin or
+                logfile.sample_fraction is not None):
+            return 1
+        start, end = self._byte_range
+        if end is None:
+            end = logfile.filesize or 0
+        if end - start < max(self.split_min_size, 1):
+            return 1
+        return jobs
+
+    def _run_parallel(self, jobs):
+        """
+        Process the log files in `jobs` worker processes.
+
+        The workers are forked and inherit this tool with all arguments,
+        each one prints the report of a log file into a buffer. The reports
+        are printed in the order of the arguments, while the progress bar
+        shows the progress over all log files.
+        """
+        logfiles = self.args['logfile']
+        sizes = [logfile.filesize or 1 for logfile in logfiles]
+        for i, output in enumerate(self._map_parallel(_file_report, jobs,
+                                                      sizes)):
+            if i > 0:
+                print("\n ------------------------------------------\n")
+            sys.stdout.write(output)
+            sys.stdout.flush()
+
+    def _process_ranges(self, sections, jobs):
+        """
+        Feed the current log file to the sections in `jobs` byte ranges.
+
+        The sections are set up, and restored from --state-file, before the
+        workers are forked. Each worker sets up its copy of the sections
+        again, feeds them the lines of one byte range and returns their
+        partial states, which are merged into the sections in the order of
+        the ranges.
+        """
+        ranges = self.logfile.split_ranges(jobs, *self._byte_range)
+        sizes = [end - start for start, end in ranges]
+        for partials in self._map_parallel(_range_partials, jobs, sizes,
+                                           ranges):
+            for section, partial in zip(sections, partials):
+                section.merge(partial)
+
+    def _partials(self, start, end):
+        """Return the partial section states of a byte range, see above."""
+        logfile = self.logfile
+        # the forked processes share the file offset of the inherited handle
+        logfile.filehandle = open(logfile.filehandle.name,
+                                  logfile.filehandle.mode)
+        logfile.set_range(start, end)
+
+        sections = [section for section in self.sections
+                    if section.active and section.streaming]
+        for section in sections:
+            # only the lines of the range, not a restored state
+            section.setup()
+        logfile.set_reuse_events(self.batch_size)
+        for batch in logfile.iter_batches(self.batch_size):
+            self.update_progress(float(logfile.filehandle.tell() - start) /
+                                 (end - start))
+            for section in sections:
+                section.process_batch(batch)
+        return [section.partial() for section in sections]
+
+    def _map_parallel(self, function, jobs, sizes, ranges=None):
+        """
+        Yield the results of function(index) for all indexes of sizes.
+
+        Runs `function` in `jobs` forked worker processes and shows the
+        progress of all of them, weighted by `sizes`. The results are
+        (result, exit code) tuples, an exit code is raised as SystemExit
+        once the results before it are yielded.
+        """
+        global _parallel
+
+        context = multiprocessing.get_context('fork')
+        progress = context.Array('d', len(sizes), lock=False)
+        _parallel = (self, progress, ranges)
+        try:
+            with context.Pool(jobs) as pool:
+                results = [pool.apply_async(function, (i,))
+                           for i in range(len(sizes))]
+                for i, result in enumerate(results):
+                    while not result.ready():
+                        if self.progress_bar_enabled:
+                            done = sum(p * size for p, size
+                                       in zip(progress, sizes))
+                            self.update_progress(
+                                min(done / sum(sizes), 0.999))
+                        result.wait(0.2)
+                    if self.progress_bar_enabled:
+                        self.update_progress(1.0)
+
+                    value, code = result.get()
+                    progress[i] = 1.0
+                    if value is not None:
+                        yield value
+                    if code is not None:
+                        raise SystemExit(code)
+        finally:
+            _parallel = None
+
+    def update_progress(self, progress, prefix=''):
+        """Print the progress bar, or share it in a worker process."""
+        if self._progress_slot is None:
+            LogFileTool.update_progress(self, progress, prefix)
+        else:
+            shared, index = self._progress_slot
+            shared[index] = progress
+
+    def _check_follow(self):
+        """Make sure that --follow can be used with the other arguments."""
+        if (len(self.args['logfile']) != 1 or
+                not hasattr(self.args['logfile'][0], 'poll')):
+            raise SystemExit('Error: --follow only supports a single log '
+                             'file.')
+        if any(self.args[a] is not None for a in ('sample', 'sample_lines',
+                                                  'sample_seek')):
+            raise SystemExit('Error: --follow can not be combined with '
+                             'sampling.')
+        unsupported = [section.name.strip() for section in self.sections
+                       if section.active and not section.streaming]
+        if unsupported:
+            raise SystemExit('Error: --follow is not supported for section(s) '
+                             '%s.' % ', '.join(unsupported))
+
+    def _check_state_file(self):
+        """Make sure that --state-file can be used with the other arguments."""
+        logfiles = self.args['logfile']
+        if (len(logfiles) != 1 or not isinstance(logfiles[0], LogFile) or
+                logfiles[0].from_stdin):
+            raise SystemExit('Error: --state-file only supports a single log '
+                             'file.')
+        if self.args['follow'] is not None:
+            raise SystemExit('Error: --state-file can not be combined with '
+                             '--follow.')
+        if any(self.args[a] is not None for a in ('sample', 'sample_lines',
+                                                  'sample_seek')):
+            raise SystemExit('Error: --state-file can not be combined with '
+                             'sampling.')
+        unsupported = [section.name.strip() for section in self.sections
+                       if section.active and
+                       not (section.streaming and section.stateful)]
+        if unsupported:
+            raise SystemExit('Error: --state-file is not supported for '
+                             'section(s) %s.' % ', '.join(unsupported))
+
+    def _state_config(self):
+        """Return the arguments that the saved section states depend on."""
+        return sorted((key, value) for key, value in self.args.items()
+                      if key not in self.state_ignored_args)
+
+    def _file_identity(self, offset):
+        """Return the device, inode and a hash of the head of the log file."""
+        filehandle = self.logfile.filehandle
+        stat = os.fstat(filehandle.fileno())
+        pos = filehandle.tell()
+        try:
+            filehandle.seek(0)
+            head = filehandle.read(min(offset, self.state_head_bytes))
+        finally:
+            filehandle.seek(pos)
+        return [stat.st_dev, stat.st_ino, hashlib.sha1(head).hexdigest()]
+
+    def _load_state(self):
+        """
+        Return the state saved by the last run with --state-file, or None.
+
+        Sets the byte range of the lines to read: the complete lines after
+        the saved ones, or all complete lines if there is no saved state, it
+        was saved with other arguments or the log file was rotated or
+        truncated since. Also gathers the general information of these lines
+        only.
+        """
+        logfile = self.logfile
+        try:
+            with open(self.args['state_file'], 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError,
+                ImportError):
+            state = None
+
+        end = logfile.complete_end()
+        if isinstance(state, dict):
+            # a state without one of the keys starts over, like a different
+            # version
+            offset = state.get('offset')
+            sections = state.get('sections')
+            names = [section.name for section in self.sections
+                     if section.active]
+            if (state.get('version') != self.state_version or
+                    state.get('config') != self._state_config() or
+                    not isinstance(offset, int) or offset > end or
+                    state.get('identity') != self._file_identity(offset) or
+                    'metadata' not in state or
+                    not isinstance(sections, dict) or
+                    any(name not in sections for name in names)):
+                state = None
+        else:
+            state = None
+
+        start = state['offset'] if state else 0
+        logfile.resume_metadata(state['metadata'] if state else None,
+                                start, end)
+        self._byte_range = (start, end)
+        return state
+
+    def _save_state(self, sections):
+        """Save the state of the sections and the end of the lines read."""
+        end = self._byte_range[1]
+        state = {'version': self.state_version,
+                 'config': self._state_config(),
+                 'offset': end,
+                 'identity': self._file_identity(end),
+                 'metadata': self.logfile.metadata_state(),
+                 'sections': dict((section.name, section.state())
+                                  for section in sections)}
+
+        path = self.args['state_file']
+        tmp = None
+        try:
+            # write atomically, a failed run keeps the last state
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                       suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError as e:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            raise SystemExit('Error: can not write state file %s: %s'
+                             % (path, e))
+
+    def _process(self, sections):
+        """Feed each log event of the current log file to all sections."""
+        logfile = self.logfile
+
+        progress_total = 0
+        if self.progress_bar_enabled and logfile.start and logfile.end:
+            progress_start = self._datetime_to_epoch(logfile.start)
+            progress_total = (self._datetime_to_epoch(logfile.end) -
+                              progress_start)
+
+        if self.args['follow'] is not None:
+            # read in batches without rewinding at the end, so following
+            # continues exactly where the first pass stopped
+            def poll_batches():
+                while True:
+                    batch = logfile.poll(self.follow_batch_size)
+                    if not batch:
+                        return
+                    yield batch
+            batches = poll_batches()
+        else:
+            batches = logfile.iter_batches(self.batch_size)
+
+        # the sections are done with the events of a batch before the next
+        reuse = (self.args['follow'] is None and
+                 hasattr(logfile, 'set_reuse_events') and
+                 not any(section.retains_events for section in sections))
+        if reuse:
+            logfile.set_reuse_events(self.batch_size)
+        try:
+            for batch in batches:
+                # update progress bar once per batch
+                if progress_total and batch[-1].datetime:
+                    progress_curr = self._datetime_to_epoch(
+                        batch[-1].datetime)
+                    self.update_progress(float(progress_curr -
+                                               progress_start) /
+                                         progress_total)
+
+                for section in sections:
+                    section.process_batch(batch)
+        finally:
+            if reuse:
+                logfile.set_reuse_events(0)
+
+        # clear progress bar again
+        if progress_total:
+            self.update_progress(1.0)
+
+    def _follow(self, sections):
+        """Keep feeding new lines to the sections, print them periodically."""
+        interval = self.args['follow']
+        last_report = time.time()
+        pending = False
+
+        try:
+            while True:
+                events = self.logfile.poll(self.follow_batch_size)
+                if events:
+                    for section in sections:
+                        section.process_batch(events)
+                pending = pending or bool(events)
+
+                if pending and time.time() - last_report >= interval:
+                    self._report(sections)
+                    last_report = time.time()
+                    pending = False
+
+                if not events:
+                    time.sleep(self.follow_poll_interval)
+        except KeyboardInterrupt:
+            if pending:
+                self._report(sections)
+
+    def _report(self, sections):
+        """Print the current state of all streaming sections."""
+        print("\n ------------------------------------------\n")
+        print("    updated: %s" % datetime.datetime.now()
+              .strftime("%Y %b %d %H:%M:%S"))
+        for section in sections:
+            print("\n%s" % section.name.upper())
+            section.report()
+        sys.stdout.flush()
 
 
 def main():
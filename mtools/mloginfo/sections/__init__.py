@@ -6,6 +6,8 @@ from .query_section import QuerySection
 from .restart_section import RestartSection
 from .rs_info_section import RsInfoSection
 from .rs_state_section import RsStateSection
+from .slowest_section import SlowestSection
 from .storagestats_section import StorageStatsSection
+from .timeline_section import TimelineSection
 from .transactions_section import TransactionSection
 from .sharding_section import ShardingSection
\ No newline at end of file
@@ -4,11 +4,37 @@ class BaseSection(object):
 
     All sections need to derive from it and add their arguments to the
     mloginfo.argparser object and determine if they are active.
+
+    Sections that only look at one log line at a time set `streaming` to True
+    and implement setup(), process() and report() instead of run(), and
+    optionally process_batch() for lists of events. mloginfo then feeds all
+    streaming sections from a single pass over the log file, and can keep
+    feeding them new lines with --follow. Unless a streaming section sets
+    `retains_events`, the LogEvent objects are reused for later lines after
+    process() or process_batch() returns.
+
+    Streaming sections that only aggregate, independent of the order of the
+    lines, also set `mergeable` and implement partial() and merge(). With
+    --jobs, mloginfo then splits a large log file into byte ranges, feeds
+    each range to the section in a worker process and merges the partial
+    states of the ranges, in the order of the ranges.
+
+    partial() returns aggregates, like counts and StreamingStats, not the log
+    events or values of the range, so it stays small for large ranges.
+
+    With --state-file, the state() of all streaming sections is saved after
+    each run and restore()d in the next run, which only reads the new lines.
+    Only sections that are `stateful` support it. By default, these are the
+    mergeable sections, their state is the partial() state. Other sections
+    set `stateful` and implement state() and restore() themselves.
     """
 
     filterArgs = []
     name = 'base'
     active = False
+    streaming = False
+    retains_events = False
+    mergeable = False
 
     def __init__(self, mloginfo):
         """Save command line arguments and set active to False by default."""
@@ -16,6 +42,49 @@ class BaseSection(object):
         # class variables
         self.mloginfo = mloginfo
 
-    def run(self):
-        """Override this method in subclasses."""
+    def setup(self):
+        """Reset the state of a streaming section before a new log file."""
         pass
+
+    def process(self, logevent):
+        """Update the state of a streaming section with a log event."""
+        pass
+
+    def process_batch(self, logevents):
+        """Update the state of a streaming section with a list of events."""
+        process = self.process
+        for logevent in logevents:
+            process(logevent)
+
+    @property
+    def stateful(self):
+        """Return True if the section supports state() and restore()."""
+        return self.mergeable
+
+    def partial(self):
+        """Return the picklable state of a mergeable section."""
+        raise NotImplementedError
+
+    def merge(self, partial):
+        """Add the partial() state of the following byte range."""
+        raise NotImplementedError
+
+    def state(self):
+        """Return the picklable state of a stateful section."""
+        return self.partial()
+
+    def restore(self, state):
+        """Continue from the state() of an earlier run, after setup()."""
+        self.merge(state)
+
+    def report(self):
+        """Print out the current state of a streaming section."""
+        pass
+
+    def run(self):
+        """Override this method in subclasses that are not streaming."""
+        if self.streaming:
+            self.setup()
+            for logevent in self.mloginfo.logfile:
+                self.process(logevent)
+            self.report()
@@ -1,8 +1,8 @@
-import re
 from collections import defaultdict
 
 from .base_section import BaseSection
 from mtools.util.logformat import LogFormat
+from mtools.util.stats import StreamingStats
 
 try:
     from mtools.util.profile_collection import ProfileCollection
@@ -15,10 +15,15 @@ class ConnectionSection(BaseSection):
     ConnectionSection class.
 
     This section goes through the logfile and extracts information about
-    opened and closed connections.
+    opened and closed connections, of legacy and LOGV2 log files. With
+    --connstats, the start of each open connection is kept until it is
+    closed and the durations go into streaming statistics per IP, so the
+    memory only grows with the number of concurrently open connections.
     """
 
     name = "connections"
+    streaming = True
+    stateful = True
 
     def __init__(self, mloginfo):
         BaseSection.__init__(self, mloginfo)
@@ -39,128 +44,136 @@ class ConnectionSection(BaseSection):
         return(self.mloginfo.args['connections'] or
                self.mloginfo.args['connstats'])
 
-    def run(self):
-        """Run this section and print out information."""
-        if self.mloginfo.logfile.logformat != LogFormat.LEGACY:
-            print("\nERROR: mloginfo --connections currently only supports "
-                  "legacy log files\n(MongoDB 4.0 or older)\n")
-            return
-
-        ip_opened = defaultdict(lambda: 0)
-        ip_closed = defaultdict(lambda: 0)
-
-        socket_exceptions = 0
-
-        START_TIME_EMPTY = -11
-        END_TIME_ALREADY_FOUND = -111
-        MIN_DURATION_EMPTY = 9999999999
-        MAX_DURATION_EMPTY = -1
-
-        end_connid_pattern = re.compile(r'\[conn(\d+)\]')
-
-        genstats = self.mloginfo.args['connstats']
-        if genstats:
-            connections_start = defaultdict(lambda: START_TIME_EMPTY)
-            ipwise_sum_durations = defaultdict(lambda: 0)
-            ipwise_count = defaultdict(lambda: 0)
-            ipwise_min_connection_duration = defaultdict(lambda:
-                                                         MIN_DURATION_EMPTY)
-            ipwise_max_connection_duration = defaultdict(lambda:
-                                                         MAX_DURATION_EMPTY)
-
-            min_connection_duration = MIN_DURATION_EMPTY
-            max_connection_duration = MAX_DURATION_EMPTY
-
-            sum_durations = 0
-            fullconn_counts = 0
-
-        for logevent in self.mloginfo.logfile:
-            line = logevent.line_str
-
-            pos = line.find('connection accepted')
-            if pos != -1:
-                # connection was opened, increase counter
-                tokens = line[pos:pos + 100].split(' ')
-                if tokens[3] == 'anonymous':
-                    ip = 'anonymous'
-                else:
-                    ip, _ = tokens[3].split(':')
-                ip_opened[ip] += 1
-
-                if genstats:
-                    connid = tokens[4].strip('#')
-                    dt = logevent.datetime
-
-                    # Sanity checks
-                    if connid.isdigit() is False or dt is None:
-                        continue
-
-                    if connections_start[connid] != START_TIME_EMPTY:
-                        errmsg = ("Multiple start datetimes found for the "
-                                  "same connection ID. Consider analysing one "
-                                  "log sequence.")
-                        raise NotImplementedError(errmsg)
-
-                    connections_start[connid] = dt
-
-            pos = line.find('end connection')
-            if pos != -1:
-                # connection was closed, increase counter
-                tokens = line[pos:pos + 100].split(' ')
-                if tokens[2] == 'anonymous':
-                    ip = 'anonymous'
-                else:
-                    ip, _ = tokens[2].split(':')
-                ip_closed[ip] += 1
-
-                if genstats:
+    # LOGV2 message ids of opened and closed connections
+    ACCEPTED_ID = 22943
+    ENDED_ID = 22944
 
-                    # Sanity check
-                    if end_connid_pattern.search(line, re.M | re.I) is None:
-                        continue
+    def setup(self):
+        """Reset all connection counters."""
+        logformat = self.mloginfo.logfile.logformat
+        self.supported = logformat in (LogFormat.LEGACY, LogFormat.LOGV2)
+        self.logv2 = logformat == LogFormat.LOGV2
 
-                    # The connection id value is stored just before end
-                    # connection -> [conn385] end connection
-                    end_connid = (end_connid_pattern.
-                                  search(line, re.M | re.I).group(1))
-                    dt = logevent.datetime
+        self.ip_opened = defaultdict(lambda: 0)
+        self.ip_closed = defaultdict(lambda: 0)
 
-                    # Sanity checks
-                    if (end_connid.isdigit() is False or dt is None or
-                            connections_start[end_connid] == START_TIME_EMPTY):
-                        continue
+        self.socket_exceptions = 0
 
-                    if connections_start[end_connid] == END_TIME_ALREADY_FOUND:
-                        errmsg = ("Multiple end datetimes found for the same "
-                                  "connection ID %s. Consider analysing one "
-                                  "log sequence.")
-                        raise NotImplementedError(errmsg % (end_connid))
+        self.genstats = self.mloginfo.args['connstats']
+        if self.genstats:
+            # connection id -> start datetime, only while it is open
+            self.open_connections = {}
+            # durations in seconds, per IP and overall
+            self.ip_durations = {}
+            self.durations = StreamingStats()
 
-                    dur = dt - connections_start[end_connid]
-                    dur_in_sec = dur.seconds
-
-                    if dur_in_sec < min_connection_duration:
-                        min_connection_duration = dur_in_sec
-
-                    if dur_in_sec > max_connection_duration:
-                        max_connection_duration = dur_in_sec
-
-                    if dur_in_sec < ipwise_min_connection_duration[ip]:
-                        ipwise_min_connection_duration[ip] = dur_in_sec
-
-                    if dur_in_sec > ipwise_max_connection_duration[ip]:
-                        ipwise_max_connection_duration[ip] = dur_in_sec
+    def process(self, logevent):
+        """Count opened and closed connections of a log line."""
+        if not self.supported:
+            return
 
-                    sum_durations += dur.seconds
-                    fullconn_counts += 1
+        if self.logv2:
+            # only the parsed document, composing line_str is not needed
+            self._process_logv2(logevent)
+            return
 
-                    ipwise_sum_durations[ip] += dur_in_sec
-                    ipwise_count[ip] += 1
+        # the message follows the thread name, e.g. [conn385]
+        line = logevent.line_str
+        pos = line.find('] ') + 2
+        if line.startswith('connection accepted', pos):
+            tokens = line[pos:pos + 100].split(' ')
+            self._opened(tokens[3], tokens[4].strip('#'), logevent)
+        elif line.startswith('end connection', pos):
+            tokens = line[pos:pos + 100].split(' ')
+            thread = line[line.rfind('[', 0, pos) + 1:pos - 2]
+            connid = thread[4:] if thread.startswith('conn') else None
+            self._closed(tokens[2], connid, logevent)
+
+        if "SocketException" in line:
+            self.socket_exceptions += 1
+
+    def _process_logv2(self, logevent):
+        doc = logevent.doc
+        msg_id = doc.get('id')
+        if msg_id != self.ACCEPTED_ID and msg_id != self.ENDED_ID:
+            return
+        attr = doc.get('attr', {})
+        remote = attr.get('remote', 'anonymous')
+        connid = str(attr.get('connectionId', ''))
+        if msg_id == self.ACCEPTED_ID:
+            self._opened(remote, connid, logevent)
+        else:
+            self._closed(remote, connid, logevent)
+
+    @staticmethod
+    def _ip(remote):
+        if remote == 'anonymous':
+            return remote
+        return remote.rsplit(':', 1)[0]
+
+    def _opened(self, remote, connid, logevent):
+        ip = self._ip(remote)
+        self.ip_opened[ip] += 1
+
+        if self.genstats:
+            dt = logevent.datetime
+
+            # Sanity checks
+            if connid.isdigit() is False or dt is None:
+                return
+
+            # a repeated start of an open connection id, e.g. after a
+            # restart without the end of the connection, starts it anew
+            self.open_connections[connid] = dt
+
+    def _closed(self, remote, connid, logevent):
+        ip = self._ip(remote)
+        self.ip_closed[ip] += 1
+
+        if self.genstats:
+            dt = logevent.datetime
+
+            # Sanity checks, connections that were opened before the start
+            # of the log file or that were closed already are not known
+            if connid is None:
+                return
+            start = self.open_connections.pop(connid, None)
+            if dt is None or start is None:
+                return
+
+            dur_in_sec = int((dt - start).total_seconds())
+            self.durations.add(dur_in_sec)
+            stats = self.ip_durations.get(ip)
+            if stats is None:
+                stats = self.ip_durations[ip] = StreamingStats()
+            stats.add(dur_in_sec)
+
+    def state(self):
+        """Return the connection counters, without the default factories."""
+        return dict((name, dict(value) if isinstance(value, defaultdict)
+                     else value)
+                    for name, value in vars(self).items()
+                    if name != 'mloginfo')
+
+    def restore(self, state):
+        """Continue counting from the state() of an earlier run."""
+        for name, value in state.items():
+            current = getattr(self, name, None)
+            if isinstance(current, defaultdict):
+                current.update(value)
+            else:
+                setattr(self, name, value)
 
-                    connections_start[end_connid] = END_TIME_ALREADY_FOUND
+    def report(self):
+        """Print out information about opened and closed connections."""
+        if not self.supported:
+            print("\nERROR: mloginfo --connections currently only supports "
+                  "legacy and LOGV2 log files\n")
+            return
 
-            if "SocketException" in line:
-                socket_exceptions += 1
+        ip_opened = self.ip_opened
+        ip_closed = self.ip_closed
+        genstats = self.genstats
 
         # calculate totals
         total_opened = sum(ip_opened.values())
@@ -173,15 +186,16 @@ class ConnectionSection(BaseSection):
         print("     total opened: %s" % total_opened)
         print("     total closed: %s" % total_closed)
         print("    no unique IPs: %s" % len(unique_ips))
-        print("socket exceptions: %s" % socket_exceptions)
+        print("socket exceptions: %s" % self.socket_exceptions)
         if genstats:
-            if fullconn_counts > 0:
+            durations = self.durations
+            if durations.count > 0:
                 print("overall average connection duration(s): %s"
-                      % (sum_durations / fullconn_counts))
+                      % (durations.sum / durations.count))
                 print("overall minimum connection duration(s): %s"
-                      % min_connection_duration)
+                      % durations.min)
                 print("overall maximum connection duration(s): %s"
-                      % max_connection_duration)
+                      % durations.max)
             else:
                 print("overall average connection duration(s): -")
                 print("overall minimum connection duration(s): -")
@@ -193,29 +207,17 @@ class ConnectionSection(BaseSection):
             closed = ip_closed[ip] if ip in ip_closed else 0
 
             if genstats:
-                covered_count = (
-                    ipwise_count[ip]
-                    if ip in ipwise_count
-                    else 1)
-                connection_duration_ip = (
-                    ipwise_sum_durations[ip]
-                    if ip in ipwise_sum_durations
-                    else 0)
-                ipwise_min_connection_duration_final = (
-                    ipwise_min_connection_duration[ip]
-                    if ipwise_min_connection_duration[ip] != MIN_DURATION_EMPTY
-                    else 0)
-                ipwise_max_connection_duration_final = (
-                    ipwise_max_connection_duration[ip]
-                    if ipwise_max_connection_duration[ip] != MAX_DURATION_EMPTY
-                    else 0)
+                stats = self.ip_durations.get(ip)
+                if stats is None:
+                    dur_avg = dur_min = dur_max = 0
+                else:
+                    dur_avg = stats.sum / stats.count
+                    dur_min = stats.min
+                    dur_max = stats.max
 
                 print("%-15s  opened: %-8i  closed: %-8i dur-avg(s): %-8i "
                       "dur-min(s): %-8i dur-max(s): %-8i"
-                      % (ip, opened, closed,
-                         connection_duration_ip / covered_count,
-                         ipwise_min_connection_duration_final,
-                         ipwise_max_connection_duration_final))
+                      % (ip, opened, closed, dur_avg, dur_min, dur_max))
             else:
                 print("%-15s  opened: %-8i  closed: %-8i"
                       % (ip, opened, closed))
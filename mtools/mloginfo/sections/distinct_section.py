@@ -1,6 +1,7 @@
 from collections import defaultdict
 
 from .base_section import BaseSection
+from mtools.util.drain import Drain, mask_tokens
 from mtools.util.logformat import LogFormat
 
 try:
@@ -13,12 +14,16 @@ class DistinctSection(BaseSection):
     """
     DistinctSection class.
 
-    This section shows a distinct view of all log lines matched with the
-    Log2Code matcher. It will output sorted statistics of which logevent
-    patterns where matched how often (most frequent first).
+    This section shows a distinct view of all log lines by message. LOGV2
+    lines are grouped by their msg, legacy lines by the template that the
+    Drain parse tree clusters them into, shown with the id of the template.
+    It will output sorted statistics of which messages were found how often
+    (most frequent first).
     """
 
     name = "distinct"
+    streaming = True
+    stateful = True
 
     def __init__(self, mloginfo):
         BaseSection.__init__(self, mloginfo)
@@ -41,55 +46,82 @@ class DistinctSection(BaseSection):
         """Return boolean if this section is active."""
         return self.mloginfo.args['distinct']
 
-    def run(self):
-        """Group by matched pattern."""
-        # get log file information
-        logfile = self.mloginfo.logfile
-
-        if logfile.logformat != LogFormat.LOGV2:
-            print(f"\nERROR: unsupported log format: {logfile.logformat}\n")
+    @property
+    def mergeable(self):
+        """
+        Return True for LOGV2 log files.
+
+        The Drain templates of legacy lines depend on the order of the lines,
+        so they can not be merged from byte ranges.
+        """
+        return self.mloginfo.logfile.logformat == LogFormat.LOGV2
+
+    def setup(self):
+        """Start counting log messages."""
+        self.codelines = defaultdict(lambda: 0)
+        self.non_matches = 0
+        logformat = self.mloginfo.logfile.logformat
+        self.supported = logformat in (LogFormat.LOGV2, LogFormat.LEGACY)
+        self.templates = Drain(wildcard='...')
+
+    def process(self, logevent):
+        """Count the message of a log line."""
+        if not self.supported:
             return
 
-        if logfile.start and logfile.end and not self.mloginfo.args['verbose']:
-            progress_start = self.mloginfo._datetime_to_epoch(logfile.start)
-            progress_total = (self.mloginfo._datetime_to_epoch(logfile.end) -
-                              progress_start)
-        else:
-            self.mloginfo.progress_bar_enabled = False
-
-        codelines = defaultdict(lambda: 0)
-        non_matches = 0
-
-        for i, logevent in enumerate(self.mloginfo.logfile):
-            cl = {
-                'pattern': f"{logevent.doc.get('msg')}"
-            }
-
-            # update progress bar every 1000 lines
-            if self.mloginfo.progress_bar_enabled and (i % 1000 == 0):
-                if logevent.datetime:
-                    try:
-                        progress_curr = self.mloginfo._datetime_to_epoch(logevent
-                                                                        .datetime)
-                        (self.mloginfo
-                        .update_progress(float(progress_curr - progress_start) /
-                                        progress_total))
-                    except Exception as e:
-                        if self.mloginfo.args['verbose']:
-                            print(f"update_progress() exception: {e.msg}")
-
+        if self.mloginfo.logfile.logformat == LogFormat.LOGV2:
+            pattern = f"{logevent.doc.get('msg')}"
             if not self.mloginfo.args['verbose']:
                 # Skip some generally uninteresting lines
-                if logevent.doc.get('ctx') in ('initandlisten','WTCheckpointThread'):
-                    non_matches += 1
+                if logevent.doc.get('ctx') in ('initandlisten',
+                                               'WTCheckpointThread'):
+                    self.non_matches += 1
                 else:
-                    codelines[cl.get('pattern')] += 1
+                    self.codelines[pattern] += 1
             else:
-                codelines[cl.get('pattern')] += 1
+                self.codelines[pattern] += 1
+        else:
+            # the message follows the thread name
+            line = logevent.line_str
+            pos = line.find('] ')
+            if pos == -1:
+                self.non_matches += 1
+                return
+            tokens = mask_tokens(line[pos + 2:].split(), '...')
+            self.templates.add(tokens)
+
+    def partial(self):
+        """Return the message counts of a LOGV2 log file."""
+        return dict(self.codelines), self.non_matches
+
+    def merge(self, partial):
+        """Add the message counts of another byte range."""
+        codelines, non_matches = partial
+        for pattern, count in codelines.items():
+            self.codelines[pattern] += count
+        self.non_matches += non_matches
+
+    def state(self):
+        """Return the message counts and the parse tree of the templates."""
+        return self.partial(), self.templates
+
+    def restore(self, state):
+        """Continue with the counts and templates of an earlier run."""
+        partial, self.templates = state
+        self.merge(partial)
+
+    def report(self):
+        """Print the log messages, most frequent first."""
+        if not self.supported:
+            print("\nERROR: unsupported log format: "
+                  f"{self.mloginfo.logfile.logformat}\n")
+            return
 
-        # clear progress bar again
-        if self.mloginfo.progress_bar_enabled:
-            self.mloginfo.update_progress(1.0)
+        codelines = dict(self.codelines)
+        for cluster in self.templates.clusters:
+            codelines['%s  %s' % (cluster.template_id, cluster)] = \
+                cluster.count
+        non_matches = self.non_matches
 
         if self.mloginfo.args['verbose']:
             print('')
@@ -1,19 +1,10 @@
-from collections import namedtuple
 from operator import itemgetter
 
 from .base_section import BaseSection
 from mtools.util import OrderedDict
-from mtools.util.grouping import Grouping
 from mtools.util.print_table import print_table
 from mtools.util.logformat import LogFormat
-
-try:
-    import numpy as np
-except ImportError:
-    np = None
-
-LogTuple = namedtuple('LogTuple', ['namespace', 'operation', 'pattern',
-                                   'duration', 'allowDiskUse'])
+from mtools.util.stats import StreamingStats, sample_note, scale_count
 
 
 def op_or_cmd(le):
@@ -24,6 +15,8 @@ class QuerySection(BaseSection):
     """QuerySection class."""
 
     name = "queries"
+    streaming = True
+    mergeable = True
 
     def __init__(self, mloginfo):
         BaseSection.__init__(self, mloginfo)
@@ -57,81 +50,87 @@ class QuerySection(BaseSection):
         """Return boolean if this section is active."""
         return self.mloginfo.args['queries']
 
-    def run(self):
-        """Run this section and print out information."""
-        grouping = Grouping(group_by=lambda x: (x.namespace, x.operation,
-                                                x.pattern, x.allowDiskUse))
+    def setup(self):
+        """Start without query patterns."""
+        # (namespace, operation, pattern, allowDiskUse) ->
+        # [count, StreamingStats of the durations]
+        self.groups = OrderedDict()
+
+    def process(self, le):
+        """Add a query, update, getmore or remove to its query pattern."""
+        le._debug = self.mloginfo.args['debug']
+
+        if (le.operation in ['query', 'getmore', 'update', 'remove'] or
+                le.command in ['count', 'findandmodify',
+                               'geonear', 'find', 'aggregate']):
+            key = (le.namespace, op_or_cmd(le), le.pattern, le.allowDiskUse)
+            entry = self.groups.get(key)
+            if entry is None:
+                entry = self.groups[key] = [0, StreamingStats()]
+            entry[0] += 1
+            duration = le.duration
+            if duration is not None:
+                entry[1].add(duration)
+
+    def partial(self):
+        """Return the count and duration statistics per query pattern."""
+        return self.groups
+
+    def merge(self, partial):
+        """Add the statistics of another byte range."""
+        for key, (count, stats) in partial.items():
+            entry = self.groups.get(key)
+            if entry is None:
+                self.groups[key] = [count, stats]
+            else:
+                entry[0] += count
+                entry[1].merge(stats)
+
+    def report(self):
+        """Print out statistics for each query pattern."""
         logfile = self.mloginfo.logfile
         rounding = self.mloginfo.args['rounding']
 
-        if logfile.start and logfile.end:
-            progress_start = self.mloginfo._datetime_to_epoch(logfile.start)
-            progress_total = (self.mloginfo._datetime_to_epoch(logfile.end) -
-                              progress_start)
-        else:
-            self.mloginfo.progress_bar_enabled = False
-
-        for i, le in enumerate(logfile):
-            le._debug = self.mloginfo.args['debug']
-
-            # update progress bar every 1000 lines
-            if self.mloginfo.progress_bar_enabled and (i % 1000 == 0):
-                if le.datetime:
-                    progress_curr = self.mloginfo._datetime_to_epoch(le
-                                                                     .datetime)
-                    if progress_total:
-                        (self.mloginfo
-                         .update_progress(float(progress_curr -
-                                                progress_start) /
-                                          progress_total))
-
-            if (le.operation in ['query', 'getmore', 'update', 'remove'] or
-                    le.command in ['count', 'findandmodify',
-                                   'geonear', 'find', 'aggregate']):
-                lt = LogTuple(namespace=le.namespace, operation=op_or_cmd(le),
-                              pattern=le.pattern, duration=le.duration,
-                              allowDiskUse=le.allowDiskUse)
-                grouping.add(lt)
-
-        grouping.sort_by_size()
-
-        # clear progress bar again
-        if self.mloginfo.progress_bar_enabled:
-            self.mloginfo.update_progress(1.0)
-
         # no queries in the log file
-        if len(grouping) < 1:
+        if len(self.groups) < 1:
             print('no queries found.')
             return
 
+        # with sampling, extrapolate counts and sums to the whole file
+        fraction = logfile.sample_fraction
+        sampled = fraction is not None and fraction < 1
+
         titles = ['namespace', 'operation', 'pattern', 'count', 'min (ms)',
                   'max (ms)', '95%-ile (ms)', 'sum (ms)', 'mean (ms)',
                   'allowDiskUse']
+        if sampled:
+            titles.insert(4, '+/-')
         table_rows = []
 
-        for g in grouping:
+        # the most frequent query patterns first
+        groups = sorted(self.groups.items(), key=lambda item: item[1][0],
+                        reverse=True)
+        for key, (count, durations) in groups:
             # calculate statistics for this group
-            namespace, op, pattern, allowDiskUse = g
-
-            group_events = [le.duration for le in grouping[g]
-                            if le.duration is not None]
-            group_events_all = [le.duration for le in grouping[g]]
-
+            namespace, op, pattern, allowDiskUse = key
             stats = OrderedDict()
             stats['namespace'] = namespace
             stats['operation'] = op
             stats['pattern'] = pattern
-            stats['count'] = len(group_events_all)
-            stats['min'] = min(group_events) if group_events else 0
-            stats['max'] = max(group_events) if group_events else 0
-            if np:
-                stats['95%'] = (round(np.percentile(group_events, 95), rounding)
-                                if group_events else 0)
-            else:
-                stats['95%'] = 'n/a'
-            stats['sum'] = sum(group_events) if group_events else 0
-            stats['mean'] = (round(stats['sum'] / stats['count'], rounding)
-                             if group_events else 0)
+            stats['count'] = count
+            if sampled:
+                scaled, margin = scale_count(count, fraction)
+                stats['count'] = int(round(scaled))
+                stats['+/-'] = int(round(margin))
+            stats['min'] = durations.min if durations.count else 0
+            stats['max'] = durations.max if durations.count else 0
+            stats['95%'] = (round(float(durations.percentile(95)), rounding)
+                            if durations.count else 0)
+            stats['sum'] = durations.sum
+            stats['mean'] = (round(durations.sum / count, rounding)
+                             if durations.count else 0)
+            if sampled:
+                stats['sum'] = int(round(stats['sum'] / fraction))
             stats['allowDiskUse'] = allowDiskUse
             table_rows.append(stats)
 
@@ -145,3 +144,6 @@ class QuerySection(BaseSection):
                             reverse=reverse)
         print_table(table_rows, titles, uppercase_headers=False)
         print('')
+        if sampled:
+            print(sample_note(fraction))
+            print('')
@@ -1,8 +1,8 @@
-from collections import defaultdict, namedtuple, Counter
-from difflib import SequenceMatcher
+from collections import namedtuple
 import re
 
 from mtools.util import OrderedDict
+from mtools.util.drain import Drain
 from mtools.util.grouping import Grouping
 from mtools.util.print_table import print_table
 from mtools.util.logformat import LogFormat
@@ -91,7 +91,7 @@ class ShardingSection(BaseSection):
             self.mloginfo.progress_bar_enabled = False
 
         if self.mloginfo.args['errors']:
-            errorlines = defaultdict(lambda: 0)
+            errorlines = Drain(wildcard='...')
             for i, logevent in enumerate(logfile):
 
                 # update progress bar every 1000 lines
@@ -130,19 +130,8 @@ class ShardingSection(BaseSection):
                 error_log_line = re.sub(r' \S+\.\S+ ', ' XXX ', error_log_line)
                 error_log_line = re.sub(r'\{.*\}', '...', error_log_line)
 
-                if not errorlines.keys():
-                    errorlines[error_log_line] += 1
-                    continue
-
-                similar_error = False
-                for errorline in errorlines.keys():
-                    similar_error = SequenceMatcher(None, errorline, error_log_line).ratio() >= 0.7
-                    if similar_error:
-                        errorlines[errorline] += 1
-                        break
-
-                if not similar_error:
-                    errorlines[error_log_line] += 1
+                # group similar errors by their template
+                errorlines.add(error_log_line.split())
 
             # clear progress bar again
             if self.mloginfo.progress_bar_enabled:
@@ -153,8 +142,8 @@ class ShardingSection(BaseSection):
             if not len(errorlines):
                 print("  no error messages found.")
             else:
-                for cl in sorted(errorlines, key=lambda x: errorlines[x], reverse=True):
-                    print("%3i  %s" % (errorlines[cl], cl))
+                for cl in sorted(errorlines.clusters, key=lambda x: x.count, reverse=True):
+                    print("%3i  %s" % (cl.count, cl))
         else:
             print("\nto show sharding errors/warnings, run with --errors.")
 
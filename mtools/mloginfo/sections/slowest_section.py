@@ -0,0 +1,95 @@
+import heapq
+
+from .base_section import BaseSection
+
+# log event attribute of each --by choice
+by_attributes = {'duration': 'duration',
+                 'nscannedObjects': 'nscannedObjects',
+                 'keysExamined': 'nscanned',
+                 'numYields': 'numYields'}
+
+
+class SlowestSection(BaseSection):
+    """
+    SlowestSection class.
+
+    This section keeps the N operations with the highest duration (or other
+    counter) in a min-heap of fixed size, so the memory does not depend on
+    the size of the log file, and prints their log lines.
+    """
+
+    name = "slowest"
+    streaming = True
+    mergeable = True
+
+    def __init__(self, mloginfo):
+        BaseSection.__init__(self, mloginfo)
+
+        helptext = 'outputs the N slowest operations'
+        self.mloginfo.argparser_sectiongroup.add_argument('--slowest',
+                                                          action='store',
+                                                          type=int,
+                                                          default=None,
+                                                          metavar='N',
+                                                          help=helptext)
+        helptext = ('counter that --slowest sorts by (default duration)')
+        self.mloginfo.argparser_sectiongroup.add_argument(
+            '--by', action='store', default='duration',
+            choices=list(by_attributes), help=helptext)
+
+    @property
+    def active(self):
+        """Return boolean if this section is active."""
+        return self.mloginfo.args['slowest'] is not None
+
+    def setup(self):
+        """Start with an empty heap."""
+        self.size = self.mloginfo.args['slowest']
+        if self.size < 1:
+            raise SystemExit('Error: --slowest needs a positive number of '
+                             'operations.')
+        self.attribute = by_attributes[self.mloginfo.args['by']]
+        # (value, line) tuples, the smallest value first
+        self.heap = []
+
+    def _push(self, entry):
+        heap = self.heap
+        if len(heap) < self.size:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    def process(self, logevent):
+        """Keep the log line if it is one of the N slowest so far."""
+        value = getattr(logevent, self.attribute)
+        if value is None:
+            return
+        heap = self.heap
+        if len(heap) >= self.size and value < heap[0][0]:
+            # fast path, no need to compose the line
+            return
+        self._push((value, logevent.line_str))
+
+    def partial(self):
+        """Return the heap."""
+        return self.heap
+
+    def merge(self, partial):
+        """Add the operations of another byte range."""
+        for entry in partial:
+            self._push(entry)
+
+    def report(self):
+        """Print out the N slowest operations, the slowest first."""
+        if not self.heap:
+            print('no operations found.')
+            return
+
+        by = self.mloginfo.args['by']
+        print('%s slowest operations by %s%s:\n'
+              % (len(self.heap), by, ' (ms)' if by == 'duration' else ''))
+        entries = sorted(self.heap, reverse=True)
+        width = max(len(str(value)) for value, _ in entries)
+        for value, line in entries:
+            print('%s  %s' % (str(value).rjust(width), line))
+        print('')
@@ -1,14 +1,11 @@
-from collections import namedtuple
-from operator import itemgetter
-
 from .base_section import BaseSection
 from mtools.util import OrderedDict
-from mtools.util.grouping import Grouping
 from mtools.util.print_table import print_table
-from mtools.util.logformat import LogFormat
+from mtools.util.stats import StreamingStats
 
-LogTuple = namedtuple('LogTuple', ['namespace', 'operation', 'bytesRead',
-                      'bytesWritten', 'timeReadingMicros', 'timeWritingMicros'])
+# storage counters of a log event, in the order of the report
+storage_fields = ['bytesRead', 'bytesWritten', 'timeReadingMicros',
+                  'timeWritingMicros']
 
 
 def op_or_cmd(le):
@@ -16,9 +13,17 @@ def op_or_cmd(le):
 
 
 class StorageStatsSection(BaseSection):
-    """StorageStatsSection class."""
+    """
+    StorageStatsSection class.
+
+    This section aggregates the storage counters of inserts and updates per
+    namespace and operation, with streaming statistics, so the memory only
+    grows with the number of namespaces.
+    """
 
     name = "Storage Statistics "
+    streaming = True
+    mergeable = True
 
     def __init__(self, mloginfo):
         BaseSection.__init__(self, mloginfo)
@@ -34,65 +39,85 @@ class StorageStatsSection(BaseSection):
         """Return boolean if this section is active."""
         return self.mloginfo.args['storagestats']
 
-    def run(self):
-        """Run this section and print out information."""
-        grouping = Grouping(group_by=lambda x: (x.namespace, x.operation,
-                                                x.bytesRead, x.bytesWritten,
-                                                x.timeReadingMicros,
-                                                x.timeWritingMicros))
-        logfile = self.mloginfo.logfile
-
-        if logfile.start and logfile.end:
-            progress_start = self.mloginfo._datetime_to_epoch(logfile.start)
-            progress_total = (self.mloginfo._datetime_to_epoch(logfile.end) -
-                              progress_start)
-        else:
-            self.mloginfo.progress_bar_enabled = False
-
-        for i, le in enumerate(logfile):
-            # update progress bar every 1000 lines
-            if self.mloginfo.progress_bar_enabled and (i % 1000 == 0):
-                if le.datetime:
-                    progress_curr = self.mloginfo._datetime_to_epoch(le.datetime)
-                    if progress_total:
-                        (self.mloginfo.update_progress(
-                            float(progress_curr - progress_start) / progress_total))
-
-            if (le.operation in ['update'] or le.command in ['insert']):
-                lt = LogTuple(namespace=le.namespace, operation=op_or_cmd(le),
-                              bytesRead=le.bytesRead, bytesWritten=le.bytesWritten,
-                              timeReadingMicros=le.timeReadingMicros,
-                              timeWritingMicros=le.timeWritingMicros)
-                grouping.add(lt)
-
-        grouping.sort_by_size()
-
-        # clear progress bar again
-        if self.mloginfo.progress_bar_enabled:
-            self.mloginfo.update_progress(1.0)
-
-        # no queries in the log file
-        if not len(grouping):
+    def setup(self):
+        """Start without namespaces."""
+        # (namespace, operation) -> [count, {field: StreamingStats}]
+        self.stats = OrderedDict()
+
+    def process(self, le):
+        """Add the storage statistics of inserts and updates."""
+        if (le.operation in ['update'] or le.command in ['insert']):
+            key = (le.namespace, op_or_cmd(le))
+            entry = self.stats.get(key)
+            if entry is None:
+                entry = self.stats[key] = [0, {}]
+            entry[0] += 1
+            fields = entry[1]
+            for field in storage_fields:
+                value = getattr(le, field)
+                if value is not None:
+                    stats = fields.get(field)
+                    if stats is None:
+                        stats = fields[field] = StreamingStats()
+                    stats.add(value)
+
+    def partial(self):
+        """Return the statistics per namespace and operation."""
+        return self.stats
+
+    def merge(self, partial):
+        """Add the statistics of another byte range."""
+        for key, (count, fields) in partial.items():
+            entry = self.stats.get(key)
+            if entry is None:
+                self.stats[key] = [count, fields]
+                continue
+            entry[0] += count
+            for field, stats in fields.items():
+                if field in entry[1]:
+                    entry[1][field].merge(stats)
+                else:
+                    entry[1][field] = stats
+
+    def report(self):
+        """Print out the storage statistics, the most operations first."""
+        # no inserts or updates in the log file
+        if not self.stats:
             print('no statistics found.')
             return
 
-        titles = ['namespace', 'operation', 'bytesRead', 'bytesWritten',
-                  'timeReadingMicros', 'timeWritingMicros']
+        rounding = self.mloginfo.args['rounding']
+        titles = ['namespace', 'operation', 'count', 'counter', 'sum', 'mean',
+                  '95%-ile', 'max']
         table_rows = []
 
-        for g in grouping:
-            # calculate statistics for this group
-            namespace, op, bytesRead, bytesWritten, timeReadingMicros, timeWritingMicros = g
-
-            stats = OrderedDict()
-            stats['namespace'] = namespace
-            stats['operation'] = op
-            stats['bytesRead'] = bytesRead
-            stats['bytesWritten'] = bytesWritten
-            stats['timeReadingMicros'] = timeReadingMicros
-            stats['timeWritingMicros'] = timeWritingMicros
-
-            table_rows.append(stats)
+        entries = sorted(self.stats.items(), key=lambda item: item[1][0],
+                         reverse=True)
+        for (namespace, op), (count, fields) in entries:
+            rows = []
+            for field in storage_fields:
+                stats = fields.get(field)
+                if stats is None:
+                    continue
+                row = OrderedDict()
+                row['namespace'] = namespace
+                row['operation'] = op
+                row['count'] = count
+                row['counter'] = field
+                row['sum'] = stats.sum
+                row['mean'] = round(stats.mean, rounding)
+                row['95%'] = round(stats.percentile(95), rounding)
+                row['max'] = stats.max
+                rows.append(row)
+
+            if not rows:
+                # no storage counters in the log lines
+                row = OrderedDict([('namespace', namespace),
+                                   ('operation', op), ('count', count)])
+                for field in ['counter', 'sum', 'mean', '95%', 'max']:
+                    row[field] = '-'
+                rows.append(row)
+            table_rows.extend(rows)
 
         print_table(table_rows, titles, uppercase_headers=False)
         print('')
@@ -0,0 +1,286 @@
+import csv
+from array import array
+from collections import defaultdict
+from datetime import datetime
+
+from .base_section import BaseSection
+from mtools.util import OrderedDict
+from mtools.util.print_table import print_table
+from mtools.util.stats import StreamingStats, sample_note
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# bucket sizes in seconds that can be given by name
+timeunits = {'sec': 1, 's': 1, 'min': 60, 'm': 60, 'hour': 3600, 'h': 3600,
+             'day': 86400, 'd': 86400}
+
+
+def bucket_size(string):
+    """Return the bucket size in seconds of --timeline, see timeunits."""
+    try:
+        size = timeunits[string] if string in timeunits else int(string)
+    except ValueError:
+        size = 0
+    if size < 1:
+        raise SystemExit("Error: --timeline needs a number of seconds or one "
+                         "of %s." % ', '.join(sorted(timeunits)))
+    return size
+
+
+def op_or_cmd(le):
+    return le.operation if le.operation != 'command' else le.command
+
+
+class TimelineSection(BaseSection):
+    """
+    TimelineSection class.
+
+    This section shows the throughput and latency of each operation and
+    namespace per time bucket. Only the timestamp (8 bytes) and duration
+    (4 bytes) of each operation are kept, in compact arrays per operation
+    and namespace, and binned at the end. The state() for --state-file only
+    keeps the count and a StreamingStats of the durations per bucket. The
+    section is not mergeable, the exact statistics need all values of a
+    bucket, so with --jobs the file is read in one process.
+    """
+
+    name = "timeline"
+    streaming = True
+    stateful = True
+
+    def __init__(self, mloginfo):
+        BaseSection.__init__(self, mloginfo)
+
+        helptext = ('outputs the number of operations, operations per second '
+                    'and latency per BUCKET seconds (or sec, min, hour, day) '
+                    'for each operation and namespace')
+        self.mloginfo.argparser_sectiongroup.add_argument('--timeline',
+                                                          action='store',
+                                                          default=None,
+                                                          metavar='BUCKET',
+                                                          help=helptext)
+        helptext = 'write the --timeline table to a CSV file instead'
+        self.mloginfo.argparser_sectiongroup.add_argument('--timeline-csv',
+                                                          action='store',
+                                                          default=None,
+                                                          metavar='PATH',
+                                                          help=helptext)
+
+    @property
+    def active(self):
+        """Return boolean if this section is active."""
+        return self.mloginfo.args['timeline'] is not None
+
+    def setup(self):
+        """Start with empty arrays."""
+        self.bucket = bucket_size(self.mloginfo.args['timeline'])
+        # (operation, namespace) -> (epoch seconds, duration in ms or NaN)
+        self.series = defaultdict(lambda: (array('q'), array('f')))
+        # (operation, namespace) -> {bucket start: [count, StreamingStats]}
+        # of earlier runs, see state()
+        self.buckets = {}
+
+    def process(self, le):
+        """Add the timestamp and duration of an operation."""
+        if le.operation is None:
+            return
+        dt = le.datetime
+        if dt is None:
+            return
+        timestamps, durations = self.series[(op_or_cmd(le), le.namespace)]
+        timestamps.append(int(dt.timestamp()))
+        duration = le.duration
+        durations.append(float('nan') if duration is None else duration)
+
+    def state(self):
+        """
+        Return the count and duration statistics per bucket.
+
+        Unlike the arrays, this does not keep every operation, so the state
+        only grows with the number of buckets.
+        """
+        return self._aggregates()
+
+    def restore(self, state):
+        """Continue from the buckets of an earlier run."""
+        self.buckets = state
+
+    def _aggregates(self):
+        """Return the buckets of earlier runs with the operations added."""
+        bucket = self.bucket
+        buckets = {}
+        for key, entries in self.buckets.items():
+            buckets[key] = dict((start, [count, StreamingStats().merge(stats)])
+                                for start, (count, stats) in entries.items())
+        for key, (timestamps, durations) in self.series.items():
+            entries = buckets.setdefault(key, {})
+            for timestamp, duration in zip(timestamps, durations):
+                start = timestamp // bucket * bucket
+                entry = entries.get(start)
+                if entry is None:
+                    entry = entries[start] = [0, StreamingStats()]
+                entry[0] += 1
+                if duration == duration:
+                    # not NaN
+                    entry[1].add(duration)
+        return buckets
+
+    def _bins(self, timestamps, durations, origin):
+        """
+        Yield (bucket start, count, mean, 95%-ile, max) of the operations.
+
+        Vectorized with numpy: the durations are sorted by bucket and value
+        once, then the statistics of all buckets are read off the sorted
+        array by position.
+        """
+        bucket = self.bucket
+        timestamps = np.frombuffer(timestamps, dtype=np.int64)
+        durations = np.frombuffer(durations, dtype=np.float32)
+        bins = (timestamps - origin) // bucket
+        counts = np.bincount(bins)
+
+        valid = ~np.isnan(durations)
+        bins_valid = bins[valid]
+        durations_valid = durations[valid].astype(np.float64)
+        order = np.lexsort((durations_valid, bins_valid))
+        durations_sorted = durations_valid[order]
+        n = np.bincount(bins_valid, minlength=len(counts))
+        sums = np.bincount(bins_valid, weights=durations_valid,
+                           minlength=len(counts))
+        starts = np.cumsum(n) - n
+
+        # linear interpolation between the closest ranks, like np.percentile
+        has = n > 0
+        pos = (np.maximum(n, 1) - 1) * 0.95
+        lower = starts + np.floor(pos).astype(np.int64)
+        upper = np.minimum(lower + 1, starts + np.maximum(n, 1) - 1)
+        if len(durations_sorted):
+            lower = np.where(has, lower, 0)
+            upper = np.where(has, upper, 0)
+            low = durations_sorted[lower]
+            p95 = low + (durations_sorted[upper] - low) * (pos % 1)
+            top = durations_sorted[np.where(has, starts + n - 1, 0)]
+        else:
+            p95 = top = np.zeros(len(counts))
+        means = sums / np.maximum(n, 1)
+
+        for b in np.nonzero(counts)[0]:
+            start = origin + int(b) * bucket
+            if has[b]:
+                yield (start, int(counts[b]), float(means[b]), float(p95[b]),
+                       float(top[b]))
+            else:
+                yield start, int(counts[b]), None, None, None
+
+    def _bins_python(self, timestamps, durations, origin):
+        """Yield the statistics of _bins() without numpy, no 95%-ile."""
+        bucket = self.bucket
+        stats = defaultdict(lambda: [0, 0., 0, None])
+        for timestamp, duration in zip(timestamps, durations):
+            s = stats[(timestamp - origin) // bucket]
+            s[0] += 1
+            if duration == duration:
+                # not NaN
+                s[1] += duration
+                s[2] += 1
+                if s[3] is None or duration > s[3]:
+                    s[3] = duration
+        for b in sorted(stats):
+            count, total, n, top = stats[b]
+            if n:
+                yield origin + b * bucket, count, total / n, 'n/a', top
+            else:
+                yield origin + b * bucket, count, None, None, None
+
+    @staticmethod
+    def _bins_aggregated(entries):
+        """Yield the statistics of _bins() from the buckets of state()."""
+        for start in sorted(entries):
+            count, stats = entries[start]
+            if stats.count:
+                yield (start, count, stats.mean,
+                       float(stats.percentile(95)), stats.max)
+            else:
+                yield start, count, None, None, None
+
+    def _series_bins(self):
+        """Yield each operation and namespace with the statistics of bins."""
+        if self.buckets:
+            # continued from an earlier run, only the buckets are known
+            for key, entries in self._aggregates().items():
+                yield key, self._bins_aggregated(entries)
+            return
+
+        starts = [min(timestamps) for timestamps, _ in self.series.values()
+                  if len(timestamps)]
+        if not starts:
+            return
+        origin = min(starts) // self.bucket * self.bucket
+        bins = self._bins if np is not None else self._bins_python
+        for key, (timestamps, durations) in self.series.items():
+            yield key, bins(timestamps, durations, origin)
+
+    def rows(self):
+        """Return the table rows, ordered by time, namespace and operation."""
+        logfile = self.mloginfo.logfile
+        rounding = self.mloginfo.args['rounding']
+        fraction = logfile.sample_fraction
+        scale = 1. / fraction if fraction else 1.
+
+        rows = []
+        for (op, namespace), bins in self._series_bins():
+            for start, count, mean, p95, top in bins:
+                count = int(round(count * scale))
+                row = OrderedDict()
+                row['time'] = datetime.fromtimestamp(start, logfile.timezone)
+                row['namespace'] = namespace
+                row['operation'] = op
+                row['count'] = count
+                row['ops/s'] = round(float(count) / self.bucket, rounding)
+                for field, value in (('mean', mean), ('95%', p95),
+                                     ('max', top)):
+                    if value is None:
+                        # no durations in this bucket
+                        value = '-'
+                    elif isinstance(value, float):
+                        value = round(value, rounding)
+                    row[field] = value
+                rows.append(row)
+
+        rows.sort(key=lambda row: (row['time'], str(row['namespace']),
+                                   str(row['operation'])))
+        return rows
+
+    def report(self):
+        """Print out or write the timeline."""
+        rows = self.rows()
+        if not rows:
+            print('no operations found.')
+            return
+
+        path = self.mloginfo.args['timeline_csv']
+        if path:
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(list(rows[0].keys()))
+                for row in rows:
+                    row['time'] = row['time'].isoformat()
+                    writer.writerow(list(row.values()))
+            print('%i rows written to %s.' % (len(rows), path))
+            print('')
+            return
+
+        for row in rows:
+            row['time'] = row['time'].strftime("%Y %b %d %H:%M:%S")
+        titles = ['time', 'namespace', 'operation', 'count', 'ops/s',
+                  'mean (ms)', '95%-ile (ms)', 'max (ms)']
+        print_table(rows, titles, uppercase_headers=False)
+        print('')
+
+        fraction = self.mloginfo.logfile.sample_fraction
+        if fraction is not None and fraction < 1:
+            print(sample_note(fraction))
+            print('')
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep the bounds cache of each test out of the home directory."""
+    monkeypatch.setenv('MTOOLS_CACHE_DIR', str(tmp_path / 'mtools-cache'))
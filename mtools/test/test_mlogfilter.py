@@ -363,6 +363,82 @@ class TestMLogFilter(object):
         for line in output.splitlines():
             assert('lock' in line)
 
+    def test_count(self):
+        self.tool.run('%s --operation insert query' % self.logfile_path)
+        expected = len(sys.stdout.getvalue().splitlines())
+
+        self.tool = MLogFilterTool()
+        self.tool.run('%s --operation insert query --count'
+                      % self.logfile_path)
+        output = sys.stdout.getvalue().splitlines()
+        assert int(output[-1]) == expected
+
+    def test_count_group_by(self):
+        self.tool.run('%s --count --group-by operation' % self.logfile_path)
+        lines = sys.stdout.getvalue().splitlines()
+        assert lines[0].split() == ['operation', 'count']
+        counts = dict(line.split() for line in lines[2:])
+        assert int(counts['insert']) == 17
+        assert sum(int(c) for c in counts.values()) == len(self.logfile)
+
+    def test_stats(self):
+        self.tool.run('%s --operation insert --slow 200 --stats'
+                      % self.logfile_path)
+        lines = sys.stdout.getvalue().splitlines()
+        assert lines[0] == 'duration:'
+        headers = lines[1].split()
+        assert headers[:4] == ['count', 'values', 'min', 'max']
+        row = dict(zip(headers, lines[3].split()))
+        assert int(row['count']) > 0
+        assert int(row['min']) >= 200
+        assert float(row['min']) <= float(row['95%']) <= float(row['max'])
+
+    @pytest.mark.xfail(raises=SystemExit)
+    def test_group_by_without_count(self):
+        self.tool.run('%s --group-by namespace' % self.logfile_path)
+
+    def test_many_files(self):
+        # bounds of many files are calculated concurrently
+        self.tool.run('%s --markers none --count'
+                      % ' '.join([self.logfile_path] * 4))
+        output = sys.stdout.getvalue().splitlines()
+        assert int(output[-1]) == 4 * len(self.logfile)
+
+    def test_sample(self):
+        self.tool.run('%s --sample 0.5 --sample-seed 1' % self.logfile_path)
+        lines = sys.stdout.getvalue().splitlines()
+        assert 0 < len(lines) < len(self.logfile)
+
+    def test_sample_count(self):
+        self.tool.run('%s --sample 0.5 --sample-seed 1 --count'
+                      % self.logfile_path)
+        lines = sys.stdout.getvalue().splitlines()
+        estimate, margin = lines[0].split(' +/- ')
+        assert abs(int(estimate) - len(self.logfile)) <= int(margin)
+        assert lines[1].startswith('note: estimated from a')
+
+    def test_sample_lines(self):
+        self.tool.run('%s --sample-lines 20' % self.logfile_path)
+        assert len(sys.stdout.getvalue().splitlines()) == 20
+
+    def test_build_index(self, tmp_path):
+        path = str(tmp_path / 'mongod.log')
+        with open(self.logfile_path, 'rb') as src, open(path, 'wb') as dst:
+            dst.write(src.read())
+
+        self.tool.run('%s --thread conn15' % path)
+        unindexed = sys.stdout.getvalue()
+
+        self.tool = MLogFilterTool()
+        self.tool.run('%s --thread conn15 --build-index' % path)
+        assert os.path.exists(path + '.mtindex')
+        assert sys.stdout.getvalue()[len(unindexed):] == unindexed
+        assert unindexed
+
+    @pytest.mark.xfail(raises=SystemExit)
+    def test_sample_invalid_rate(self):
+        self.tool.run('%s --sample 2' % self.logfile_path)
+
     def test_mask_end(self):
         mask_path = os.path.join(os.path.dirname(mtools.__file__),
                                  'test/logfiles/', 'mask_centers.log')
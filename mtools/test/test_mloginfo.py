@@ -1,5 +1,6 @@
 import io
 import os
+import pickle
 import re
 import sys
 from datetime import timedelta, date
@@ -9,7 +10,10 @@ import pytest
 
 import mtools
 from mtools.mloginfo.mloginfo import MLogInfoTool
+from mtools.mloginfo.sections.base_section import BaseSection
 from mtools.util.logfile import LogFile
+from mtools.util.mtbin import MtbinWriter
+from mtools.util.stats import StreamingStats
 
 
 @pytest.fixture(scope="function", autouse=True)
@@ -95,6 +99,33 @@ class TestMLogInfo(object):
         assert len([l for l in lines if l.strip().startswith('end')]) == 2
         assert len([l for l in lines if l.strip().startswith('-----')]) == 1
 
+    def test_multiple_files_jobs(self):
+        other_path = os.path.join(os.path.dirname(mtools.__file__),
+                                  'test/logfiles/',
+                                  'mongod_4.0.10_allowdiskuse.log')
+        args = '%s %s %s --queries --connections' % (
+            self.logfile_path, other_path, self.logfile_path)
+        self.tool.run(args)
+        serial = sys.stdout.getvalue()
+        self.tool = MLogInfoTool()
+        self.tool.run(args + ' --jobs 2')
+        parallel = sys.stdout.getvalue()[len(serial):]
+        assert parallel == serial
+
+    def test_byte_ranges_jobs(self):
+        logfile_path = os.path.join(os.path.dirname(mtools.__file__),
+                                    'test/logfiles/',
+                                    'mongod_4.0.10_allowdiskuse.log')
+        args = ('%s --queries --distinct --storagestats --slowest 5 '
+                '--timeline 30' % logfile_path)
+        self.tool.run(args)
+        serial = sys.stdout.getvalue()
+        self.tool = MLogInfoTool()
+        self.tool.split_min_size = 0
+        self.tool.run(args + ' --jobs 3')
+        parallel = sys.stdout.getvalue()[len(serial):]
+        assert parallel == serial
+
     def test_30_ctime(self):
         self._test_init('mongod_306_ctime.log')
         self.tool.run('%s' % self.logfile_path)
@@ -139,8 +170,38 @@ class TestMLogInfo(object):
         output = sys.stdout.getvalue()
         lines = output.splitlines()
         assert any(map(lambda line: 'DISTINCT' in line, lines))
-        assert len(list(filter(lambda line: re.match(r'\s+\d+\s+\w+', line),
-                          lines))) > 10
+        # the Drain templates with at least --distinctmin (5) lines
+        groups = [line for line in lines
+                  if re.match(r'\s+\d+\s+[0-9a-f]{8}\s+\S', line)]
+        assert len(groups) == 9
+        assert all(int(line.split()[0]) >= 5 for line in groups)
+
+    def test_distinct_legacy_templates(self):
+        self.tool.run('%s --distinct' % self.logfile_path)
+        lines = sys.stdout.getvalue().splitlines()
+        start = lines.index('DISTINCT')
+        first = next(line for line in lines[start + 1:] if line)
+
+        # most frequent template first, with its stable id
+        count, template_id, template = first.split(None, 2)
+        assert template == 'connection accepted from ... ... ... ... now open)'
+        assert template_id == '26393b23'
+        assert int(count) == sum(1 for le in self.logfile
+                                 if 'connection accepted from' in le.line_str)
+        assert '     177  ca8779e5  end connection ... ... connections now ' \
+               'open)' in lines
+
+    def test_distinct_legacy_jobs(self):
+        # templates depend on the order of the lines, no byte ranges
+        self.tool.run('%s --distinct' % self.logfile_path)
+        serial = sys.stdout.getvalue()
+        self.tool = MLogInfoTool()
+        self.tool.split_min_size = 0
+        self.tool.run('%s --distinct --jobs 3' % self.logfile_path)
+        assert sys.stdout.getvalue()[len(serial):] == serial
+        distinct = next(section for section in self.tool.sections
+                        if section.name == 'distinct')
+        assert not distinct.mergeable
 
     def test_connections_output(self):
         # different log file
@@ -199,11 +260,10 @@ class TestMLogInfo(object):
                                     'test/logfiles/connstats',
                                     ('mongod_3_4-9_connection_stats_start_'
                                      'connid_repeated.log'))
-        try:
-            self.tool.run('%s --connstats' % logfile_path)
-        except NotImplementedError as e:
-            assert("Multiple start datetimes found for the same connection ID"
-                   in str(e))
+        # the second start of an open connection id starts it anew
+        self.tool.run('%s --connstats' % logfile_path)
+        output = sys.stdout.getvalue()
+        assert 'overall average connection duration(s):' in output
 
     def test_connstats_endconnid_repeated(self):
         logfile_path = os.path.join(os.path.dirname(mtools.__file__),
@@ -221,11 +281,10 @@ class TestMLogInfo(object):
                                     'test/logfiles/connstats',
                                     ('mongod_3_4-9_connection_stats_start_'
                                      'end_connid_repeated.log'))
-        try:
-            self.tool.run('%s --connstats' % logfile_path)
-        except NotImplementedError as e:
-            assert("Multiple start datetimes found for the same connection ID"
-                   in str(e))
+        # the second start of an open connection id starts it anew
+        self.tool.run('%s --connstats' % logfile_path)
+        output = sys.stdout.getvalue()
+        assert 'overall average connection duration(s):' in output
 
     def test_connstats_connid_not_digit(self):
         logfile_path = os.path.join(os.path.dirname(mtools.__file__),
@@ -297,6 +356,34 @@ class TestMLogInfo(object):
         assert any(map(lambda line: 'overall maximum connection duration(s): -'
                        in line, lines))
 
+    def test_connstats_logv2(self, tmp_path):
+        logfile_path = str(tmp_path / 'mongod.log')
+        events = [('10:30:00', 22943, 1, '10.0.0.1:50000'),
+                  ('10:30:01', 22943, 2, '10.0.0.2:50001'),
+                  ('10:30:05', 22944, 1, '10.0.0.1:50000'),
+                  ('10:30:06', 22943, 1, '10.0.0.1:50002'),
+                  ('10:30:16', 22944, 1, '10.0.0.1:50002')]
+        with open(logfile_path, 'w') as f:
+            for time, msg_id, connid, remote in events:
+                f.write('{"t":{"$date":"2021-01-11T%s.000+00:00"},"s":"I",'
+                        '"c":"NETWORK","id":%i,"ctx":"listener",'
+                        '"msg":"Connection","attr":{"remote":"%s",'
+                        '"connectionId":%i}}\n'
+                        % (time, msg_id, remote, connid))
+
+        self.tool.run('%s --connstats' % logfile_path)
+        lines = sys.stdout.getvalue().splitlines()
+
+        assert '     total opened: 3' in lines
+        assert '     total closed: 2' in lines
+        assert 'overall average connection duration(s): 7.5' in lines
+        # the connection id is reused after it was closed
+        assert any(line.startswith('10.0.0.1') and
+                   'dur-min(s): 5 ' in line and 'dur-max(s): 10 ' in line
+                   for line in lines)
+        assert any(line.startswith('10.0.0.2') and 'closed: 0 ' in line
+                   for line in lines)
+
     def test_queries_output(self):
         # different log file
         self.tool.run('%s --queries' % self.logfile_path)
@@ -307,6 +394,225 @@ class TestMLogInfo(object):
         restring = r'\w+\.\w+\s+(query|update|getmore|allowDiskUse)\s+{'
         assert len(list(filter(lambda line: re.match(restring, line), lines))) >= 1
 
+    def test_queries_sample(self):
+        logfile_path = os.path.join(os.path.dirname(mtools.__file__),
+                                    'test/logfiles/',
+                                    'mongod_4.0.10_allowdiskuse.log')
+        self.tool.run('%s --queries --sample 0.5 --sample-seed 3'
+                      % logfile_path)
+        output = sys.stdout.getvalue()
+        lines = output.splitlines()
+        header = [line for line in lines if line.startswith('namespace')][0]
+        assert '+/-' in header.split()
+        assert any(line.startswith('note: estimated from a 50% sample')
+                   for line in lines)
+
+    def test_queries_mtbin(self, tmp_path):
+        logfile_path = os.path.join(os.path.dirname(mtools.__file__),
+                                    'test/logfiles/',
+                                    'mongod_4.0.10_allowdiskuse.log')
+        mtbin_path = str(tmp_path / 'filtered.mtbin')
+        logfile = LogFile(open(logfile_path, 'rb'))
+        with open(mtbin_path, 'wb') as f:
+            writer = MtbinWriter(f, MtbinWriter.header_for([logfile]))
+            for logevent in logfile:
+                writer.write(logevent)
+
+        self.tool.run('%s --queries' % logfile_path)
+        direct = sys.stdout.getvalue()
+        self.tool = MLogInfoTool()
+        self.tool.run('%s --queries' % mtbin_path)
+        piped = sys.stdout.getvalue()[len(direct):]
+
+        # same bounds and queries, without parsing the lines again
+        assert piped.replace(mtbin_path, logfile_path) == direct
+
+    def test_state_file(self, tmp_path):
+        log_path = str(tmp_path / 'mongod.log')
+        state_path = str(tmp_path / 'mloginfo.state')
+        with open(self.logfile_path, 'rb') as f:
+            data = f.read()
+        half = data.index(b'\n', len(data) // 2) + 1
+
+        def run(content, mode='wb', state=True):
+            with open(log_path, mode) as f:
+                f.write(content)
+            args = ('%s --queries --connections --connstats --distinct'
+                    % log_path)
+            if state:
+                args += ' --state-file %s' % state_path
+            start = len(sys.stdout.getvalue())
+            self.tool = MLogInfoTool()
+            self.tool.run(args)
+            return sys.stdout.getvalue()[start:]
+
+        full = run(data, state=False)
+        run(data[:half])
+        # only reads the appended lines, same output as a full run
+        assert run(data[half:], mode='ab') == full
+        assert self.tool._byte_range == (half, len(data))
+        assert run(b'', mode='ab') == full
+
+        # starts over after rotation
+        assert run(data[half:]) == run(data[half:], state=False)
+
+    def test_state_file_jobs(self, tmp_path):
+        log_path = str(tmp_path / 'mongod.log')
+        state_path = str(tmp_path / 'mloginfo.state')
+        with open(self.logfile_path, 'rb') as f:
+            data = f.read()
+        half = data.index(b'\n', len(data) // 2) + 1
+
+        def run(content, mode='wb', state=True, jobs=1):
+            with open(log_path, mode) as f:
+                f.write(content)
+            args = '%s --queries --storagestats --slowest 3' % log_path
+            if state:
+                args += ' --state-file %s' % state_path
+            args += ' --jobs %i' % jobs
+            start = len(sys.stdout.getvalue())
+            self.tool = MLogInfoTool()
+            self.tool.split_min_size = 0
+            self.tool.run(args)
+            return sys.stdout.getvalue()[start:]
+
+        full = run(data, state=False)
+        run(data[:half])
+        # the workers only return the new lines, the saved state is added once
+        assert run(data[half:], mode='ab', jobs=3) == full
+
+    def test_state_file_timeline(self, tmp_path):
+        log_path = str(tmp_path / 'mongod.log')
+        state_path = str(tmp_path / 'mloginfo.state')
+        with open(self.logfile_path, 'rb') as f:
+            data = f.read()
+        half = data.index(b'\n', len(data) // 2) + 1
+
+        def rows(content, mode='wb', state=True):
+            with open(log_path, mode) as f:
+                f.write(content)
+            args = '%s --timeline min' % log_path
+            if state:
+                args += ' --state-file %s' % state_path
+            start = len(sys.stdout.getvalue())
+            self.tool = MLogInfoTool()
+            self.tool.run(args)
+            lines = sys.stdout.getvalue()[start:].splitlines()
+            lines = lines[lines.index('TIMELINE') + 3:]
+            # all but the estimated 95%-ile
+            return [line.split()[:-2] + line.split()[-1:]
+                    for line in lines if line.strip()]
+
+        full = rows(data, state=False)
+        rows(data[:half])
+        assert rows(data[half:], mode='ab') == full
+
+        # only the statistics per bucket are saved, not every operation
+        with open(state_path, 'rb') as f:
+            buckets = pickle.load(f)['sections']['timeline']
+        entries = [entry for series in buckets.values()
+                   for entry in series.values()]
+        assert all(isinstance(stats, StreamingStats)
+                   for _, stats in entries)
+        assert sum(count for count, _ in entries) == sum(int(row[6])
+                                                        for row in full)
+
+    def test_state_file_missing_keys(self, tmp_path):
+        state_path = tmp_path / 'mloginfo.state'
+        with open(state_path, 'wb') as f:
+            pickle.dump({'version': MLogInfoTool.state_version}, f)
+        # an incomplete state is discarded, the log file is read from the start
+        self.tool.run('%s --queries --state-file %s'
+                      % (self.logfile_path, state_path))
+        assert self.tool._byte_range[0] == 0
+        assert 'QUERIES' in sys.stdout.getvalue().splitlines()
+
+    @pytest.mark.xfail(raises=SystemExit)
+    def test_state_file_unsupported_section(self):
+        self.tool.run('%s --restarts --state-file /dev/null'
+                      % self.logfile_path)
+
+    def test_state_file_stateless_section(self, tmp_path):
+        class StreamingSection(BaseSection):
+            name = 'streaming'
+            active = True
+            streaming = True
+
+        # a streaming section without state() and restore()
+        self.tool.sections.append(StreamingSection(self.tool))
+        with pytest.raises(SystemExit):
+            self.tool.run('%s --state-file %s'
+                          % (self.logfile_path, tmp_path / 'mloginfo.state'))
+        assert not (tmp_path / 'mloginfo.state').exists()
+
+    def test_slowest(self):
+        self.tool.run('%s --slowest 3' % self.logfile_path)
+        lines = sys.stdout.getvalue().splitlines()
+        start = lines.index('SLOWEST')
+        assert lines[start + 1] == '3 slowest operations by duration (ms):'
+
+        durations = sorted((le.duration for le in self.logfile
+                            if le.duration is not None), reverse=True)
+        reported = [int(line.split()[0])
+                    for line in lines[start + 3:start + 6]]
+        assert reported == durations[:3]
+        assert lines[start + 3].endswith('56331ms')
+
+    def test_timeline(self, tmp_path):
+        self.tool.run('%s --timeline min' % self.logfile_path)
+        lines = sys.stdout.getvalue().splitlines()
+        start = lines.index('TIMELINE')
+        assert lines[start + 1].split()[:4] == ['time', 'namespace',
+                                                'operation', 'count']
+        rows = [line.split() for line in lines[start + 3:] if line.strip()]
+        # year, month, day, time, namespace, operation, count, ops/s, ...
+        removes = [row[2:] for row in rows if row[5] == 'remove']
+        assert removes == [['05', '20:27:00', 'test.docs', 'remove', '1',
+                            '0.0', '56331.0', '56331.0', '56331.0']]
+
+        operations = [le for le in self.logfile
+                      if le.operation is not None and le.datetime]
+        assert sum(int(row[6]) for row in rows) == len(operations)
+
+        csv_path = str(tmp_path / 'timeline.csv')
+        self.tool = MLogInfoTool()
+        self.tool.run('%s --timeline 3600 --timeline-csv %s'
+                      % (self.logfile_path, csv_path))
+        with open(csv_path) as f:
+            csv_lines = f.read().splitlines()
+        assert csv_lines[0] == ('time,namespace,operation,count,ops/s,mean,'
+                                '95%,max')
+        assert sum(int(line.split(',')[3])
+                   for line in csv_lines[1:]) == len(operations)
+
+    def test_timeline_jobs(self):
+        # all durations of a bucket are needed, no byte ranges
+        self.tool.run('%s --timeline min' % self.logfile_path)
+        serial = sys.stdout.getvalue()
+        self.tool = MLogInfoTool()
+        self.tool.split_min_size = 0
+        self.tool.run('%s --timeline min --jobs 3' % self.logfile_path)
+        assert sys.stdout.getvalue()[len(serial):] == serial
+        timeline = next(section for section in self.tool.sections
+                        if section.name == 'timeline')
+        assert not timeline.mergeable
+
+    @pytest.mark.xfail(raises=SystemExit)
+    def test_follow_unsupported_section(self):
+        self.tool.run('%s --restarts --follow' % self.logfile_path)
+
+    def test_streaming_sections_single_pass(self):
+        logfile_path = os.path.join(os.path.dirname(mtools.__file__),
+                                    'test/logfiles/',
+                                    'mongod_4.0.10_allowdiskuse.log')
+        self.tool.run('%s --queries --connections --storagestats'
+                      % logfile_path)
+        lines = sys.stdout.getvalue().splitlines()
+        assert 'QUERIES' in lines
+        assert 'CONNECTIONS' in lines
+        assert 'STORAGE STATISTICS ' in lines
+        assert any(line.startswith('     total opened:') for line in lines)
+
     def test_storagestats_output(self):
         # different log file
         self.logfile_path = "mtools/test/logfiles/mongod_4.0.10_storagestats.log"
@@ -316,6 +622,16 @@ class TestMLogInfo(object):
         assert any(map(lambda line: '' in line, lines))
         assert any(map(lambda line: line.startswith('STORAGE STATISTICS '), lines))
 
+        # one row per namespace, operation and counter
+        rows = [line.split() for line in lines
+                if line.startswith('invoice-prod.invoices')]
+        assert rows[0] == ['invoice-prod.invoices', 'insert', '2', 'bytesRead',
+                           '25636822', '12818411.0', '12863411.0',
+                           '12868411']
+        assert [row[3] for row in rows] == ['bytesRead', 'bytesWritten',
+                                            'timeReadingMicros',
+                                            'timeWritingMicros']
+
     def test_transactions_output(self):
         # different log file
         logfile_transactions_path = 'mtools/test/logfiles/mongod_4.0.10_slowtransactions.log'
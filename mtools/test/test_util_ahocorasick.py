@@ -0,0 +1,45 @@
+import random
+
+from mtools.util.ahocorasick import AhoCorasick
+
+
+def test_findall():
+    matcher = AhoCorasick(['he', 'she', 'his', 'hers'])
+    assert len(matcher) == 4
+    assert matcher.findall('ushers') == set(['he', 'she', 'hers'])
+    assert matcher.findall('this') == set(['his'])
+    assert matcher.findall('nothing') == set()
+
+
+def test_log_fragments():
+    matcher = AhoCorasick(['connection accepted from ', ' connections now open',
+                           'end connection ', 'replSet info '])
+    line = ("Thu Nov 14 17:58:43.917 [initandlisten] connection accepted "
+            "from 10.10.0.38:37233 #10 (4 connections now open)")
+    assert matcher.findall(line) == set(['connection accepted from ',
+                                         ' connections now open'])
+
+
+def test_empty_word():
+    matcher = AhoCorasick(['', 'a'])
+    assert matcher.findall('') == set([''])
+    assert matcher.findall('bab') == set(['', 'a'])
+
+
+def test_add_after_search():
+    matcher = AhoCorasick(['ab'])
+    assert matcher.findall('xabc') == set(['ab'])
+    matcher.add('bc')
+    matcher.add('abc')
+    assert matcher.findall('xabc') == set(['ab', 'bc', 'abc'])
+
+
+def test_same_as_find():
+    rand = random.Random(42)
+    for _ in range(200):
+        words = [''.join(rand.choice('ab ') for _ in range(rand.randint(1, 5)))
+                 for _ in range(rand.randint(1, 10))]
+        text = ''.join(rand.choice('ab ') for _ in range(rand.randint(0, 40)))
+        matcher = AhoCorasick(words)
+        assert matcher.findall(text) == set(w for w in words
+                                             if text.find(w) >= 0)
@@ -0,0 +1,72 @@
+from mtools.util.drain import Drain, LogCluster, mask_tokens, template_id
+
+
+def test_clusters():
+    drain = Drain()
+    lines = ['end connection 10.0.0.1:5000 (3 connections now open)',
+             'end connection 10.0.0.2:5123 (2 connections now open)',
+             'replSet member host1:27017 is now in state PRIMARY',
+             'replSet member host2:27017 is now in state SECONDARY',
+             'end connection 10.0.0.3:5011 (1 connection now open)']
+    for line in lines:
+        drain.add(line.split())
+
+    assert len(drain) == 2
+    connections, members = drain.clusters
+    assert connections.count == 3
+    assert str(connections) == 'end connection <*> <*> <*> now open)'
+    assert members.count == 2
+    assert str(members) == 'replSet member <*> is now in state <*>'
+
+
+def test_depth_and_length():
+    drain = Drain(depth=3)
+    drain.add('build index done'.split())
+    drain.add('build index started now'.split())
+    drain.add('insert test.docs ok'.split())
+    # different number of tokens or different first token
+    assert len(drain) == 3
+
+
+def test_similarity():
+    drain = Drain(similarity=0.8)
+    drain.add('a b c d e'.split())
+    cluster = drain.add('a b c x y'.split())
+    assert len(drain) == 2
+    assert str(cluster) == 'a b c x y'
+
+    cluster = drain.add('a b c d z'.split())
+    assert len(drain) == 2
+    assert cluster.count == 2
+    assert str(cluster) == 'a b c d <*>'
+
+
+def test_max_children():
+    drain = Drain(depth=3, max_children=3)
+    for word in ['alpha', 'beta', 'gamma', 'delta']:
+        drain.add([word, 'message'])
+    # gamma and delta share the wildcard child and the same template
+    assert len(drain.root[2]) == 3
+    assert len(drain) == 3
+    assert str(drain.clusters[-1]) == '<*> message'
+    assert drain.clusters[-1].count == 2
+
+
+def test_template_id():
+    cluster = LogCluster(['end', 'connection', '...'], 5)
+    # stable across runs, unlike hash()
+    assert cluster.template_id == 'd724c1d0'
+    assert cluster.template_id != template_id(['end', 'connection'])
+
+    # kept while the template becomes more general
+    drain = Drain()
+    first = drain.add('job 1 done in 3ms'.split())
+    assert first.template_id == template_id('job 1 done in 3ms'.split())
+    assert drain.add('job 2 done in 6ms'.split()) is first
+    assert str(first) == 'job <*> done in <*>'
+    assert first.template_id == template_id('job 1 done in 3ms'.split())
+
+
+def test_mask_tokens():
+    assert (mask_tokens(['conn', '#12', 'from', 'host:27017'], '...') ==
+            ['conn', '...', 'from', '...'])
@@ -0,0 +1,91 @@
+import pytest
+
+from mtools.util.log2code_db import Log2CodeDB, write_db
+from mtools.util.logcodeline import LogCodeLine
+
+
+def make_db():
+    versions = ['r2.4.0', 'r2.6.0', 'master']
+    log_code_lines = {}
+    logs_versions = {}
+
+    def add(pattern, version, filename, lineno, loglevel, trigger):
+        if pattern not in log_code_lines:
+            log_code_lines[pattern] = LogCodeLine(pattern,
+                                                  len(log_code_lines))
+            logs_versions[pattern] = []
+        log_code_lines[pattern].addMatch(version, filename, lineno,
+                                         loglevel, trigger)
+        if version not in logs_versions[pattern]:
+            logs_versions[pattern].append(version)
+
+    accepted = ('connection accepted from ', ' #', ' (',
+                ' connections now open)')
+    ended = ('end connection ',)
+    info = ("replSet info Couldn't load config yet. Sleeping ",
+            'sec and will try again')
+    add(accepted, 'r2.4.0', 'src/mongo/util/net/listen.cpp', 378, 0, 'log(')
+    add(accepted, 'r2.6.0', 'src/mongo/util/net/listen.cpp', 401, None,
+        'LOG')
+    add(ended, 'master', 'src/mongo/db/db.cpp', 12, 1, 'LOG')
+    add(info, 'r2.4.0', 'src/mongo/db/repl/rs.cpp', 790, 0, 'log(')
+    # versions of a pattern that parse_sourcecode found without a match
+    logs_versions[info].append('r2.6.0')
+
+    logs_by_word = {'connection': [accepted], 'end': [ended],
+                    'replSet': [info]}
+    return versions, logs_versions, logs_by_word, log_code_lines
+
+
+def test_write_read(tmp_path):
+    versions, logs_versions, logs_by_word, log_code_lines = make_db()
+    path = str(tmp_path / 'log2code.bin')
+    write_db(path, versions, logs_versions, logs_by_word, log_code_lines)
+
+    db = Log2CodeDB(path)
+    assert db.all_versions == versions
+    assert 'connection' in db.logs_by_word
+    assert 'accepted' not in db.logs_by_word
+    assert dict(db.logs_by_word) == logs_by_word
+    assert dict(db.log_version) == logs_versions
+
+    assert len(db.log_code_lines) == len(log_code_lines)
+    for pattern, lcl in log_code_lines.items():
+        loaded = db.log_code_lines[pattern]
+        assert loaded.pattern == pattern
+        assert loaded.pattern_id == lcl.pattern_id
+        assert loaded.versions == lcl.versions
+        assert dict(loaded.matches) == dict(lcl.matches)
+    assert db.log_code_lines[('end connection ',)].matches['master'] == \
+        [('src/mongo/db/db.cpp', 12, 1, 'LOG')]
+
+
+def test_fragments(tmp_path):
+    versions, logs_versions, logs_by_word, log_code_lines = make_db()
+    path = str(tmp_path / 'log2code.bin')
+    write_db(path, versions, logs_versions, logs_by_word, log_code_lines)
+
+    db = Log2CodeDB(path)
+    fragments = db.logs_by_word.fragments()
+    assert sorted(fragments) == sorted(set(token for pattern in log_code_lines
+                                           for token in pattern))
+    # without decoding the patterns
+    assert not db._pattern_cache
+
+
+def test_format_version(tmp_path):
+    path = str(tmp_path / 'log2code.bin')
+    write_db(path, *make_db())
+    with open(path, 'r+b') as f:
+        f.seek(8)
+        f.write(b'\x63\x00\x00\x00')
+    with pytest.raises(ValueError):
+        Log2CodeDB(path)
+
+
+def test_not_a_db(tmp_path):
+    path = str(tmp_path / 'log2code.bin')
+    with open(path, 'wb') as f:
+        f.write(b'\x80\x04' + b'\x00' * 200)
+    with pytest.raises(ValueError):
+        Log2CodeDB(path)
@@ -307,3 +307,91 @@ def test_logevent_lazy_evaluation():
     le.parse_all()
     for attr in fields:
         assert(getattr(le, attr) is not None)
+
+
+def test_logevent_shared_symbols():
+    """ Check that repeated field values are shared between LogEvents. """
+
+    fields = ['thread', 'operation', 'namespace', 'pattern']
+    le1 = LogEvent(line_getmore)
+    le2 = LogEvent(str(line_getmore))
+    for attr in fields:
+        assert(getattr(le1, attr) == getattr(le2, attr))
+        assert(getattr(le1, attr) is getattr(le2, attr))
+
+
+def test_logevent_line_str_cached():
+    """ Check that line_str is composed once and updated on changes. """
+
+    le = LogEvent(line_253_numYields)
+    assert(le.duration == 145)
+    assert(le._line_str is le._line)
+
+    # parsing the datetime does not join the rest of the line yet
+    le.datetime
+    assert(le._line_str is None)
+    assert(le.line_str == line_253_numYields)
+    assert(le.line_str is le.line_str)
+
+    le.merge_marker_str = '[A]'
+    assert(le.line_str == '[A] ' + line_253_numYields)
+
+    le._reformat_timestamp('iso8601-utc')
+    assert(le.line_str.startswith('[A] 2013-10-21T01:07:27.057Z [conn2]'))
+
+    le.set_line_str(line_getmore)
+    assert(le.line_str == line_getmore)
+    assert(le.duration == 144)
+
+
+def test_logevent_transaction_counters():
+    """ Check that counters with values after a space are extracted. """
+
+    le = LogEvent('2019-06-18T12:31:03.180+0100 I COMMAND  [main] '
+                  'transaction parameters:{ lsid: { id: UUID("1d7db5e4"), '
+                  'uid: BinData(0, E3B0) }, txnNumber: 1, autocommit: false, '
+                  'readConcern: { level: "snapshot" } }, '
+                  'readTimestamp:Timestamp(0, 0), keysExamined:1 '
+                  'docsExamined:2 terminationCause:committed '
+                  'timeActiveMicros:11142 numYields:4 12ms')
+    assert(le.txnNumber == 1)
+    assert(le.autocommit == 'false')
+    assert(le.readConcern == '"snapshot"')
+    assert(le.readTimestamp == 'Timestamp(0')
+    assert(le.terminationCause == 'committed')
+    assert(le.nscanned == 1)
+    assert(le.nscannedObjects == 2)
+    assert(le.timeActiveMicros == 11142)
+    assert(le.numYields == 4)
+
+
+def test_logevent_reformat_timestamp_same_second():
+    """ Check that timestamps of the same second keep their milliseconds. """
+
+    le1 = LogEvent(line_iso8601_local)
+    le2 = LogEvent(line_iso8601_local.replace('.095', '.812'))
+    for fmt, ts1, ts2 in [
+            ('iso8601-utc', '2013-08-03T11:52:05.095Z',
+             '2013-08-03T11:52:05.812Z'),
+            ('iso8601-local', '2013-08-03T21:52:05.095+1000',
+             '2013-08-03T21:52:05.812+1000'),
+            ('ctime', 'Sat Aug  3 21:52:05.095', 'Sat Aug  3 21:52:05.812'),
+            ('ctime-pre2.4', 'Sat Aug  3 21:52:05', 'Sat Aug  3 21:52:05')]:
+        le1._reformat_timestamp(fmt, force=True)
+        le2._reformat_timestamp(fmt, force=True)
+        assert(le1.line_str.startswith(ts1 + ' [initandlisten]'))
+        assert(le2.line_str.startswith(ts2 + ' [initandlisten]'))
+
+
+def test_logevent_logv2_storage():
+    """ Check that the storage counters of LOGV2 lines are extracted. """
+
+    le = LogEvent('{"t":{"$date":"2021-01-11T10:30:00.123+00:00"},"s":"I",'
+                  '"c":"WRITE","id":51803,"ctx":"conn7","msg":"Slow query",'
+                  '"attr":{"type":"update","ns":"test.users",'
+                  '"storage":{"data":{"bytesRead":1024,'
+                  '"timeReadingMicros":12}},"durationMillis":150}}')
+    assert(le.operation == 'update')
+    assert(le.bytesRead == 1024)
+    assert(le.timeReadingMicros == 12)
+    assert(le.bytesWritten is None)
@@ -1,3 +1,4 @@
+import io
 import os
 from datetime import datetime
 import re
@@ -212,3 +213,237 @@ class TestUtilLogFile(object):
         assert ('step 6 of 6', '213') in chunk_moved_to[4]
         assert chunk_moved_to[5] == "success"
 
+
+    def _open_26(self):
+        logfile_path = os.path.join(os.path.dirname(mtools.__file__),
+                                    'test/logfiles/', 'mongod_26.log')
+        return LogFile(open(logfile_path, 'rb'))
+
+    def test_sample_rate(self):
+        """LogFile: test reproducible Bernoulli sampling."""
+
+        logfile = self._open_26()
+        all_lines = [le.line_str for le in logfile]
+
+        logfile.set_sample(rate=0.5, seed=42)
+        sample = [le.line_str for le in logfile]
+        assert sample == [le.line_str for le in logfile]
+        assert 0 < len(sample) < len(all_lines)
+        assert logfile.sample_counts == (len(sample), len(all_lines))
+        assert logfile.sample_fraction == 0.5
+
+        # sampled lines are returned in file order
+        it = iter(all_lines)
+        assert all(line in it for line in sample)
+
+    def test_sample_lines(self):
+        """LogFile: test reservoir sampling of a fixed number of lines."""
+
+        logfile = self._open_26()
+        all_lines = [le.line_str for le in logfile]
+
+        logfile.set_sample(lines=50, seed=1)
+        sample = [le.line_str for le in logfile]
+        assert len(sample) == 50
+        it = iter(all_lines)
+        assert all(line in it for line in sample)
+        assert logfile.sample_fraction == 50. / len(all_lines)
+
+    def test_sample_seek(self):
+        """LogFile: test sampling runs of lines at random offsets."""
+
+        logfile = self._open_26()
+        all_lines = [le.line_str for le in logfile]
+
+        logfile.set_sample(seek=3, run_length=10, seed=7)
+        sample = [le.line_str for le in logfile]
+        assert 0 < len(sample) <= 30
+        it = iter(all_lines)
+        assert all(line in it for line in sample)
+        assert 0 < logfile.sample_fraction <= 1
+
+    def test_sample_invalid(self):
+        """LogFile: test invalid sampling parameters."""
+
+        logfile = self._open_26()
+        for kwargs in [{'rate': 0}, {'rate': 1.5}, {'lines': 0},
+                       {'rate': 0.5, 'lines': 10}]:
+            try:
+                logfile.set_sample(**kwargs)
+            except ValueError:
+                pass
+            else:
+                raise AssertionError('no ValueError for %s' % kwargs)
+
+    def test_poll(self, tmp_path):
+        """LogFile: test poll() with appended, partial and rotated lines."""
+
+        line = ('2014-04-09T23:16:20.437-0400 [conn1] end connection '
+                '127.0.0.1:50000 (%i connections now open)\n')
+        path = str(tmp_path / 'mongod.log')
+        with open(path, 'w') as f:
+            f.write(line % 1)
+
+        logfile = LogFile(open(path, 'rb'))
+        assert len(logfile.poll()) == 1
+        assert logfile.poll() == []
+
+        # partial lines are only returned once they are complete
+        with open(path, 'a') as f:
+            f.write(line % 2)
+            f.write((line % 3)[:20])
+        assert [le.line_str for le in logfile.poll()] == [(line % 2)[:-1]]
+        with open(path, 'a') as f:
+            f.write((line % 3)[20:])
+        assert [le.line_str for le in logfile.poll()] == [(line % 3)[:-1]]
+
+        # rotation: the old file is renamed and a new one created
+        os.rename(path, path + '.1')
+        with open(path, 'w') as f:
+            f.write(line % 4)
+        assert [le.line_str for le in logfile.poll()] == [(line % 4)[:-1]]
+
+        # truncation: the file is cut and written from the start
+        short_line = '2014-04-09T23:16:21.000-0400 [conn1] short'
+        with open(path, 'w') as f:
+            f.write(short_line + '\n')
+        assert [le.line_str for le in logfile.poll()] == [short_line]
+
+    def test_bounds_lazy_and_cached(self, tmp_path, monkeypatch):
+        """LogFile: test lazy bounds calculation and the bounds cache."""
+
+        monkeypatch.setenv('MTOOLS_CACHE_DIR', str(tmp_path))
+        logfile_path = os.path.join(os.path.dirname(mtools.__file__),
+                                    'test/logfiles/', 'mongod_26.log')
+
+        logfile = LogFile(open(logfile_path, 'rb'))
+        assert not logfile._bounds_calculated
+        start, end = logfile.start, logfile.end
+        assert logfile._bounds_calculated
+        assert len(os.listdir(str(tmp_path / 'bounds'))) == 1
+
+        # a second LogFile gets the same bounds from the cache
+        cached = LogFile(open(logfile_path, 'rb'))
+        assert cached._cached_bounds() is not None
+        assert (cached.start, cached.end) == (start, end)
+        assert cached.timezone == tzoffset(None, -14400)
+        assert cached.filehandle.tell() == 0
+        assert len(list(cached)) == len(list(logfile))
+
+    def test_bounds_cache_disabled(self, tmp_path, monkeypatch):
+        """LogFile: test that an empty MTOOLS_CACHE_DIR disables the cache."""
+
+        monkeypatch.setenv('MTOOLS_CACHE_DIR', '')
+        logfile_path = os.path.join(os.path.dirname(mtools.__file__),
+                                    'test/logfiles/', 'mongod_26.log')
+        logfile = LogFile(open(logfile_path, 'rb'))
+        assert logfile.start
+        assert logfile._cached_bounds() is None
+
+    def test_fast_forward_stdin(self):
+        """LogFile: test fast_forward() on stdin only parses later lines."""
+
+        class Stdin(io.BytesIO):
+            name = '<stdin>'
+
+        for filename in ['mongod_26.log', 'mongod_225.log']:
+            logfile_path = os.path.join(os.path.dirname(mtools.__file__),
+                                        'test/logfiles/', filename)
+            with open(logfile_path, 'rb') as f:
+                data = f.read()
+            events = list(LogFile(Stdin(data)))
+            dt = events[300].datetime
+
+            logfile = LogFile(Stdin(data))
+            logfile.fast_forward(dt)
+            parsed = []
+            create = logfile._logevent
+            logfile._logevent = lambda line: parsed.append(line) or \
+                create(line)
+            forwarded = list(logfile)
+
+            first = min(i for i, le in enumerate(events)
+                        if le.datetime and le.datetime >= dt)
+            assert [(le.datetime, le.line_str) for le in forwarded] == \
+                [(le.datetime, le.line_str) for le in events[first:]]
+            assert len(parsed) == len(events) - first
+
+    def test_byte_range(self):
+        """LogFile: test bisection of both bounds into a byte range."""
+
+        logfile = self._open_26()
+        events = [(le.datetime, le.line_str) for le in logfile]
+        start_dt, end_dt = events[100][0], events[400][0]
+
+        start, end = logfile.byte_range(start_dt, end_dt)
+        assert logfile.filehandle.tell() == 0
+        logfile.set_range(start, end)
+        selected = [(le.datetime, le.line_str) for le in logfile]
+
+        expected = [e for e in events
+                    if e[0] and start_dt <= e[0] <= end_dt]
+        assert selected == expected
+
+        # the end limit is kept for later iterations
+        logfile.set_end_limit(events[10][0])
+        assert [e for e in logfile][-1].datetime == events[10][0]
+        assert logfile.offset_of(events[-1][0], after=True) == \
+            logfile.filesize
+
+    def test_split_ranges(self):
+        """LogFile: test splitting a file into ranges of whole lines."""
+
+        logfile = self._open_26()
+        events = [le.line_str for le in logfile]
+
+        ranges = logfile.split_ranges(7)
+        assert len(ranges) == 7
+        assert ranges[0][0] == 0 and ranges[-1][1] == logfile.filesize
+
+        lines = []
+        for start, end in ranges:
+            logfile.set_range(start, end)
+            lines.extend(le.line_str for le in logfile)
+        assert lines == events
+
+    def test_iter_batches(self):
+        """LogFile: test that batches contain the same events as iteration."""
+
+        logfile = self._open_26()
+        events = [(le.datetime, le.line_str) for le in logfile]
+
+        batches = list(logfile.iter_batches(100))
+        assert all(len(batch) == 100 for batch in batches[:-1])
+        assert [(le.datetime, le.line_str) for batch in batches
+                for le in batch] == events
+        assert logfile.filehandle.tell() == 0
+
+        logfile.set_end_limit(events[150][0])
+        assert sum(len(batch) for batch in logfile.iter_batches(100)) == \
+            len(list(logfile))
+
+    def test_reuse_events(self):
+        """LogFile: test that reused LogEvents match new ones."""
+
+        logfile = self._open_26()
+        events = [(le.datetime, le.line_str) for le in logfile]
+
+        logfile.set_reuse_events()
+        reused = [(le.datetime, le.line_str) for le in logfile]
+        assert reused == events
+        assert len(set(id(le) for le in logfile)) == 1
+
+        batches = [[(le.datetime, le.line_str) for le in batch]
+                   for batch in logfile.iter_batches(100)]
+        assert sum(batches, []) == events
+
+        # a copy is kept, the reused object changes
+        logfile.set_reuse_events()
+        it = iter(logfile)
+        first = next(it)
+        kept = first.copy()
+        assert next(it) is first
+        assert (kept.datetime, kept.line_str) == events[0]
+
+        logfile.set_reuse_events(0)
+        assert len(set(id(le) for le in logfile)) > 1
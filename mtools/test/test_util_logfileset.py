@@ -0,0 +1,77 @@
+import os
+from datetime import datetime
+
+import pytest
+from dateutil.tz import tzutc
+
+import mtools
+from mtools.util.logevent import LogEvent
+from mtools.util.logfileset import LogFileSet, LogFileSetMember
+
+
+@pytest.fixture
+def rotated_dir(tmp_path):
+    """Split mongod_26.log into two rotated files and a current file."""
+    logfile_path = os.path.join(os.path.dirname(mtools.__file__),
+                                'test/logfiles/', 'mongod_26.log')
+    with open(logfile_path) as f:
+        lines = f.read().splitlines()
+
+    chunks = [lines[:200], lines[200:400], lines[400:]]
+    for i, chunk in enumerate(chunks):
+        if i < len(chunks) - 1:
+            # rotated just after the last line of the chunk, in UTC
+            rotated = LogEvent(chunk[-1]).datetime.astimezone(tzutc())
+            name = 'mongod.log.' + rotated.strftime('%Y-%m-%dT%H-%M-%S')
+        else:
+            name = 'mongod.log'
+        with open(str(tmp_path / name), 'w') as f:
+            f.write('\n'.join(chunk) + '\n')
+    return tmp_path, lines
+
+
+def test_member_rotation_suffix():
+    member = LogFileSetMember('/var/log/mongod.log.2026-10-01T00-00-00')
+    assert member.rotated == datetime(2026, 10, 1, tzinfo=tzutc())
+    assert LogFileSetMember('/var/log/mongod.log.3').number == 3
+    assert LogFileSetMember('/var/log/mongod.log').rotated is None
+
+
+def test_order_and_iteration(rotated_dir):
+    path, lines = rotated_dir
+    logfileset = LogFileSet.from_path(str(path))
+
+    assert [os.path.basename(m.path) for m in logfileset.members][-1] == \
+        'mongod.log'
+    assert [le.line_str for le in logfileset] == [l.rstrip() for l in lines]
+    assert logfileset.start == LogEvent(lines[0]).datetime
+    assert logfileset.end == LogEvent(lines[-1]).datetime
+    assert logfileset.hostname == 'enter.local'
+
+
+def test_glob(rotated_dir):
+    path, lines = rotated_dir
+    logfileset = LogFileSet.from_path(str(path / 'mongod.log.*'))
+    assert len(logfileset.members) == 2
+    assert LogFileSet.from_path(str(path / 'mongod.log')) is None
+
+
+def test_pruning(rotated_dir):
+    path, lines = rotated_dir
+    logfileset = LogFileSet.from_path(str(path))
+
+    # a time in the last file skips the rotated files without opening them
+    dt = LogEvent(lines[500]).datetime
+    logfileset.fast_forward(dt)
+    selected = logfileset.selected_members()
+    assert [os.path.basename(m.path) for m in selected] == ['mongod.log']
+    assert all(m._start is None for m in logfileset.members[:2])
+
+    events = list(logfileset)
+    assert events[0].datetime <= dt
+    assert events[-1].line_str == lines[-1]
+
+    # an end limit in the first file skips the later files
+    logfileset = LogFileSet.from_path(str(path))
+    logfileset.set_end_limit(LogEvent(lines[100]).datetime)
+    assert len(logfileset.selected_members()) == 1
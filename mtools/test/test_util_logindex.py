@@ -0,0 +1,84 @@
+import os
+import shutil
+
+import pytest
+
+import mtools
+from mtools.util.logevent import LogEvent
+from mtools.util.logfile import LogFile
+from mtools.util.logindex import LogIndex, decode_postings, encode_postings
+
+
+@pytest.fixture
+def logpath(tmp_path):
+    """Copy of mongod_26.log, the index is written next to it."""
+    source = os.path.join(os.path.dirname(mtools.__file__),
+                          'test/logfiles/', 'mongod_26.log')
+    path = str(tmp_path / 'mongod.log')
+    shutil.copy(source, path)
+    return path
+
+
+def _lines(logfile, ranges):
+    return [le.line_str for le in logfile.iter_ranges(ranges)]
+
+
+def test_postings_roundtrip():
+    numbers = [0, 1, 2, 127, 128, 300, 16384, 10 ** 9]
+    assert decode_postings(encode_postings(numbers)) == numbers
+    assert encode_postings([0, 1, 2]) == b'\x00\x01\x01'
+
+
+def test_ranges(logpath):
+    index = LogIndex(logpath, block_size=2048)
+    index.update()
+    index.save()
+    assert len(index.blocks) > 5
+
+    index = LogIndex.load(logpath)
+    assert index.is_fresh()
+
+    logfile = LogFile(open(logpath, 'rb'))
+    events = [(le.line_str, LogIndex.keys(LogEvent(le.line_str)))
+              for le in logfile]
+    for key_groups in ([['thread:conn15']],
+                       [['namespace:admin.$cmd']],
+                       [['thread:conn15', 'thread:conn2'],
+                        ['namespace:admin.$cmd']]):
+        ranges = index.ranges(key_groups)
+        assert sum(e - s for s, e in ranges) < logfile.filesize
+        selected = [line for line, keys in events
+                    if all(set(group) & set(keys) for group in key_groups)]
+        assert selected
+        lines = _lines(logfile, ranges)
+        assert [line for line in lines if line in selected] == selected
+
+
+def test_incremental_update(logpath):
+    with open(logpath, 'rb') as f:
+        data = f.read()
+    half = data.index(b'\n', len(data) // 2) + 1
+
+    with open(logpath, 'wb') as f:
+        f.write(data[:half] + b'2014-04-09T23:20:00.000+1000 [conn')
+    index = LogIndex(logpath, block_size=2048)
+    index.update()
+    assert index.size == half
+
+    with open(logpath, 'wb') as f:
+        f.write(data)
+    assert index.is_fresh()
+    assert index.update() == len(data) - half
+
+    full = LogIndex(logpath, block_size=2048)
+    full.update()
+    assert index.postings.keys() == full.postings.keys()
+    for key, blocks in full.postings.items():
+        assert set(blocks) <= set(index.postings[key])
+
+    # a rotated (different) file is not fresh and indexed from scratch
+    with open(logpath, 'wb') as f:
+        f.write(data[half:])
+    assert not index.is_fresh()
+    index.update()
+    assert index.size == len(data) - half
@@ -0,0 +1,83 @@
+import io
+import os
+from itertools import islice
+
+import pytest
+
+import mtools
+from mtools.util.logfile import LogFile
+from mtools.util.mtbin import MtbinStream, MtbinWriter, is_mtbin
+
+fields = ['datetime', 'thread', 'conn', 'operation', 'namespace', 'command',
+          'pattern', 'planSummary', 'duration', 'nscanned', 'nreturned',
+          'numYields', 'line_str']
+
+
+def _open(filename):
+    logfile_path = os.path.join(os.path.dirname(mtools.__file__),
+                                'test/logfiles/', filename)
+    return LogFile(open(logfile_path, 'rb'))
+
+
+def _roundtrip(logfile, stream):
+    writer = MtbinWriter(stream, MtbinWriter.header_for([logfile]))
+    events = []
+    for logevent in logfile:
+        writer.write(logevent)
+        events.append([getattr(logevent, f) for f in fields])
+    return events
+
+
+def test_roundtrip():
+    for filename in ['mongod_4.0.10_allowdiskuse.log', 'mongod_225.log']:
+        logfile = _open(filename)
+        data = io.BytesIO()
+        events = _roundtrip(logfile, data)
+
+        stream = io.BufferedReader(io.BytesIO(data.getvalue()))
+        assert is_mtbin(stream)
+        mtbin = MtbinStream(stream)
+        assert mtbin.start == logfile.start
+        assert mtbin.end == logfile.end
+        assert mtbin.hostname == logfile.hostname
+        assert mtbin.logformat == logfile.logformat
+
+        # events are read again from a seekable stream
+        for _ in range(2):
+            assert [[getattr(le, f) for f in fields]
+                    for le in mtbin] == events
+        assert len(mtbin) == len(events)
+
+
+def test_not_seekable():
+    logfile = _open('mongod_26.log')
+    data = io.BytesIO()
+    events = _roundtrip(logfile, data)
+
+    class Pipe(io.BytesIO):
+        def tell(self):
+            raise OSError('Illegal seek')
+
+    mtbin = MtbinStream(io.BufferedReader(Pipe(data.getvalue())))
+    assert mtbin.num_lines_unknown
+    with pytest.raises(TypeError):
+        len(mtbin)
+    assert [[getattr(le, f) for f in fields] for le in mtbin] == events
+    # read only once, the events are not kept in memory
+    with pytest.raises(ValueError):
+        iter(mtbin)
+
+    # spooled to a temporary file for more than one pass
+    mtbin = MtbinStream(io.BufferedReader(Pipe(data.getvalue())))
+    mtbin.expect_passes(2)
+    first = iter(mtbin)
+    head = [[getattr(le, f) for f in fields] for le in islice(first, 10)]
+    assert [[getattr(le, f) for f in fields] for le in mtbin] == events
+    assert head + [[getattr(le, f) for f in fields] for le in first] == events
+    assert not mtbin.num_lines_unknown
+    assert len(mtbin) == len(events)
+
+
+def test_not_mtbin():
+    assert not is_mtbin(_open('mongod_26.log').filehandle)
+    assert not is_mtbin(io.StringIO('text'))
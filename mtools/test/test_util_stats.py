@@ -0,0 +1,73 @@
+import pytest
+
+from mtools.util.stats import StreamingStats
+
+
+def test_exact_summary():
+    stats = StreamingStats()
+    for value in [5, 1, 3, 0, 10]:
+        stats.add(value)
+
+    assert len(stats) == 5
+    assert stats.sum == 19
+    assert stats.min == 0
+    assert stats.max == 10
+    assert stats.mean == 3.8
+
+
+def test_empty():
+    stats = StreamingStats()
+    assert stats.mean is None
+    assert stats.percentile(95) is None
+
+
+def test_percentile_accuracy():
+    stats = StreamingStats(relative_accuracy=0.01)
+    for value in range(1, 10001):
+        stats.add(value)
+
+    assert stats.percentile(0) == 1
+    assert stats.percentile(100) == 10000
+    assert abs(stats.percentile(50) - 5000) <= 0.01 * 5000 + 1
+    assert abs(stats.percentile(95) - 9500) <= 0.01 * 9500 + 1
+
+
+def test_percentile_interpolation():
+    np = pytest.importorskip('numpy')
+    # small groups, where the rank matters more than the accuracy
+    for values in ([0, 0, 2], [5], [100, 101, 144, 323, 1029, 1324],
+                   [12768411, 12868411], list(range(1, 21))):
+        stats = StreamingStats(relative_accuracy=0.01)
+        for value in values:
+            stats.add(value)
+        for q in (25, 50, 95, 99):
+            expected = np.percentile(values, q)
+            assert abs(stats.percentile(q) - expected) <= 0.01 * expected
+
+
+def test_negative_values():
+    stats = StreamingStats()
+    for value in [-100, -10, 0, 10, 100]:
+        stats.add(value)
+
+    assert stats.percentile(50) == 0
+    assert stats.percentile(25) < 0
+
+
+def test_merge():
+    left, right, full = StreamingStats(), StreamingStats(), StreamingStats()
+    for value in range(1, 1000):
+        (left if value % 2 else right).add(value)
+        full.add(value)
+
+    left.merge(right)
+    assert left.count == full.count
+    assert left.sum == full.sum
+    assert left.min == full.min and left.max == full.max
+    for q in [10, 50, 90, 99]:
+        assert left.percentile(q) == full.percentile(q)
+
+
+def test_merge_accuracy_mismatch():
+    with pytest.raises(ValueError):
+        StreamingStats(0.01).merge(StreamingStats(0.05))
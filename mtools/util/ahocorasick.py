@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Aho-Corasick automaton to find many fixed strings in one scan."""
+
+from collections import deque
+
+
+class AhoCorasick(object):
+    """
+    Multi-pattern string matcher.
+
+    All words are compiled into a trie with failure links, so one pass over a
+    text finds every word that occurs in it, independent of the number of
+    words. Words can be added until the first search, which builds the
+    automaton.
+    """
+
+    def __init__(self, words=()):
+        """Create a matcher for the given words."""
+        # per state: transitions, the word ending there, the failure link
+        # and all words ending there including those of the failure links
+        self._goto = [{}]
+        self._word = [None]
+        self._fail = [0]
+        self._out = [()]
+        self._built = False
+        # the empty word occurs in every text
+        self._empty = False
+        self.words = set()
+
+        for word in words:
+            self.add(word)
+
+    def __len__(self):
+        """Return the number of distinct words."""
+        return len(self.words)
+
+    def add(self, word):
+        """Add a word, the automaton is built again on the next search."""
+        if word in self.words:
+            return
+        self.words.add(word)
+        if not word:
+            self._empty = True
+            return
+
+        goto = self._goto
+        state = 0
+        for char in word:
+            next_state = goto[state].get(char)
+            if next_state is None:
+                next_state = len(goto)
+                goto[state][char] = next_state
+                goto.append({})
+                self._word.append(None)
+                self._fail.append(0)
+                self._out.append(())
+            state = next_state
+        self._word[state] = word
+        self._built = False
+
+    def build(self):
+        """Calculate the failure links and collect the words of each state."""
+        goto, fail, out = self._goto, self._fail, self._out
+        for state, word in enumerate(self._word):
+            out[state] = () if word is None else (word,)
+
+        # the states at depth one fail back to the root
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                # longest proper suffix of next_state that is in the trie
+                link = fail[state]
+                while link and char not in goto[link]:
+                    link = fail[link]
+                link = goto[link].get(char, 0)
+                fail[next_state] = link
+                if out[link]:
+                    out[next_state] = out[next_state] + out[link]
+        self._built = True
+
+    def findall(self, text):
+        """Return the set of words that occur in text."""
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+
+        found = set()
+        if self._empty:
+            found.add('')
+        state = 0
+        for char in text:
+            next_state = goto[state].get(char)
+            while next_state is None and state:
+                state = fail[state]
+                next_state = goto[state].get(char)
+            # only the root has no transition for a character
+            state = next_state or 0
+            if out[state]:
+                found.update(out[state])
+        return found
@@ -8,10 +8,13 @@ import os
 import re
 import signal
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 from dateutil.tz import tzutc
 
 from mtools.util.logfile import LogFile
+from mtools.util.logfileset import LogFileSet
+from mtools.util.mtbin import MtbinStream, is_mtbin
 from mtools.version import __version__
 
 try:
@@ -24,18 +27,25 @@ try:
         Try to open the file and pass the handle to a new LogFile object, but
         if that's not possible it will catch the exception and interpret the
         string as a MongoDB URI and try to connect to the database. In that
-        case, it will return a ProfileCollection object.
+        case, it will return a ProfileCollection object. A directory or glob
+        pattern returns a LogFileSet object of rotated log files, and a file
+        written with --output-format mtbin an MtbinStream object.
 
-        Both derive from the same base class InputSource and support iteration
+        All derive from the same base class InputSource and support iteration
         over LogEvents.
         """
 
         def __call__(self, string):
-            """Open log file or MongoDB database."""
+            """Open log file, set of rotated log files or MongoDB database."""
+            logfileset = LogFileSet.from_path(string)
+            if logfileset:
+                return logfileset
 
             try:
                 # catch filetype and return LogFile object
                 filehandle = argparse.FileType.__call__(self, string)
+                if is_mtbin(filehandle):
+                    return MtbinStream(filehandle)
                 return LogFile(filehandle)
 
             except argparse.ArgumentTypeError:
@@ -66,10 +76,16 @@ except ImportError:
         """Extend the FileType class from the argparse module."""
 
         def __call__(self, string):
-            """Open log file."""
+            """Open log file or set of rotated log files."""
+            logfileset = LogFileSet.from_path(string)
+            if logfileset:
+                return logfileset
+
             try:
                 # catch filetype and return LogFile object
                 filehandle = argparse.FileType.__call__(self, string)
+                if is_mtbin(filehandle):
+                    return MtbinStream(filehandle)
                 return LogFile(filehandle)
             except argparse.ArgumentTypeError:
                 raise argparse.ArgumentTypeError("can't open %s" % string)
@@ -184,11 +200,19 @@ class LogFileTool(BaseCmdLineTool):
         else:
             arg_opts['help'] = 'logfile to parse'
 
-        if self.is_stdin:
+        stdin_mtbin = (self.is_stdin and
+                       is_mtbin(getattr(sys.stdin, 'buffer', None)))
+        if stdin_mtbin:
+            # already parsed events with the bounds of the upstream log
+            # file, can be used like a log file
+            arg_opts['const'] = MtbinStream(sys.stdin.buffer)
+            self.is_stdin = False
+        elif self.is_stdin:
             if not self.stdin_allowed:
                 raise SystemExit("this tool can't parse input from stdin.")
-
             arg_opts['const'] = LogFile(sys.stdin)
+
+        if 'const' in arg_opts:
             arg_opts['action'] = 'store_const'
             if 'type' in arg_opts:
                 del arg_opts['type']
@@ -196,6 +220,77 @@ class LogFileTool(BaseCmdLineTool):
                 del arg_opts['nargs']
         self.argparser.add_argument('logfile', **arg_opts)
 
+    # with at least this many log files, calculate their bounds concurrently
+    parallel_bounds_min_files = 4
+    parallel_bounds_max_workers = 16
+
+    def run(self, arguments=None, get_unknowns=False):
+        """Parse the arguments and prepare the log file(s)."""
+        BaseCmdLineTool.run(self, arguments, get_unknowns)
+
+        logfiles = self.args.get('logfile')
+        if not isinstance(logfiles, list):
+            logfiles = [logfiles]
+        self._calculate_bounds(logfiles)
+
+    def _calculate_bounds(self, logfiles):
+        """
+        Calculate start and end of many log files concurrently.
+
+        Otherwise the bounds are calculated lazily when first needed. This is
+        mostly waiting for I/O (e.g. on network storage), so threads help.
+        """
+        logfiles = [logfile for logfile in logfiles
+                    if isinstance(logfile, LogFile) and not logfile.from_stdin]
+        if len(logfiles) < self.parallel_bounds_min_files:
+            return
+
+        workers = min(len(logfiles), self.parallel_bounds_max_workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # consume the results to re-raise errors
+            list(pool.map(lambda logfile: logfile._calculate_bounds(),
+                          logfiles))
+
+    def _add_sample_arguments(self):
+        """Add arguments to only read a random sample of the log file(s)."""
+        group = self.argparser.add_argument_group(
+            'sampling', 'Only read a random sample of the log file(s) to '
+            'get a quick, approximate picture of very large logs.')
+        modes = group.add_mutually_exclusive_group()
+        modes.add_argument('--sample', action='store', type=float,
+                           metavar='RATE', default=None,
+                           help=('keep each line with probability RATE '
+                                 '(between 0 and 1).'))
+        modes.add_argument('--sample-lines', action='store', type=int,
+                           metavar='N', default=None,
+                           help='keep N randomly chosen lines per log file.')
+        modes.add_argument('--sample-seek', action='store', type=int,
+                           metavar='K', default=None,
+                           help=('jump to K random positions in each log '
+                                 'file and read a short run of lines from '
+                                 'each, without reading the whole file.'))
+        group.add_argument('--sample-run', action='store', type=int,
+                           metavar='LINES', default=100,
+                           help=('number of lines read at each position '
+                                 'with --sample-seek (default 100).'))
+        group.add_argument('--sample-seed', action='store', type=int,
+                           metavar='SEED', default=None,
+                           help='random seed for reproducible samples.')
+
+    def _setup_sample(self, logfiles):
+        """Configure sampling on all log files, see _add_sample_arguments."""
+        for logfile in logfiles:
+            if not hasattr(logfile, 'set_sample'):
+                continue
+            try:
+                logfile.set_sample(rate=self.args['sample'],
+                                   lines=self.args['sample_lines'],
+                                   seek=self.args['sample_seek'],
+                                   run_length=self.args['sample_run'],
+                                   seed=self.args['sample_seed'])
+            except ValueError as e:
+                raise SystemExit('Error: %s' % e)
+
 
 if __name__ == '__main__':
     tool = LogFileTool(multiple_logfiles=True, stdin_allowed=True)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Online clustering of log lines into templates (Drain).
+
+Drain routes the tokens of a line through a parse tree of fixed depth: first
+by the number of tokens, then by the first few tokens. Only the clusters in
+the leaf that is reached are compared with the line, so the cost per line
+depends on the number of tokens and not on the number of templates. See He
+et al., "Drain: An Online Log Parsing Approach with Fixed Depth Tree", ICWS
+2017.
+"""
+
+from zlib import crc32
+
+
+def template_id(template):
+    """Return a stable 8 digit hex id of a template (a list of tokens)."""
+    return '%08x' % (crc32(' '.join(template).encode('utf-8')) & 0xffffffff)
+
+
+def mask_tokens(tokens, wildcard):
+    """Replace the tokens that contain digits, usually variables."""
+    return [wildcard if any(char.isdigit() for char in token) else token
+            for token in tokens]
+
+
+class LogCluster(object):
+    """
+    Template of a group of log lines and the number of lines in it.
+
+    The template_id is the id of the first template, the tokens of the line
+    that created the cluster. It is kept while tokens of the template become
+    the wildcard, so it is the same for the same lines in the same order.
+    """
+
+    __slots__ = ('template', 'count', 'template_id')
+
+    def __init__(self, template, count=0):
+        self.template = template
+        self.count = count
+        self.template_id = template_id(template)
+
+    def __str__(self):
+        """Return the template as string."""
+        return ' '.join(self.template)
+
+
+class Drain(object):
+    """
+    Parse tree of log templates.
+
+    depth is the depth of the tree including the level of the number of
+    tokens and the leaves, so depth - 2 leading tokens route a line. A line
+    joins the most similar cluster of its leaf if the share of its tokens
+    that are equal to the template is at least similarity, and the tokens
+    that differ become the wildcard. A node has at most max_children
+    children, other tokens go to the wildcard child.
+    """
+
+    def __init__(self, depth=4, similarity=0.4, max_children=100,
+                 wildcard='<*>'):
+        """Create an empty tree."""
+        self.depth = depth
+        self.similarity = similarity
+        self.max_children = max_children
+        self.wildcard = wildcard
+
+        # number of tokens -> nested dicts of tokens, the clusters of a leaf
+        # are stored under the key None
+        self.root = {}
+        self.clusters = []
+
+    def __len__(self):
+        """Return the number of clusters."""
+        return len(self.clusters)
+
+    def _leaf(self, tokens):
+        wildcard = self.wildcard
+        node = self.root.setdefault(len(tokens), {})
+        for token in tokens[:self.depth - 2]:
+            if any(char.isdigit() for char in token):
+                token = wildcard
+            child = node.get(token)
+            if child is None:
+                # keep the last child for the wildcard
+                if token != wildcard and len(node) >= self.max_children - 1:
+                    token = wildcard
+                child = node.setdefault(token, {})
+            node = child
+        return node.setdefault(None, [])
+
+    def _match(self, clusters, tokens):
+        wildcard = self.wildcard
+        best = None
+        best_key = None
+        for cluster in clusters:
+            same = params = 0
+            for template_token, token in zip(cluster.template, tokens):
+                if template_token == wildcard:
+                    params += 1
+                elif template_token == token:
+                    same += 1
+            # most similar, then the most general template
+            key = (same, params)
+            if best_key is None or key > best_key:
+                best, best_key = cluster, key
+
+        if best is None:
+            return None
+        if tokens and float(best_key[0]) / len(tokens) < self.similarity:
+            return None
+        return best
+
+    def add(self, tokens, count=1):
+        """Add the tokens of a line, return its LogCluster."""
+        leaf = self._leaf(tokens)
+        cluster = self._match(leaf, tokens)
+        if cluster is None:
+            cluster = LogCluster(list(tokens))
+            leaf.append(cluster)
+            self.clusters.append(cluster)
+        else:
+            template = cluster.template
+            for i, token in enumerate(tokens):
+                if template[i] != token:
+                    template[i] = self.wildcard
+        cluster.count += count
+        return cluster
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Small on-disk cache of values computed from (log) files."""
+
+import hashlib
+import json
+import os
+import tempfile
+
+
+def cache_dir():
+    """
+    Return the mtools cache directory, or None if caching is disabled.
+
+    The MTOOLS_CACHE_DIR environment variable overrides the default
+    location, setting it to an empty string disables the cache.
+    """
+    path = os.environ.get('MTOOLS_CACHE_DIR')
+    if path is None:
+        base = (os.environ.get('XDG_CACHE_HOME') or
+                os.path.join(os.path.expanduser('~'), '.cache'))
+        path = os.path.join(base, 'mtools')
+    return path or None
+
+
+class FileCache(object):
+    """
+    Cache of JSON-serializable values computed from files.
+
+    Each entry belongs to a file and is only returned while the file is
+    unchanged, which is checked with its device, inode, size and
+    modification time. There is one entry per file path and namespace, so a
+    growing log file does not leave stale entries behind. All errors are
+    ignored, the cache is only an optimization.
+    """
+
+    def __init__(self, namespace):
+        """Create a cache for the values of `namespace`, e.g. 'bounds'."""
+        self.namespace = namespace
+
+    @property
+    def directory(self):
+        """Return the directory of this cache, or None if disabled."""
+        directory = cache_dir()
+        return os.path.join(directory, self.namespace) if directory else None
+
+    @staticmethod
+    def identity(path):
+        """Return a list identifying the current version of a file."""
+        stat = os.stat(path)
+        return [os.path.realpath(path), stat.st_dev, stat.st_ino,
+                stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def _entry_path(directory, identity):
+        name = hashlib.sha1(identity[0].encode('utf-8')).hexdigest()
+        return os.path.join(directory, name + '.json')
+
+    def get(self, path):
+        """Return the cached value for the file at path, or None."""
+        directory = self.directory
+        if not directory:
+            return None
+        try:
+            identity = self.identity(path)
+            with open(self._entry_path(directory, identity)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('identity') != identity:
+            return None
+        return entry.get('value')
+
+    def put(self, path, value):
+        """Store the value for the file at path."""
+        directory = self.directory
+        if not directory:
+            return
+        tmp = None
+        try:
+            identity = self.identity(path)
+            os.makedirs(directory, exist_ok=True)
+            # write atomically, other processes may read at the same time
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'identity': identity, 'value': value}, f)
+            os.replace(tmp, self._entry_path(directory, identity))
+        except (OSError, TypeError, ValueError):
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
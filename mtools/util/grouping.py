@@ -45,8 +45,22 @@ class Grouping(object):
                         else:
                             key = match.group()
 
-        self.groups.setdefault(key, list()).append(item)
-
+        # keys are mostly interned log event fields (see
+        # mtools.util.logevent.symbol), cheap to hash and compare
+        group = self.groups.get(key)
+        if group is None:
+            self.groups[key] = [item]
+        else:
+            group.append(item)
+
+    def merge(self, groups):
+        """Add the items of the groups of another Grouping, see groups."""
+        for key, items in groups.items():
+            group = self.groups.get(key)
+            if group is None:
+                self.groups[key] = list(items)
+            else:
+                group.extend(items)
 
     def __getitem__(self, key):
         """Return item corresponding to key."""
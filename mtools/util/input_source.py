@@ -1,6 +1,18 @@
 #!/usr/bin/env python3
 """Input source utility."""
 
+from itertools import islice
+
+
+def batched(iterable, size):
+    """Yield lists of up to size items of an iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
 
 class InputSource(object):
     """Object definition for InputSource."""
@@ -9,6 +21,18 @@ class InputSource(object):
         """Iterate over log events."""
         pass
 
+    def iter_batches(self, size=1000):
+        """Iterate over lists of up to size log events."""
+        return batched(self, size)
+
     def fast_forward(self, dt):
         """Fast forward over log events."""
         pass
+
+    def expect_passes(self, passes):
+        """Hint that the log events will be iterated over passes times."""
+        pass
+
+    def set_end_limit(self, dt):
+        """Hint that no log events after dt are needed."""
+        pass
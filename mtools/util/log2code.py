@@ -8,31 +8,80 @@ from itertools import zip_longest
 import pickle
 
 import mtools
+from mtools.util.ahocorasick import AhoCorasick
+from mtools.util.log2code_db import Log2CodeDB
 
 
 def import_l2c_db():
     """
     Static import helper function.
 
-    Checks if the log2code.pickle exists first, otherwise raises ImportError.
+    Prefers the memory mapped log2code.bin and falls back to log2code.pickle,
+    raises ImportError if neither exists.
     """
     data_path = os.path.join(os.path.dirname(mtools.__file__), 'data')
-    if os.path.exists(os.path.join(data_path, 'log2code.pickle')):
+    if os.path.exists(os.path.join(data_path, 'log2code.bin')):
+        db = Log2CodeDB(os.path.join(data_path, 'log2code.bin'))
+        return db.all_versions, db.log_version, db.logs_by_word, \
+            db.log_code_lines
+    elif os.path.exists(os.path.join(data_path, 'log2code.pickle')):
         av, lv, lbw, lcl = pickle.load(open(os.path.join(data_path,
                                                           'log2code.pickle'),
                                              'rb'))
         return av, lv, lbw, lcl
     else:
 
-        raise ImportError('log2code.pickle not found in %s.' % data_path)
+        raise ImportError('log2code.bin or log2code.pickle not found in %s.'
+                          % data_path)
+
+
+class _LazyDB(object):
+    """Class attribute that imports the log2code database on first use."""
+
+    def __init__(self, index):
+        self.index = index
+
+    def __get__(self, obj, cls):
+        if cls._db is None:
+            cls._db = import_l2c_db()
+        return cls._db[self.index]
 
 
 class Log2CodeConverter(object):
 
-    # static import of logdb data structures
-    all_versions, log_version, logs_by_word, log_code_lines = import_l2c_db()
+    # logdb data structures, imported when the matcher is first used
+    _db = None
+    all_versions = _LazyDB(0)
+    log_version = _LazyDB(1)
+    logs_by_word = _LazyDB(2)
+    log_code_lines = _LazyDB(3)
+
+    # automaton over the static fragments of all log messages, built on
+    # first use, and the coverage of each message, computed on demand
+    _fragments = None
+    _coverage = {}
+
+    @classmethod
+    def _matcher(cls):
+        """Compile all fragments of the log messages into one automaton."""
+        if cls._fragments is None:
+            logs_by_word = cls.logs_by_word
+            if hasattr(logs_by_word, 'fragments'):
+                # log2code.bin, straight from its string table
+                fragments = logs_by_word.fragments()
+            else:
+                fragments = (token for logs in logs_by_word.values()
+                             for log in logs for token in log)
+            cls._fragments = AhoCorasick(fragments)
+        return cls._fragments
 
     def _log2code(self, line):
+        # one scan finds all fragments that occur in the line
+        found = self._matcher().findall(line)
+        if not found:
+            return None
+        coverage = self._coverage
+
         tokens = re.split(r'[\s"]', line)
 
         # find first word in first 20 tokens that has a corresponding
@@ -40,18 +89,18 @@ class Log2CodeConverter(object):
         for word_no, word in enumerate(w for w in tokens
                                        if w in self.logs_by_word):
 
-            # go through all error messages starting with this word
-            coverage = []
+            # go through all error messages starting with this word and keep
+            # the first one with the best coverage of which all tokens match
+            best_cov = 0
+            best_match = None
             for log in self.logs_by_word[word]:
+                cov = coverage.get(log)
+                if cov is None:
+                    cov = coverage[log] = sum([len(token) for token in log])
+                if cov > best_cov and all([token in found for token in log]):
+                    best_cov = cov
+                    best_match = log
 
-                if all([line.find(token) >= 0 for token in log]):
-                    # all tokens match, calculate coverage
-                    cov = sum([len(token) for token in log])
-                    coverage.append(cov)
-                else:
-                    coverage.append(0)
-
-            best_cov = max(coverage)
             if not best_cov:
                 continue
 
@@ -61,16 +110,6 @@ class Log2CodeConverter(object):
                 # known message
                 return None
 
-                # no match found, may have been a named log level. try next
-                # word.
-                # if word in ["warning:", "ERROR:", "SEVERE:", "UNKNOWN:"]:
-                #     continue
-                # else:
-                #     # duration = time.time() - start_time
-                #     # print(duration)
-                #     continue
-
-            best_match = self.logs_by_word[word][coverage.index(best_cov)]
             return self.log_code_lines[best_match]
 
     def _strip_counters(self, sub_line):
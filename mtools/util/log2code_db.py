@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Compact binary format of the log2code database.
+
+A log2code.bin file starts with MAGIC, the format version and the offset and
+length of each section. All numbers are little-endian unsigned 32 bit
+integers and all sections are 4 byte aligned, so the file can be memory
+mapped and read in place, with its pages shared between processes.
+
+The sections are a string table (offsets into a blob of UTF-8 strings), the
+versions, the fragments of each pattern, the pattern ids, the matches of
+each pattern (version, filename, line number, log level + 1, trigger), the
+patterns of each first word and the versions of each pattern. Nothing is
+decoded until it is looked up.
+"""
+
+import mmap
+import struct
+import sys
+from collections.abc import Mapping
+
+from mtools.util.logcodeline import LogCodeLine
+
+MAGIC = b'MTL2C\x00\x00\x00'
+FORMAT_VERSION = 2
+
+# in the order of the header, each one an array of unsigned 32 bit integers
+# except for the string blob
+sections = ['string_offsets', 'strings', 'versions', 'fragment_offsets',
+            'fragments', 'pattern_ids', 'match_offsets', 'matches', 'words',
+            'word_offsets', 'word_patterns', 'version_offsets',
+            'pattern_versions']
+
+# number of integers of one match record
+_match_size = 5
+
+_header = struct.Struct('<8sI' + 'II' * len(sections))
+
+
+def write_db(path, versions, logs_versions, logs_by_word, log_code_lines):
+    """Write the log2code data structures of parse_sourcecode to path."""
+    strings = {}
+
+    def string_id(string):
+        if string not in strings:
+            strings[string] = len(strings)
+        return strings[string]
+
+    version_ids = dict((version, i) for i, version in enumerate(versions))
+    patterns = list(log_code_lines)
+    pattern_index = dict((pattern, i) for i, pattern in enumerate(patterns))
+
+    data = dict((name, []) for name in sections if name != 'strings')
+    data['versions'] = [string_id(version) for version in versions]
+    data['fragment_offsets'].append(0)
+    data['match_offsets'].append(0)
+    data['version_offsets'].append(0)
+    for pattern in patterns:
+        lcl = log_code_lines[pattern]
+        data['fragments'].extend(string_id(token) for token in pattern)
+        data['fragment_offsets'].append(len(data['fragments']))
+        data['pattern_ids'].append(lcl.pattern_id)
+        for version, matches in lcl.matches.items():
+            for filename, lineno, loglevel, trigger in matches:
+                data['matches'].extend([
+                    version_ids[version], string_id(filename), lineno,
+                    0 if loglevel is None else loglevel + 1,
+                    string_id(trigger)])
+        data['match_offsets'].append(len(data['matches']) // _match_size)
+        data['pattern_versions'].extend(version_ids[version] for version in
+                                        logs_versions.get(pattern, ()))
+        data['version_offsets'].append(len(data['pattern_versions']))
+
+    data['word_offsets'].append(0)
+    for word, logs in logs_by_word.items():
+        data['words'].append(string_id(word))
+        data['word_patterns'].extend(pattern_index[log] for log in logs)
+        data['word_offsets'].append(len(data['word_patterns']))
+
+    blob = bytearray()
+    for string in strings:
+        data['string_offsets'].append(len(blob))
+        blob += string.encode('utf-8')
+    data['string_offsets'].append(len(blob))
+
+    body = bytearray()
+    header = [MAGIC, FORMAT_VERSION]
+    for name in sections:
+        if name == 'strings':
+            chunk = bytes(blob)
+        else:
+            chunk = struct.pack('<%iI' % len(data[name]), *data[name])
+        offset = _header.size + len(body)
+        header.extend([offset, len(chunk)])
+        body += chunk
+        # keep the next section aligned
+        body += b'\x00' * (-len(body) % 4)
+
+    with open(path, 'wb') as f:
+        f.write(_header.pack(*header))
+        f.write(body)
+
+
+class _LazyMapping(Mapping):
+    """Read-only mapping that looks up its values in a Log2CodeDB."""
+
+    def __init__(self, keys, lookup):
+        self._keys = keys
+        self._lookup = lookup
+
+    def __getitem__(self, key):
+        return self._lookup(self._keys[key])
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class _WordMapping(_LazyMapping):
+    """logs_by_word of a Log2CodeDB."""
+
+    def __init__(self, keys, lookup, db):
+        _LazyMapping.__init__(self, keys, lookup)
+        self._db = db
+
+    def fragments(self):
+        """Return the distinct fragments of all patterns."""
+        return self._db.fragments()
+
+
+class Log2CodeDB(object):
+    """
+    Memory mapped log2code.bin file.
+
+    Provides the same data structures as the log2code pickle: all_versions,
+    log_version, logs_by_word and log_code_lines. Patterns and their
+    LogCodeLines are decoded and cached on first access.
+    """
+
+    def __init__(self, path):
+        """Map the file and check its format version."""
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < _header.size:
+            raise ValueError('%s is not a log2code database.' % path)
+
+        header = _header.unpack_from(self._mmap)
+        if header[0] != MAGIC:
+            raise ValueError('%s is not a log2code database.' % path)
+        if header[1] != FORMAT_VERSION:
+            raise ValueError('%s has log2code format version %i, expected %i.'
+                             % (path, header[1], FORMAT_VERSION))
+
+        view = memoryview(self._mmap)
+        for i, name in enumerate(sections):
+            offset, length = header[2 + 2 * i:4 + 2 * i]
+            section = view[offset:offset + length]
+            if name != 'strings':
+                section = section.cast('I')
+                if sys.byteorder != 'little':
+                    section = struct.unpack('<%iI' % len(section),
+                                            section.tobytes())
+            setattr(self, '_' + name, section)
+
+        self._string_cache = {}
+        self._word_cache = {}
+        self._pattern_cache = {}
+        self._lcl_cache = {}
+        self._pattern_index = {}
+
+        self.all_versions = [self._string(i) for i in self._versions]
+        words = dict((self._string(string_id), i)
+                     for i, string_id in enumerate(self._words))
+        self.logs_by_word = _WordMapping(words, self._word_patterns_of, self)
+        self.log_code_lines = _LazyMapping(_PatternIndex(self),
+                                           self._log_code_line)
+        self.log_version = _LazyMapping(_PatternIndex(self), self._versions_of)
+
+    def _string(self, i):
+        string = self._string_cache.get(i)
+        if string is None:
+            offsets = self._string_offsets
+            string = str(self._strings[offsets[i]:offsets[i + 1]], 'utf-8')
+            self._string_cache[i] = string
+        return string
+
+    def _pattern(self, i):
+        pattern = self._pattern_cache.get(i)
+        if pattern is None:
+            offsets = self._fragment_offsets
+            pattern = tuple(self._string(string_id) for string_id in
+                            self._fragments[offsets[i]:offsets[i + 1]])
+            self._pattern_cache[i] = pattern
+            self._pattern_index[pattern] = i
+        return pattern
+
+    def _word_patterns_of(self, i):
+        patterns = self._word_cache.get(i)
+        if patterns is None:
+            offsets = self._word_offsets
+            patterns = [self._pattern(j) for j in
+                        self._word_patterns[offsets[i]:offsets[i + 1]]]
+            self._word_cache[i] = patterns
+        return patterns
+
+    def _matches_of(self, i):
+        offsets = self._match_offsets
+        matches = self._matches
+        for j in range(offsets[i], offsets[i + 1]):
+            yield matches[j * _match_size:(j + 1) * _match_size]
+
+    def _log_code_line(self, i):
+        lcl = self._lcl_cache.get(i)
+        if lcl is None:
+            lcl = LogCodeLine(self._pattern(i), self._pattern_ids[i])
+            for version, filename, lineno, loglevel, trigger in \
+                    self._matches_of(i):
+                lcl.addMatch(self.all_versions[version],
+                             self._string(filename), lineno,
+                             loglevel - 1 if loglevel else None,
+                             self._string(trigger))
+            self._lcl_cache[i] = lcl
+        return lcl
+
+    def _versions_of(self, i):
+        offsets = self._version_offsets
+        return [self.all_versions[version] for version in
+                self._pattern_versions[offsets[i]:offsets[i + 1]]]
+
+    def fragments(self):
+        """
+        Return the distinct fragments of all patterns.
+
+        Only decodes the strings of the fragments, not the patterns.
+        """
+        return [self._string(i) for i in dict.fromkeys(self._fragments)]
+
+
+class _PatternIndex(Mapping):
+    """Pattern tuple -> pattern index of a Log2CodeDB, decoded on demand."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def _decode_all(self):
+        db = self._db
+        if len(db._pattern_index) < len(db._pattern_ids):
+            for i in range(len(db._pattern_ids)):
+                db._pattern(i)
+
+    def __getitem__(self, pattern):
+        index = self._db._pattern_index
+        if pattern not in index:
+            self._decode_all()
+        return index[pattern]
+
+    def __contains__(self, pattern):
+        try:
+            self[pattern]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        db = self._db
+        return (db._pattern(i) for i in range(len(db._pattern_ids)))
+
+    def __len__(self):
+        return len(self._db._pattern_ids)
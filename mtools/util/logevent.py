@@ -11,6 +11,21 @@ from dateutil.tz import tzutc
 from mtools.util.pattern import json2pattern
 from mtools.util.logformat import LogFormat
 
+
+def symbol(value):
+    """
+    Return the shared copy of a field value that repeats across log events.
+
+    Namespaces, thread names, operations, commands, plan summaries and query
+    patterns only have a few hundred distinct values in millions of lines.
+    Interning them saves memory and makes hashing and comparing them, for
+    example as Grouping keys, cheap.
+    """
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
 class DateTimeEncoder(json.JSONEncoder):
     """Custom datetime encoder for json output."""
 
@@ -57,6 +72,93 @@ class LogEvent(object):
                       'NETWORK', 'QUERY', 'REPL', 'SHARDING', 'STORAGE',
                       'JOURNAL', 'WRITE', 'TOTAL']
 
+    # defaults of the lazily calculated attributes, see _reset()
+    _split_tokens_calculated = False
+    _split_tokens = None
+
+    _duration_calculated = False
+    _duration = None
+
+    _datetime_calculated = False
+    _datetime = None
+    _datetime_nextpos = None
+    _datetime_format = None
+    _datetime_str = ''
+    # token index where the line after the datetime starts, _line_str is
+    # only joined from the tokens on demand, see _message()
+    _message_pos = None
+
+    # line_str composed of merge marker, datetime and _line_str
+    _full_line_str = None
+
+    _thread_calculated = False
+    _thread = None
+
+    _operation_calculated = False
+    _operation = None
+    _namespace = None
+
+    _pattern = None
+    _sort_pattern = None
+    _actual_query = None
+    _actual_sort = None
+
+    # SERVER-36414 - parameters for slow transactions
+    _lsid = None
+    _txnNumber = None
+    _autocommit = None
+    _readConcern = None
+    _timeActiveMicros = None
+    _timeInactiveMicros = None
+    _readTimestamp = None
+    _terminationCause = None
+    _locks = None
+
+    _command_calculated = False
+    _command = None
+
+    _counters_calculated = False
+    _allowDiskUse = None
+
+    _bytesRead = None
+    _bytesWritten = None
+    _timeReadingMicros = None
+    _timeWritingMicros = None
+
+    # TODO: refactor from the legacy names to modern
+    # (eg: nscanned => keysExamined). Currently _extract_counters()
+    # maps newer property names into legacy equivalents for
+    # broader log file support.
+    _nscanned = None         # keysExamined
+    _nscannedObjects = None  # docsExamined
+    _ntoreturn = None
+    _nupdated = None         # nModified
+    _nreturned = None        # nReturned or nMatched (updates)
+    _ninserted = None        # nInserted
+    _ndeleted = None         # nDeleted
+
+    _cursorid = None
+    _reapedtime = None
+
+    _numYields = None
+    _planSummary = None
+    _actualPlanSummary = None
+    _queryHash = None
+    _hasSortStage = None
+    _writeConflicts = None
+    _r = None
+    _w = None
+    _conn = None
+    _hostname = None
+
+    _level_calculated = False
+    _level = None
+    _component = None
+    _merge_marker_str = ''
+
+    _client_metadata_calculated = False
+    _client_metadata = None
+
     def __init__(self, doc_or_str, fulldoc = True, pretty = False):
         self._debug = False
         self._doc = {}
@@ -80,10 +182,10 @@ class LogEvent(object):
                 # Create from string, remove line breaks at end of _line_str
                 self.logformat = LogFormat.LEGACY
                 self.from_string = True
-                self._line_str = doc_or_str.rstrip()
+                self._line = self._line_str = doc_or_str.rstrip()
 
-                # Legacy log lines will be parsed lazily
-                self._reset()
+                # Legacy log lines will be parsed lazily, starting with
+                # the class attributes
         else:
             # Assume this is a system.profile document
             self.from_string = False
@@ -92,86 +194,33 @@ class LogEvent(object):
                 self._doc = doc_or_str
             self._parse_profile_doc(doc_or_str)
 
-    def _reset(self):
-        self._split_tokens_calculated = False
-        self._split_tokens = None
+    # instance attributes describing the line itself, all other attributes
+    # are calculated lazily and start with the class attributes above
+    _line_fields = ('_debug', '_doc', '_year_rollover', 'logformat',
+                    'from_string', '_line', '_line_str')
 
-        self._duration_calculated = False
-        self._duration = None
+    def _reset(self):
+        """Forget all calculated attributes."""
+        d = self.__dict__
+        kept = dict((key, d[key]) for key in self._line_fields if key in d)
+        d.clear()
+        d.update(kept)
+
+    def _reuse(self, doc_or_str):
+        """Turn this LogEvent into the LogEvent of another line."""
+        self.__dict__.clear()
+        self.__init__(doc_or_str)
+
+    def copy(self):
+        """
+        Return a copy of this LogEvent.
 
-        self._datetime_calculated = False
-        self._datetime = None
-        self._datetime_nextpos = None
-        self._datetime_format = None
-        self._datetime_str = ''
-
-        self._thread_calculated = False
-        self._thread = None
-
-        self._operation_calculated = False
-        self._operation = None
-        self._namespace = None
-
-        self._pattern = None
-        self._sort_pattern = None
-        self._actual_query = None
-        self._actual_sort = None
-
-        # SERVER-36414 - parameters for slow transactions
-        self._lsid = None
-        self._txnNumber = None
-        self._autocommit = None
-        self._readConcern = None
-        self._timeActiveMicros = None
-        self._timeInactiveMicros = None
-        self._readTimestamp = None
-        self._terminationCause = None
-        self._locks = None
-
-        self._command_calculated = False
-        self._command = None
-
-        self._counters_calculated = False
-        self._allowDiskUse = None
-
-        self._bytesRead = None
-        self._bytesWritten = None
-        self._timeReadingMicros = None
-        self._timeWritingMicros = None
-
-        # TODO: refactor from the legacy names to modern
-        # (eg: nscanned => keysExamined). Currently _extract_counters()
-        # maps newer property names into legacy equivalents for
-        # broader log file support.
-        self._nscanned = None         # keysExamined
-        self._nscannedObjects = None  # docsExamined
-        self._ntoreturn = None
-        self._nupdated = None         # nModified
-        self._nreturned = None        # nReturned or nMatched (updates)
-        self._ninserted = None        # nInserted
-        self._ndeleted = None         # nDeleted
-
-        self._cursorid = None
-        self._reapedtime = None
-
-        self._numYields = None
-        self._planSummary = None
-        self._actualPlanSummary = None
-        self._queryHash = None
-        self._hasSortStage = None
-        self._writeConflicts = None
-        self._r = None
-        self._w = None
-        self._conn = None
-        self._hostname = None
-
-        self._level_calculated = False
-        self._level = None
-        self._component = None
-        self.merge_marker_str = ''
-
-        self._client_metadata_calculated = False
-        self._client_metadata = None
+        Needed to keep a LogEvent from a LogFile that reuses its LogEvent
+        objects, see LogFile.set_reuse_events().
+        """
+        logevent = self.__class__.__new__(self.__class__)
+        logevent.__dict__.update(self.__dict__)
+        return logevent
 
     def set_line_str(self, line_str):
         """
@@ -182,10 +231,25 @@ class LogEvent(object):
             raise ValueError("Can only set_line_str() for LogEvent created from "
                              "a string (eg legacy log file format).")
 
-        if line_str != self._line_str:
-            self._line_str = line_str.rstrip()
+        if line_str != self._line:
+            self._line = self._line_str = line_str.rstrip()
             self._reset()
 
+    @property
+    def merge_marker_str(self):
+        return self._merge_marker_str
+
+    @merge_marker_str.setter
+    def merge_marker_str(self, marker):
+        self._merge_marker_str = marker
+        self._full_line_str = None
+
+    def _message(self):
+        """Return the line without the datetime (lazy)."""
+        if self._line_str is None:
+            self._line_str = ' '.join(self.split_tokens[self._message_pos:])
+        return self._line_str
+
     def get_line_str(self, pretty = False):
         """Return line_str depending on source, logfile or system.profile."""
 
@@ -196,14 +260,15 @@ class LogEvent(object):
             else:
                 # Compact line string (eg for mlogfilter)
                 return json.dumps(self.doc)
-        else:
+        elif self._full_line_str is None:
             if self.from_string:
-                return ' '.join([s for s in [self.merge_marker_str,
-                                            self._datetime_str,
-                                            self._line_str] if s])
+                self._full_line_str = ' '.join(
+                    [s for s in [self._merge_marker_str, self._datetime_str,
+                                 self._message()] if s])
             else:
-                return ' '.join([s for s in [self._datetime_str,
-                                            self._line_str] if s])
+                self._full_line_str = ' '.join(
+                    [s for s in [self._datetime_str, self._line_str] if s])
+        return self._full_line_str
 
     line_str = property(get_line_str, set_line_str)
 
@@ -217,7 +282,7 @@ class LogEvent(object):
         """Split string into tokens (lazy)."""
         if not self._split_tokens_calculated:
             # split into items (whitespace split)
-            self._split_tokens = self._line_str.split()
+            self._split_tokens = self._line.split()
             self._split_tokens_calculated = True
 
         return self._split_tokens
@@ -228,30 +293,28 @@ class LogEvent(object):
         if not self._duration_calculated:
             self._duration_calculated = True
 
-            # split_tokens = self.split_tokens
-            line_str = self.line_str
+            line = self._line
 
-            if (line_str
-                and line_str.endswith('ms')
-                and 'Scheduled new oplog query' not in line_str):
+            if (line
+                and line.endswith('ms')
+                and 'Scheduled new oplog query' not in line):
 
                 try:
                     # find duration from end
-                    space_pos = line_str.rfind(" ")
-                    if space_pos == -1:
+                    split_tokens = self.split_tokens
+                    if len(split_tokens) < 2:
                         return
-                    self._duration = int(line_str[line_str.rfind(" ") +
-                                                  1:-2].replace(',', ''))
+                    self._duration = int(split_tokens[-1][:-2]
+                                         .replace(',', ''))
                 except ValueError:
                     self._duration = None
-            elif "flushing" in self.line_str:
-                matchobj = re.search(r'flushing mmaps took (\d+)ms',
-                                     self.line_str)
+            elif "flushing" in line:
+                matchobj = re.search(r'flushing mmaps took (\d+)ms', line)
                 if matchobj:
                     self._duration = int(matchobj.group(1))
             # SERVER-16176 - Logging of slow checkpoints
-            elif "Checkpoint took" in self.line_str:
-                matchobj = re.search("Checkpoint took ([\d]+) seconds to complete", self.line_str)
+            elif "Checkpoint took" in line:
+                matchobj = re.search("Checkpoint took ([\d]+) seconds to complete", line)
                 if matchobj:
                     self._duration = int(matchobj.group(1)) * 1000
 
@@ -303,9 +366,11 @@ class LogEvent(object):
                     else:
                         self._datetime_nextpos += 4
 
-                    # separate datetime str and linestr
-                    self._line_str = (' '.join(self.split_tokens
-                                               [self._datetime_nextpos:]))
+                    # separate datetime str and linestr, which is only
+                    # joined from the tokens when needed
+                    self._message_pos = self._datetime_nextpos
+                    self._line_str = None
+                    self._full_line_str = None
 
                     if self.level:
                         self._datetime_nextpos += 2
@@ -424,12 +489,12 @@ class LogEvent(object):
             connection_token = split_tokens[self.datetime_nextpos]
             match = re.match(r'^\[([^\]]*)\]$', connection_token)
             if match:
-                self._thread = match.group(1)
+                self._thread = symbol(match.group(1))
 
             if self._thread is not None:
                 if self._thread in ['initandlisten', 'mongosMain']:
                     if len(split_tokens) >= 5 and split_tokens[-5][0] == '#':
-                        self._conn = 'conn' + split_tokens[-5][1:]
+                        self._conn = symbol('conn' + split_tokens[-5][1:])
                 elif self._thread.startswith('conn'):
                     self._conn = self._thread
         return self._thread
@@ -487,8 +552,8 @@ class LogEvent(object):
 
         if op == 'warning:':
             # check if this log line got truncated
-            if ("warning: log line attempted" in self._line_str and
-                    "over max size" in self._line_str):
+            if ("warning: log line attempted" in self._line and
+                    "over max size" in self._line):
                 self._datetime_nextpos = split_tokens.index('...')
                 op = split_tokens[self._datetime_nextpos + 1]
             else:
@@ -496,8 +561,8 @@ class LogEvent(object):
                 return
 
         if op in self.log_operations:
-            self._operation = op
-            self._namespace = split_tokens[self._datetime_nextpos + 2]
+            self._operation = symbol(op)
+            self._namespace = symbol(split_tokens[self._datetime_nextpos + 2])
 
     @property
     def pattern(self):
@@ -507,12 +572,12 @@ class LogEvent(object):
             # trigger evaluation of operation
             if (self.operation in ['query', 'getmore', 'update', 'remove'] or
                     self.command in ['count', 'findandmodify']):
-                self._pattern = self._find_pattern('query: ')
+                self._pattern = symbol(self._find_pattern('query: '))
                 # Fallback check for q: variation (eg "remove" command in 3.6+)
                 if self._pattern is None:
-                    self._pattern = self._find_pattern('q: ')
+                    self._pattern = symbol(self._find_pattern('q: '))
             elif self.command == 'find':
-                self._pattern = self._find_pattern('filter: ')
+                self._pattern = symbol(self._find_pattern('filter: '))
 
         return self._pattern
 
@@ -568,7 +633,7 @@ class LogEvent(object):
                         # workaround for <= 2.2 log files,
                         # where command was not listed separately
                         command = self.split_tokens[command_idx + 2][:-1]
-                    self._command = command.lower()
+                    self._command = symbol(command.lower())
                 except ValueError:
                     pass
 
@@ -825,129 +890,136 @@ class LogEvent(object):
         return self._w
 
     def _extract_counters(self):
-
+        """Extract counters like nscanned and nreturned from the logevent."""
         if self.logformat != LogFormat.LEGACY:
             return
 
-        """Extract counters like nscanned and nreturned from the logevent."""
-        # extract counters (if present)
-        counters = ['nscanned', 'nscannedObjects', 'ntoreturn', 'nreturned',
-                    'ninserted', 'nupdated', 'ndeleted', 'r', 'w', 'numYields',
-                    'planSummary', 'writeConflicts', 'keyUpdates', 'bytesRead', 'bytesWritten', 'timeReadingMicros',
-                    'timeWritingMicros', 'lsid', 'txnNumber', 'autocommit',  'allowDiskUse', 'level',
-                    'timeActiveMicros', 'timeInactiveMicros', 'duration', 'readTimestamp', 'terminationCause']
-
-        # TODO: refactor mtools to use current counter names throughout
-        # Transitionary hack: mapping of current names into prior equivalents
-        counter_equiv = {
-            'datetime': 'datetime',
-            'docsExamined': 'nscannedObjects',
-            'keysExamined': 'nscanned',
-            'nDeleted': 'ndeleted',
-            'nInserted': 'ninserted',
-            'nMatched': 'nreturned',
-            'nModified': 'nupdated',
-            'cursorid' : 'cursorid',
-            'repaedtime' : 'reapedtime'
-        }
-        counters.extend(counter_equiv.keys())
-
         split_tokens = self.split_tokens
 
         # trigger operation evaluation to get access to offset
         if self.operation:
-            for t, token in enumerate(split_tokens[self.datetime_nextpos +
-                                                   2:]):
-                for counter in counters:
-                    if token.startswith('%s:' % counter):
-                        try:
-                            # Remap counter to standard name, if applicable
-                            counter = counter_equiv.get(counter, counter)
-                            if (counter == 'level' and token.startswith('level')):
-                                    self._readConcern = (
-                                    split_tokens[t + 1 + self.datetime_nextpos + 2].replace(',', ''))
-                            elif (counter == 'readTimestamp' and token.startswith('readTimestamp')):
-                                vars(self)['_' + counter] = (token.split(':')
-                                [-1]).replace(',', '')
-                            elif (counter == 'terminationCause' and token.startswith('terminationCause')):
-                                vars(self)['_' + counter] = (token.split(':')
-                                [-1]).replace(',', '')
-                            else:
-                                vars(self)['_' + counter] = int((token.split(':')
-                                                             [-1]).replace(',',
-                                                                           ''))
-
-                            # extract allowDiskUse counter
-                            if (counter == 'allowDiskUse' and token.startswith('allowDiskUse')):
-                                # Splitting space between token and value
-                                self._allowDiskUse = split_tokens[t + 1 + self.datetime_nextpos + 2].replace(',','')
-                            else:
-                                vars(self)['_' + counter] = int((token.split(':')[-1]).replace(',', ''))
-
-                        except ValueError:
-                            # see if this is a pre-2.5.2 numYields with space
-                            # in between (e.g. "numYields: 2")
-                            # https://jira.mongodb.org/browse/SERVER-10101
-                            if (counter == 'numYields' and
-                                    token.startswith('numYields')):
-                                try:
-                                    self._numYields = int((split_tokens[t + 1 + self.datetime_nextpos + 2]).replace(',', ''))
-                                except ValueError:
-                                    pass
-
-                            if (counter == 'bytesRead' and
-                                    token.startswith('bytesRead')):
-                                try:
-                                    self._bytesRead = int((split_tokens[t + 1 + self.datetime_nextpos + 2]).replace(',', ''))
-                                except ValueError:
-                                    pass
-                            if (counter == 'bytesWritten' and
-                                    token.startswith('bytesWritten')):
-                                try:
-                                    self._bytesWritten = int(
-                                        (split_tokens[t + 1 + self.datetime_nextpos + 2]).replace(',', ''))
-                                except ValueError:
-                                    pass
-                            if (counter == 'timeReadingMicros' and
-                                    token.startswith('timeReadingMicros')):
-                                try:
-                                    self._timeReadingMicros = int(
-                                        (split_tokens[t + 1 + self.datetime_nextpos + 2]).replace(',', ''))
-                                except ValueError:
-                                    pass
-                            if (counter == 'timeWritingMicros' and
-                                    token.startswith('timeWritingMicros')):
-                                try:
-                                    self._timeWritingMicros = int(
-                                        (split_tokens[t + 1 + self.datetime_nextpos + 2]).replace(',', ''))
-                                except ValueError:
-                                    pass
-                            if (counter == 'txnNumber' and
-                                    token.startswith('txnNumber')):
-                                    self._txnNumber = int((split_tokens[t + 1 + self.datetime_nextpos + 2]).replace(',', ''))
-                            if (counter == 'autocommit' and
-                                    token.startswith('autocommit')):
-                                    self._autocommit = (split_tokens[t + 1 + self.datetime_nextpos + 2].replace(',', ''))
-                            if (counter == 'lsid' and
-                                    token.startswith('lsid')):
-                                    self._lsid = (split_tokens[t + 2 + self.datetime_nextpos + 2].replace(',', ''))
-                            if (counter == 'planSummary' and
-                                    token.startswith('planSummary')):
-                                try:
-                                    self._planSummary = split_tokens[t + 1 + self.datetime_nextpos + 2]
-                                    if self._planSummary:
-                                        if split_tokens[t + 1 + self.datetime_nextpos + 3] != '{':
-                                            self._actualPlanSummary = self._planSummary
-                                        else:
-                                            self._actualPlanSummary = '%s %s' % (
-                                                self._planSummary,
-                                                self._find_pattern('planSummary: %s' % self._planSummary, actual=True)
-                                            )
-                                except ValueError:
-                                    pass
-
-                        # token not parsable, skip
-                        break
+            counters = self._counters
+            for pos in range(self.datetime_nextpos + 2, len(split_tokens)):
+                token = split_tokens[pos]
+                colon = token.find(':')
+                if colon == -1:
+                    continue
+                counter = counters.get(token[:colon])
+                if counter is not None:
+                    attr, parse = counter
+                    value = token[token.rfind(':') + 1:].replace(',', '')
+                    parse(self, attr, value, split_tokens, pos)
+
+    # parsers for the counters of _extract_counters(), called with the
+    # attribute to set, the value after the colon and the position of the
+    # token, for values that follow after a space
+
+    def _parse_int(self, attr, value, tokens, pos):
+        try:
+            setattr(self, attr, int(value))
+        except ValueError:
+            pass
+
+    def _parse_int_or_next(self, attr, value, tokens, pos):
+        try:
+            setattr(self, attr, int(value))
+        except ValueError:
+            # see if this is a pre-2.5.2 numYields with space
+            # in between (e.g. "numYields: 2")
+            # https://jira.mongodb.org/browse/SERVER-10101
+            try:
+                setattr(self, attr, int(tokens[pos + 1].replace(',', '')))
+            except (ValueError, IndexError):
+                pass
+
+    def _parse_str(self, attr, value, tokens, pos):
+        setattr(self, attr, value)
+
+    def _parse_next_str(self, attr, value, tokens, pos, offset=1):
+        try:
+            setattr(self, attr, int(value))
+        except ValueError:
+            if pos + offset < len(tokens):
+                setattr(self, attr, tokens[pos + offset].replace(',', ''))
+
+    def _parse_lsid(self, attr, value, tokens, pos):
+        self._parse_next_str(attr, value, tokens, pos, offset=2)
+
+    def _parse_level(self, attr, value, tokens, pos):
+        # the level of the readConcern
+        if pos + 1 < len(tokens):
+            self._readConcern = tokens[pos + 1].replace(',', '')
+
+    def _parse_allowDiskUse(self, attr, value, tokens, pos):
+        try:
+            self._allowDiskUse = int(value)
+        except ValueError:
+            return
+        if pos + 1 < len(tokens):
+            self._allowDiskUse = tokens[pos + 1].replace(',', '')
+
+    def _parse_planSummary(self, attr, value, tokens, pos):
+        try:
+            self._planSummary = int(value)
+            return
+        except ValueError:
+            pass
+        if pos + 1 >= len(tokens):
+            return
+        self._planSummary = symbol(tokens[pos + 1])
+        if self._planSummary:
+            if pos + 2 >= len(tokens) or tokens[pos + 2] != '{':
+                self._actualPlanSummary = self._planSummary
+            else:
+                self._actualPlanSummary = '%s %s' % (
+                    self._planSummary,
+                    self._find_pattern('planSummary: %s' % self._planSummary,
+                                       actual=True)
+                )
+
+    # counters by the name before the colon, with the attribute and the
+    # parser of their value
+    _counters = {
+        'nscanned': ('_nscanned', _parse_int),
+        'nscannedObjects': ('_nscannedObjects', _parse_int),
+        'ntoreturn': ('_ntoreturn', _parse_int),
+        'nreturned': ('_nreturned', _parse_int),
+        'ninserted': ('_ninserted', _parse_int),
+        'nupdated': ('_nupdated', _parse_int),
+        'ndeleted': ('_ndeleted', _parse_int),
+        'r': ('_r', _parse_int),
+        'w': ('_w', _parse_int),
+        'writeConflicts': ('_writeConflicts', _parse_int),
+        'keyUpdates': ('_keyUpdates', _parse_int),
+        'timeActiveMicros': ('_timeActiveMicros', _parse_int),
+        'timeInactiveMicros': ('_timeInactiveMicros', _parse_int),
+        'duration': ('_duration', _parse_int),
+        'datetime': ('_datetime', _parse_int),
+        'cursorid': ('_cursorid', _parse_int),
+        'numYields': ('_numYields', _parse_int_or_next),
+        'bytesRead': ('_bytesRead', _parse_int_or_next),
+        'bytesWritten': ('_bytesWritten', _parse_int_or_next),
+        'timeReadingMicros': ('_timeReadingMicros', _parse_int_or_next),
+        'timeWritingMicros': ('_timeWritingMicros', _parse_int_or_next),
+        'txnNumber': ('_txnNumber', _parse_int_or_next),
+        'readTimestamp': ('_readTimestamp', _parse_str),
+        'terminationCause': ('_terminationCause', _parse_str),
+        'autocommit': ('_autocommit', _parse_next_str),
+        'lsid': ('_lsid', _parse_lsid),
+        'level': ('_readConcern', _parse_level),
+        'allowDiskUse': ('_allowDiskUse', _parse_allowDiskUse),
+        'planSummary': ('_planSummary', _parse_planSummary),
+        # TODO: refactor mtools to use current counter names throughout
+        # Transitionary hack: mapping of current names into prior
+        # equivalents
+        'docsExamined': ('_nscannedObjects', _parse_int),
+        'keysExamined': ('_nscanned', _parse_int),
+        'nDeleted': ('_ndeleted', _parse_int),
+        'nInserted': ('_ninserted', _parse_int),
+        'nMatched': ('_nreturned', _parse_int),
+        'nModified': ('_nupdated', _parse_int),
+        'repaedtime': ('_reapedtime', _parse_int),
+    }
 
     @property
     def level(self):
@@ -1086,39 +1158,60 @@ class LogEvent(object):
             return
         elif self.datetime is None:
             return
-        elif format.startswith('ctime'):
-            dt_string = (self.weekdays[self.datetime.weekday()] + ' ' +
-                         self.datetime.strftime("%b %d %H:%M:%S"))
+
+        # the timestamp only changes every second, apart from the
+        # milliseconds
+        dt = self.datetime
+        key = (format, dt.replace(microsecond=0, tzinfo=None), dt.utcoffset())
+        cache = self._timestamp_cache
+        parts = cache.get(key)
+        if parts is None:
+            parts = self._timestamp_parts(format, dt)
+            if len(cache) >= self.timestamp_cache_size:
+                cache.clear()
+            cache[key] = parts
+
+        prefix, suffix = parts
+        if format == 'ctime-pre2.4':
+            dt_string = prefix
+        else:
+            dt_string = (prefix + '.' + str(dt.microsecond // 1000).zfill(3) +
+                         suffix)
+
+        # set new string and format
+        self._datetime_str = dt_string
+        self._datetime_format = format
+        self._full_line_str = None
+
+    # timestamps formatted by _reformat_timestamp(), by format, datetime
+    # without microseconds and utc offset
+    _timestamp_cache = {}
+    timestamp_cache_size = 1024
+
+    def _timestamp_parts(self, format, dt):
+        """
+        Return the timestamp in a format, before and after the milliseconds.
+        """
+        if format.startswith('ctime'):
+            dt_string = (self.weekdays[dt.weekday()] + ' ' +
+                         dt.strftime("%b %d %H:%M:%S"))
             # remove zero-padding from day number
             tokens = dt_string.split(' ')
             if tokens[2].startswith('0'):
                 tokens[2] = tokens[2].replace('0', ' ', 1)
-            dt_string = ' '.join(tokens)
-            if format == 'ctime':
-                dt_string += '.' + str(int(self.datetime.microsecond /
-                                           1000)).zfill(3)
+            return ' '.join(tokens), ''
         elif format == 'iso8601-local':
-            dt_string = self.datetime.isoformat()
-            if self.datetime.utcoffset() is None:
+            dt_string = dt.replace(microsecond=0).isoformat()
+            if dt.utcoffset() is None:
                 dt_string += '+00:00'
-            ms_str = str(int(self.datetime.microsecond / 1000)).zfill(3)[:3]
-            # change isoformat string to have 3 digit milliseconds and no :
-            # in offset
-            dt_string = re.sub(r'(\.\d+)?([+-])(\d\d):(\d\d)',
-                               '.%s\\2\\3\\4' % ms_str, dt_string, count=1)
-        elif format == 'iso8601-utc':
-            if self.datetime.utcoffset():
-                dt_string = self.datetime.astimezone(tzutc()).strftime("%Y-%m-"
-                                                                       "%dT%H:"
-                                                                       "%M:%S")
-            else:
-                dt_string = self.datetime.strftime("%Y-%m-%dT%H:%M:%S")
-            dt_string += '.' + str(int(self.datetime.microsecond /
-                                       1000)).zfill(3)[:3] + 'Z'
-
-        # set new string and format
-        self._datetime_str = dt_string
-        self._datetime_format = format
+            # no : in offset
+            match = re.search(r'([+-])(\d\d):(\d\d)', dt_string)
+            return (dt_string[:match.start()],
+                    ''.join(match.groups()) + dt_string[match.end():])
+        else:
+            if dt.utcoffset():
+                dt = dt.astimezone(tzutc())
+            return dt.strftime("%Y-%m-%dT%H:%M:%S"), 'Z'
 
     def __str__(self):
         """Default string conversion for LogEvent object is its line_str."""
@@ -1169,26 +1262,28 @@ class LogEvent(object):
         self._reformat_timestamp('ctime', force=True)
 
         self._thread_calculated = True
-        self._thread = doc['thread']
+        self._thread = symbol(doc['thread'])
 
         self._operation_calculated = True
-        self._operation = doc[u'op']
-        self._namespace = doc[u'ns']
+        self._operation = symbol(doc[u'op'])
+        self._namespace = symbol(doc[u'ns'])
 
         self._command_calculated = True
         if self.operation == 'command':
-            self._command = doc[u'command'].keys()[0]
+            self._command = symbol(doc[u'command'].keys()[0])
 
         # query pattern for system.profile events, all three cases.
         # See SERVER-13245
         if 'query' in doc:
             if 'query' in doc['query'] and isinstance(doc['query']['query'],
                                                       dict):
-                self._pattern = str(doc['query']['query']).replace("'", '"')
+                self._pattern = symbol(str(doc['query']['query'])
+                                       .replace("'", '"'))
             elif '$query' in doc['query']:
-                self._pattern = str(doc['query']['$query']).replace("'", '"')
+                self._pattern = symbol(str(doc['query']['$query'])
+                                       .replace("'", '"'))
             else:
-                self._pattern = str(doc['query']).replace("'", '"')
+                self._pattern = symbol(str(doc['query']).replace("'", '"'))
 
             # sort pattern
             if ('orderby' in doc['query'] and
@@ -1264,7 +1359,7 @@ class LogEvent(object):
         self._level_calculated = True
 
         # Thread name or execution context
-        self._thread = doc['ctx']
+        self._thread = symbol(doc['ctx'])
         self._threadcalculated = True
 
         # operation: insert, update, remove, query, command, getmore, None
@@ -1273,14 +1368,14 @@ class LogEvent(object):
         # pattern: the query pattern for queries, updates, counts, etc
         if 'attr' in doc:
             self._duration = doc['attr'].get('durationMillis')
-            self._namespace = doc['attr'].get('ns')
+            self._namespace = symbol(doc['attr'].get('ns'))
             if self._namespace is None:
                 # Some contexts use namespace instead of ns:
                 #   initandlisten, LogicalSessionCacheRefresh,
                 #   IndexBuildsCoordinatorMongod, ...
-                self._namespace= doc['attr'].get('namespace')
-            self._operation = doc['attr'].get('type')
-            self._planSummary = doc['attr'].get('planSummary')
+                self._namespace = symbol(doc['attr'].get('namespace'))
+            self._operation = symbol(doc['attr'].get('type'))
+            self._planSummary = symbol(doc['attr'].get('planSummary'))
             self._queryHash = doc['attr'].get('queryHash')
             self._hasSortStage = doc['attr'].get('hasSortStage')
             self._numYields = doc['attr'].get('numYields')
@@ -1295,6 +1390,14 @@ class LogEvent(object):
             self._ninserted = doc['attr'].get('nInserted')
             self._ndeleted = doc['attr'].get('nDeleted')
             self._cursorid = doc['attr'].get('cursorid')
+            storage = doc['attr'].get('storage')
+            if isinstance(storage, dict) and isinstance(storage.get('data'),
+                                                        dict):
+                data = storage['data']
+                self._bytesRead = data.get('bytesRead')
+                self._bytesWritten = data.get('bytesWritten')
+                self._timeReadingMicros = data.get('timeReadingMicros')
+                self._timeWritingMicros = data.get('timeWritingMicros')
             # self._reapedtime  # TODO: https://jira.mongodb.org/browse/SERVER-28604
 
             if doc['attr'].get('type') == 'command':
@@ -1303,9 +1406,9 @@ class LogEvent(object):
                 if isinstance(command, dict):
                     try:
                         if command.get('filter'):
-                            self._pattern = json2pattern(command['filter'], self._debug)
+                            self._pattern = symbol(json2pattern(command['filter'], self._debug))
                         elif command.get('pipeline'):
-                            self._pattern = json2pattern(command['pipeline'], self._debug)
+                            self._pattern = symbol(json2pattern(command['pipeline'], self._debug))
                     except Exception as e:
                         if self._debug:
                             print(f"Exception: {e} for {doc}",file=sys.stderr)
@@ -1313,7 +1416,7 @@ class LogEvent(object):
                 # The command name isn't explicitly listed but
                 # should be the first element when an ordered
                 # dict is iterated
-                self._command = next(iter(command))
+                self._command = symbol(next(iter(command)))
 
         self._operation_calculated = True
         self._duration_calculated = True
@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 
 import os
+import random
 import re
 import sys
+import time
 from datetime import datetime
 from math import ceil
 
+from dateutil.tz import tzoffset, tzutc
+
+from mtools.util.filecache import FileCache
 from mtools.util.input_source import InputSource
 from mtools.util.logevent import LogEvent
 from mtools.util.logformat import LogFormat
@@ -42,6 +47,7 @@ class LogFile(InputSource):
         self._storage_engine = None
 
         self._datetime_format = None
+        self._datetime_nextpos = None
         self._year_rollover = None
 
         self._shards = None
@@ -56,9 +62,32 @@ class LogFile(InputSource):
 
         self._has_level = None
 
-        # make sure bounds are calculated before starting to iterate,
-        # including potential year rollovers
-        self._calculate_bounds()
+        # random sampling of the lines returned by iteration, see set_sample()
+        self._sample_mode = None
+        self._sample_size = None
+        self._sample_run = None
+        self._sample_seed = None
+        self._sampled = 0
+        self._sample_population = 0
+        self._num_lines_estimated = False
+
+        # incomplete last line while following a growing file, see poll()
+        self._follow_buffer = None
+
+        # for stdin, fast_forward() skips lines while iterating and pushes
+        # back the first line it does not skip
+        self._skip_until = None
+        self._pushback = None
+
+        # iteration stops at this byte offset, see set_end_limit()
+        self._end_offset = None
+        self._stop_at = None
+
+        # LogEvent objects reused for the lines, see set_reuse_events()
+        self._reuse = None
+        self._reuse_pos = 0
+
+        # bounds are calculated lazily, at the latest before iterating
 
     def __getstate__(self):
         """
@@ -161,6 +190,37 @@ class LogFile(InputSource):
             self._iterate_lines()
         return self._num_lines
 
+    @property
+    def num_lines_estimated(self):
+        """Return True if num_lines was extrapolated from the file head."""
+        return self._num_lines_estimated
+
+    @property
+    def sample_fraction(self):
+        """
+        Return the fraction of the log file covered by the sample.
+
+        Returns None if no sampling is configured. For reservoir and seek
+        sampling, the fraction is only known after a full iteration.
+        """
+        if not self._sample_mode:
+            return None
+        if self._sample_mode == 'rate':
+            return self._sample_size
+        if not self._sample_population:
+            return None
+        return min(1., float(self._sampled) / self._sample_population)
+
+    @property
+    def sample_counts(self):
+        """
+        Return a tuple of sampled and total units of the last iteration.
+
+        Units are lines for rate and reservoir sampling and bytes for seek
+        sampling.
+        """
+        return self._sampled, self._sample_population
+
     @property
     def restarts(self):
         """Lazy evaluation of all restarts."""
@@ -283,8 +343,16 @@ class LogFile(InputSource):
         return self._chunk_splits
 
 
-    def next(self):
-        """Get next line, adjust for year rollover and hint datetime format."""
+    def _readline(self):
+        """Read the next raw line from the file, or None at the end."""
+        if self._pushback is not None:
+            line, self._pushback = self._pushback, None
+            return line
+
+        if (self._stop_at is not None and
+                self.filehandle.tell() >= self._stop_at):
+            return None
+
         # use readline here because next() iterator uses internal readahead
         # buffer so seek position is wrong
         line = self.filehandle.readline()
@@ -293,9 +361,25 @@ class LogFile(InputSource):
             line = line.decode('utf-8', 'replace')
 
         if line == '':
+            return None
+        return line.rstrip('\n')
+
+    def next(self):
+        """Get next line, adjust for year rollover and hint datetime format."""
+        line = self._readline()
+        if line is None:
             raise StopIteration
-        line = line.rstrip('\n')
-        le = LogEvent(line)
+        return self._logevent(line)
+
+    def _logevent(self, line):
+        """Create a LogEvent from a raw line, using the datetime hints."""
+        reuse = self._reuse
+        if reuse:
+            le = reuse[self._reuse_pos]
+            self._reuse_pos = (self._reuse_pos + 1) % len(reuse)
+            le._reuse(line)
+        else:
+            le = LogEvent(line)
 
         # hint format and nextpos from previous line
         if self._datetime_format and self._datetime_nextpos is not None:
@@ -314,6 +398,133 @@ class LogFile(InputSource):
 
         return le
 
+    def set_reuse_events(self, count=1):
+        """
+        Reuse `count` LogEvent objects for the lines when iterating.
+
+        Saves creating a LogEvent per line for consumers that are done with
+        an event before they read the next `count` lines. A LogEvent that
+        is kept longer has to be copied with LogEvent.copy(). iter_batches()
+        reuses at least as many objects as there are events in a batch, but
+        poll() returns lists of events and must not be used with reuse.
+        count=0 creates a new LogEvent for each line again.
+        """
+        self._reuse = [LogEvent('') for _ in range(count)] or None
+        self._reuse_pos = 0
+
+    def set_sample(self, rate=None, lines=None, seek=None, run_length=100,
+                   seed=None):
+        """
+        Only return a random sample of the lines when iterating.
+
+        Exactly one of the sampling modes can be chosen:
+          rate:  keep each line with probability `rate` (Bernoulli)
+          lines: keep exactly `lines` lines, chosen uniformly (reservoir)
+          seek:  jump to `seek` random byte offsets and read `run_length`
+                 lines from each (files only, does not read the whole file)
+
+        Sampled lines are always returned in file order. Unsampled lines
+        are never parsed. Every iteration returns the same sample for the
+        same `seed`. Calling set_sample() without a mode disables sampling.
+        """
+        modes = [m for m in (rate, lines, seek) if m is not None]
+        if len(modes) > 1:
+            raise ValueError("only one sampling mode can be used at a time.")
+
+        if rate is not None:
+            if not 0 < rate <= 1:
+                raise ValueError("sample rate must be in (0, 1].")
+            self._sample_mode, self._sample_size = 'rate', rate
+        elif lines is not None:
+            if lines < 1:
+                raise ValueError("number of sample lines must be positive.")
+            self._sample_mode, self._sample_size = 'lines', lines
+        elif seek is not None:
+            if self.from_stdin:
+                raise ValueError("seek sampling is not possible for stdin.")
+            if seek < 1 or run_length < 1:
+                raise ValueError("number of seeks and run length must be "
+                                 "positive.")
+            self._sample_mode, self._sample_size = 'seek', seek
+        else:
+            self._sample_mode, self._sample_size = None, None
+
+        self._sample_run = run_length
+        self._sample_seed = (seed if seed is not None
+                             else random.randrange(2 ** 32))
+
+    def _iter_sample(self):
+        """Generator over the sampled LogEvents, see set_sample()."""
+        rng = random.Random(self._sample_seed)
+        self._sampled = 0
+        self._sample_population = 0
+
+        if self._sample_mode == 'rate':
+            rate = self._sample_size
+            while True:
+                line = self._readline()
+                if line is None:
+                    return
+                self._sample_population += 1
+                if rng.random() < rate:
+                    self._sampled += 1
+                    yield self._logevent(line)
+
+        elif self._sample_mode == 'lines':
+            size = self._sample_size
+            reservoir = []
+            while True:
+                line = self._readline()
+                if line is None:
+                    break
+                n = self._sample_population
+                self._sample_population += 1
+                if n < size:
+                    reservoir.append((n, line))
+                else:
+                    j = rng.randrange(n + 1)
+                    if j < size:
+                        reservoir[j] = (n, line)
+
+            reservoir.sort()
+            self._sampled = len(reservoir)
+            for _, line in reservoir:
+                yield self._logevent(line)
+
+        else:
+            # sample from the current position, which may have been moved
+            # by fast_forward(), to the end of the file or range
+            start = self.filehandle.tell()
+            end = (self._end_offset if self._end_offset is not None
+                   else self.filesize)
+            self._sample_population = max(end - start, 0)
+            if end <= start:
+                return
+
+            offsets = sorted(rng.randrange(start, end)
+                             for _ in range(self._sample_size))
+            pos = start
+            for offset in offsets:
+                # runs that overlap continue where the previous one stopped
+                offset = max(offset, pos)
+                self.filehandle.seek(offset)
+                try:
+                    le = self._find_curr_line()
+                except StopIteration:
+                    le = None
+                if le is None:
+                    break
+
+                yield le
+                for _ in range(self._sample_run - 1):
+                    line = self._readline()
+                    if line is None:
+                        break
+                    yield self._logevent(line)
+
+                pos = self.filehandle.tell()
+                self._sampled += pos - offset
+
     def __iter__(self):
         """
         Iterate over LogFile object.
@@ -322,31 +533,252 @@ class LogFile(InputSource):
         """
         le = None
 
-        while True:
-            try:
-                le = self.next()
-            except StopIteration as e:
-                # end of log file, get end date
-                if not self.end and self.from_stdin:
-                    if le and le.datetime:
-                        self._end = le.datetime
+        # make sure bounds are calculated before starting to iterate,
+        # including potential year rollovers
+        self._calculate_bounds()
+
+        if self._skip_until is not None:
+            self._pushback = self._skip_stdin(self._skip_until)
+            self._skip_until = None
+
+        # stop at the end of the byte range, if set
+        self._stop_at = self._end_offset
+        try:
+            if self._sample_mode:
+                for le in self._iter_sample():
+                    try:
+                        yield le
+                    except StopIteration:
+                        return
 
-                # future iterations start from the beginning
                 if not self.from_stdin:
                     self.filehandle.seek(0)
-
-                # return (instead of raising StopIteration exception) per PEP 479
                 return
 
-            # get start date for stdin input
-            if not self.start and self.from_stdin:
-                if le and le.datetime:
-                    self._start = le.datetime
+            while True:
+                try:
+                    le = self.next()
+                except StopIteration as e:
+                    # end of log file, get end date
+                    if not self.end and self.from_stdin:
+                        if le and le.datetime:
+                            self._end = le.datetime
+
+                    # future iterations start from the beginning
+                    if not self.from_stdin:
+                        self.filehandle.seek(0)
+
+                    # return (instead of raising StopIteration exception) per PEP 479
+                    return
+
+                # get start date for stdin input
+                if not self.start and self.from_stdin:
+                    if le and le.datetime:
+                        self._start = le.datetime
+
+                try:
+                    yield le
+                except StopIteration:
+                    return
+        finally:
+            self._stop_at = None
+
+    def iter_batches(self, size=1000):
+        """
+        Iterate over lists of up to size LogEvents.
+
+        Returns the same events as iterating over the LogFile, but without
+        the overhead of a generator step per line.
+        """
+        if self._reuse and len(self._reuse) < size:
+            # the events of a batch must not share objects
+            self.set_reuse_events(size)
+
+        if self.from_stdin or self._sample_mode:
+            for batch in InputSource.iter_batches(self, size):
+                yield batch
+            return
+
+        self._calculate_bounds()
+
+        readline = self._readline
+        logevent = self._logevent
+        self._stop_at = self._end_offset
+        try:
+            while True:
+                batch = []
+                for _ in range(size):
+                    line = readline()
+                    if line is None:
+                        break
+                    batch.append(logevent(line))
+                if batch:
+                    yield batch
+                if len(batch) < size:
+                    break
+
+            # future iterations start from the beginning
+            self.filehandle.seek(0)
+        finally:
+            self._stop_at = None
+
+    def _skip_stdin(self, start_dt):
+        """
+        Skip lines older than start_dt and return the first line that is not.
+
+        Only the timestamp prefix of each line is looked at, no LogEvents are
+        created for skipped lines. Returns None if the end is reached.
+        """
+        parser = LogEvent('')
+        cache = [None, None]
+        while True:
+            line = self._readline()
+            if line is None:
+                return None
+            dt = self._prefix_datetime(line, parser, cache)
+            if dt is not None and dt >= start_dt:
+                return line
+
+    @staticmethod
+    def _prefix_datetime(line, parser, cache):
+        """
+        Return the datetime of a raw line from its timestamp prefix, or None.
 
+        Only the part up to the seconds is parsed, and only once per second:
+        `cache` holds the last prefix and its datetime.
+        """
+        if line.startswith('{"t":{"$date":"'):
+            # LOGV2: {"t":{"$date":"2020-05-06T10:23:32.123+00:00"}, ...
+            ts = line[15:line.find('"', 15)]
+            tokens = None
+        elif line[:4].isdigit():
+            # iso8601: 2014-04-09T23:16:20.437-0400 ...
+            ts = line.split(' ', 1)[0]
+            tokens = None
+        else:
+            # ctime: Wed Dec 31 19:00:00.000 ...
+            tokens = line.split(None, 4)
+            if len(tokens) < 4:
+                return None
+            ts = tokens[3]
+
+        if tokens is None:
+            if len(ts) < 23 or ts[19] != '.':
+                return None
+            key = ts[:19] + ts[23:]
+            ms = ts[20:23]
+        else:
+            key = ' '.join(tokens[:3] + [ts[:8]])
+            ms = ts[9:12] if ts[8:9] == '.' else '000'
+
+        if cache[0] != key:
             try:
+                if tokens is None:
+                    dt = parser._match_datetime_pattern(
+                        [ts[:19] + '.000' + ts[23:]])
+                else:
+                    dt = parser._match_datetime_pattern(tokens[:3] +
+                                                        [ts[:8]])
+            except (ValueError, OverflowError):
+                dt = None
+            cache[0], cache[1] = key, dt
+
+        dt = cache[1]
+        if dt is None or not ms.isdigit():
+            return dt
+        return dt.replace(microsecond=int(ms) * 1000)
+
+    def poll(self, max_lines=None):
+        """
+        Return a list of LogEvents for all lines appended since the last call.
+
+        Only complete lines are returned, a partially written last line is
+        kept until the rest of it arrives. If the file was rotated (the path
+        now points to a different file) or truncated, it is reopened and
+        reading continues from its beginning. At most `max_lines` events are
+        returned if given. Never blocks for files, use follow() for stdin.
+        """
+        self._calculate_bounds()
+
+        events = []
+        while max_lines is None or len(events) < max_lines:
+            line = self.filehandle.readline()
+            if not line:
+                if not events and self._reopen_if_rotated():
+                    continue
+                return events
+
+            if self._follow_buffer:
+                line = self._follow_buffer + line
+                self._follow_buffer = None
+            if not line.endswith(b'\n' if isinstance(line, bytes) else '\n'):
+                # wait for the rest of the line
+                self._follow_buffer = line
+                continue
+
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', 'replace')
+            events.append(self._logevent(line.rstrip('\n')))
+        return events
+
+    def _reopen_if_rotated(self):
+        """Reopen or rewind the file after rotation or truncation."""
+        if self.from_stdin:
+            return False
+        try:
+            stat = os.stat(self.name)
+        except OSError:
+            # rotated away, new file not created yet
+            return False
+
+        current = os.fstat(self.filehandle.fileno())
+        if (stat.st_ino, stat.st_dev) != (current.st_ino, current.st_dev):
+            self.filehandle.close()
+            self.filehandle = open(self.name, 'rb')
+        elif stat.st_size < self.filehandle.tell():
+            self.filehandle.seek(0)
+        else:
+            return False
+
+        self._follow_buffer = None
+        self._datetime_format = None
+        self._datetime_nextpos = None
+        return True
+
+    def seek_end(self):
+        """Move to the end of the file, so poll() only returns new lines."""
+        self.filehandle.seek(0, os.SEEK_END)
+        self._follow_buffer = None
+
+    def follow(self, poll_interval=1.0, from_end=False):
+        """
+        Generator over the LogEvents of a growing log file, like `tail -F`.
+
+        Yields the remaining lines from the current position (or only new
+        lines if `from_end` is True) and then waits for new lines, checking
+        every `poll_interval` seconds. Log rotation and truncation are
+        handled, see poll(). Only returns at the end of stdin, otherwise
+        stop by closing the generator.
+        """
+        if self.from_stdin:
+            # reading from stdin blocks until new lines arrive anyway
+            for le in self:
                 yield le
-            except StopIteration:
-                return
+            return
+
+        if from_end:
+            self.seek_end()
+
+        while True:
+            events = self.poll()
+            if not events:
+                time.sleep(poll_interval)
+                continue
+            for le in events:
+                yield le
+
+    # number of bytes scanned for metadata when seek sampling is enabled
+    sample_head_bytes = 1024 * 1024
 
     states = (['PRIMARY', 'SECONDARY', 'DOWN', 'STARTUP', 'STARTUP2',
                'RECOVERING', 'ROLLBACK', 'ARBITER', 'UNKNOWN'])
@@ -616,6 +1048,11 @@ class LogFile(InputSource):
         self._restarts = []
         self._rs_state = []
 
+        # with seek sampling, only look at the head of the file and
+        # extrapolate the number of lines from there
+        head_limit = (self.sample_head_bytes
+                      if self._sample_mode == 'seek' else None)
+
         ln = 0
         for ln, line in enumerate(self.filehandle):
             if isinstance(line, bytes):
@@ -626,13 +1063,120 @@ class LogFile(InputSource):
             else:
                 self.__extract_metadata_legacy(line)
 
+            if head_limit and self.filehandle.tell() >= head_limit:
+                break
+
         self._num_lines = ln + 1
 
+        if head_limit and self.filehandle.tell() < self.filesize:
+            self._num_lines = int(round(self._num_lines * self.filesize /
+                                        float(self.filehandle.tell())))
+            self._num_lines_estimated = True
+
         # reset logfile
         self.filehandle.seek(0)
 
+    # metadata gathered by _iterate_lines(), see metadata_state()
+    metadata_fields = ['num_lines', 'restarts', 'rs_state', 'has_level',
+                       'binary', 'clusterrole', 'hostname', 'port',
+                       'repl_set', 'repl_set_members', 'repl_set_version',
+                       'repl_set_protocol', 'storage_engine']
+
+    def metadata_state(self):
+        """Return the metadata of the lines read so far as picklable dict."""
+        return dict((field, getattr(self, '_' + field))
+                    for field in self.metadata_fields)
+
+    def resume_metadata(self, state, start, end):
+        """
+        Gather the metadata of the lines in the byte range [start, end).
+
+        Continues from the metadata_state() of the lines before start, or
+        starts from scratch if state is None. Only reads the new lines of a
+        growing log file this way. Files only.
+        """
+        if state is None:
+            self._num_lines = 0
+            self._restarts = []
+            self._rs_state = []
+        else:
+            for field in self.metadata_fields:
+                setattr(self, '_' + field, state[field])
+
+        self.filehandle.seek(start)
+        while self.filehandle.tell() < end:
+            line = self.filehandle.readline()
+            if isinstance(line, bytes):
+                line = line.decode("utf-8", "replace")
+
+            if self.logformat == LogFormat.LOGV2:
+                self.__extract_metadata_logv2(line)
+            else:
+                self.__extract_metadata_legacy(line)
+            self._num_lines += 1
+
+        self.filehandle.seek(0)
+
+    # cache of the bounds of log files on disk, see _calculate_bounds()
+    bounds_cache = FileCache('bounds')
+
+    bounds_fields = ['start', 'end', 'timezone', 'datetime_format',
+                     'datetime_nextpos', 'logformat', 'filesize',
+                     'year_rollover']
+
+    def _bounds_to_cache(self):
+        """Return the calculated bounds as JSON-serializable dict."""
+        value = {}
+        for field in self.bounds_fields:
+            v = getattr(self, '_' + field)
+            if isinstance(v, datetime):
+                v = {'datetime': v.strftime('%Y-%m-%dT%H:%M:%S.%f'),
+                     'tz': self._tz_to_cache(v.tzinfo)}
+            elif field == 'timezone':
+                v = self._tz_to_cache(v)
+            elif field == 'logformat':
+                v = v.name
+            value[field] = v
+        return value
+
+    def _bounds_from_cache(self, value):
+        """Set the bounds from a dict returned by _bounds_to_cache()."""
+        for field in self.bounds_fields:
+            v = value[field]
+            if isinstance(v, dict):
+                v = datetime.strptime(v['datetime'], '%Y-%m-%dT%H:%M:%S.%f')
+                v = v.replace(tzinfo=self._tz_from_cache(value[field]['tz']))
+            elif field == 'timezone':
+                v = self._tz_from_cache(v)
+            elif field == 'logformat':
+                v = LogFormat[v]
+            setattr(self, '_' + field, v)
+
+    @staticmethod
+    def _tz_to_cache(tz):
+        if tz is None:
+            return None
+        if isinstance(tz, tzutc):
+            return 'UTC'
+        if isinstance(tz, tzoffset):
+            return int(tz.utcoffset(None).total_seconds())
+        raise ValueError("can't cache timezone %s" % tz)
+
+    @staticmethod
+    def _tz_from_cache(tz):
+        if tz is None:
+            return None
+        if tz == 'UTC':
+            return tzutc()
+        return tzoffset(None, tz)
+
     def _calculate_bounds(self):
-        """Calculate beginning and end of logfile."""
+        """
+        Calculate beginning and end of logfile.
+
+        The result is cached on disk for regular files, and the file
+        position is left unchanged.
+        """
         if self._bounds_calculated:
             # Assume no need to recalc bounds for lifetime of a Logfile object
             return
@@ -640,6 +1184,15 @@ class LogFile(InputSource):
         if self.from_stdin:
             return False
 
+        cached = self._cached_bounds()
+        if cached:
+            self._bounds_from_cache(cached)
+            self._bounds_calculated = True
+            return True
+
+        position = self.filehandle.tell()
+        self.filehandle.seek(0)
+
         # we should be able to find a valid log line within max_start_lines
         max_start_lines = 10
         lines_checked = 0
@@ -689,11 +1242,30 @@ class LogFile(InputSource):
             self._year_rollover = False
 
         # reset logfile
-        self.filehandle.seek(0)
+        self.filehandle.seek(position)
         self._bounds_calculated = True
 
+        if os.path.isfile(self.name):
+            try:
+                self.bounds_cache.put(self.name, self._bounds_to_cache())
+            except ValueError:
+                pass
+
         return True
 
+    def _cached_bounds(self):
+        """Return the cached bounds of this file, if any."""
+        if not os.path.isfile(self.name):
+            return None
+        try:
+            if (os.fstat(self.filehandle.fileno()).st_ino !=
+                    os.stat(self.name).st_ino):
+                # the path now points to a different file
+                return None
+        except (OSError, AttributeError, ValueError):
+            return None
+        return self.bounds_cache.get(self.name)
+
     def _find_curr_line(self, prev=False):
         """
         Internal helper function.
@@ -957,49 +1529,193 @@ class LogFile(InputSource):
         """
         Fast-forward file to given start_dt datetime obj using binary search.
 
-        Only fast for files. Streams need to be forwarded manually, and it will
-        miss the first line that would otherwise match (as it consumes the log
-        line).
+        Only uses binary search for files. For stdin, the next iteration skips
+        all lines before start_dt, only looking at their timestamp prefix.
         """
         if self.from_stdin:
-            # skip lines until start_dt is reached
+            # skip lines until start_dt is reached, when iterating
+            self._skip_until = start_dt
             return
 
+        self.filehandle.seek(self.offset_of(start_dt))
+
+    def set_end_limit(self, end_dt):
+        """
+        Stop iterating at the first line after end_dt.
+
+        Uses binary search to find the byte offset of that line up front, so
+        the lines after it are never read. Has no effect on stdin.
+        """
+        if self.from_stdin:
+            return
+        self._end_offset = self.offset_of(end_dt, after=True)
+
+    def set_range(self, start, end=None):
+        """
+        Only iterate over the lines in the byte range [start, end).
+
+        Both offsets must be at the start of a line, see offset_of() and
+        split_ranges(). Like fast_forward(), the start only applies to the
+        next iteration. Files only.
+        """
+        self.filehandle.seek(start)
+        self._end_offset = end
+
+    def iter_ranges(self, ranges):
+        """
+        Iterate over the lines of several byte ranges, see set_range().
+
+        The ranges are limited to the current position and end limit, so
+        they can be combined with fast_forward() and set_end_limit().
+        """
+        first = self.filehandle.tell()
+        end_offset = self._end_offset
+        try:
+            for start, end in ranges:
+                start = max(start, first)
+                if end_offset is not None:
+                    end = min(end, end_offset)
+                if start >= end:
+                    continue
+                self.set_range(start, end)
+                for le in self:
+                    yield le
+        finally:
+            self._end_offset = end_offset
+
+    def byte_range(self, start_dt=None, end_dt=None):
+        """
+        Return the byte range [start, end) of the lines from start_dt to end_dt.
+
+        Both bounds are optional and found with binary search.
+        """
+        start = self.offset_of(start_dt) if start_dt is not None else 0
+        end = (self.offset_of(end_dt, after=True) if end_dt is not None
+               else self.filesize)
+        return start, max(start, end)
+
+    def split_ranges(self, n, start=0, end=None):
+        """
+        Split the byte range [start, end) into at most n ranges of whole lines.
+
+        The ranges have about the same size and can be read independently
+        with set_range(). Empty ranges are left out.
+        """
+        if end is None:
+            end = self.filesize
+        pos = self.filehandle.tell()
+        try:
+            bounds = [start]
+            for i in range(1, n):
+                offset = start + (end - start) * i // n
+                if offset <= bounds[-1]:
+                    continue
+                # move to the start of the next line
+                self.filehandle.seek(offset - 1)
+                if self.filehandle.read(1) not in (b'\n', '\n'):
+                    self.filehandle.readline()
+                bounds.append(min(self.filehandle.tell(), end))
+            bounds.append(end)
+        finally:
+            self.filehandle.seek(pos)
+
+        return [(s, e) for s, e in zip(bounds, bounds[1:]) if s < e]
+
+    def complete_end(self, chunk_size=64 * 1024):
+        """
+        Return the byte offset after the last complete line of the file.
+
+        A partially written last line is left out, like with poll(). Keeps
+        the current file position. Files only.
+        """
+        pos = self.filehandle.tell()
+        end = os.fstat(self.filehandle.fileno()).st_size
+        try:
+            while end > 0:
+                start = max(end - chunk_size, 0)
+                self.filehandle.seek(start)
+                newline = self.filehandle.read(end - start).rfind(b'\n')
+                if newline != -1:
+                    return start + newline + 1
+                end = start
+            return 0
+        finally:
+            self.filehandle.seek(pos)
+
+    def offset_of(self, dt, after=False):
+        """
+        Return the byte offset of the first line at or after dt.
+
+        With after=True, return the offset of the first line strictly after
+        dt instead. Lines without a timestamp belong to the line before them.
+        Uses binary search and keeps the current file position. Returns the
+        file size if there is no such line. Files only.
+        """
+        if after:
+            def reached(le_dt):
+                return le_dt > dt
         else:
-            # fast bisection path
-            max_mark = self.filesize
-            step_size = max_mark
+            def reached(le_dt):
+                return le_dt >= dt
 
-            # check if start_dt is already smaller than first datetime
-            self.filehandle.seek(0)
-            le = self.next()
-            if le.datetime and le.datetime >= start_dt:
-                self.filehandle.seek(0)
-                return
+        pos = self.filehandle.tell()
+        self.prev_pos = None
+        try:
+            self._bisect(reached)
 
-            le = None
-            self.filehandle.seek(0)
+            # the bisection stops in front of the first line reached, walk
+            # forward to it
+            offset = self.filehandle.tell()
+            while True:
+                le = self.next()
+                if le.datetime and reached(le.datetime):
+                    return offset
+                offset = self.filehandle.tell()
+        except StopIteration:
+            return self.filesize
+        finally:
+            self.filehandle.seek(pos)
 
-            # search for lower bound
-            while abs(step_size) > 100:
-                step_size = ceil(step_size / 2.)
+    def _bisect(self, reached):
+        """
+        Move the file position in front of the first line `reached` by dt.
 
-                self.filehandle.seek(step_size, 1)
-                le = self._find_curr_line()
-                if not le:
-                    break
+        The position is at the start of a line, but can be a few lines before
+        the first line that is reached.
+        """
+        max_mark = self.filesize
+        step_size = max_mark
 
-                if le.datetime >= start_dt:
-                    step_size = -abs(step_size)
-                else:
-                    step_size = abs(step_size)
+        # check if start_dt is already smaller than first datetime
+        self.filehandle.seek(0)
+        le = self.next()
+        if le.datetime and reached(le.datetime):
+            self.filehandle.seek(0)
+            return
+
+        le = None
+        self.filehandle.seek(0)
+
+        # search for lower bound
+        while abs(step_size) > 100:
+            step_size = ceil(step_size / 2.)
 
+            self.filehandle.seek(step_size, 1)
+            le = self._find_curr_line()
             if not le:
-                return
+                break
+
+            if reached(le.datetime):
+                step_size = -abs(step_size)
+            else:
+                step_size = abs(step_size)
+
+        if not le:
+            return
 
-            # now walk backwards until we found a truly smaller line
-            while self.filehandle.tell() >= 2 and (le.datetime is None or
-                                                   le.datetime >= start_dt):
-                self.filehandle.seek(-2, 1)
+        # now walk backwards until we found a truly smaller line
+        while self.filehandle.tell() >= 2 and (le.datetime is None or
+                                               reached(le.datetime)):
+            self.filehandle.seek(-2, 1)
 
-                le = self._find_curr_line(prev=True)
+            le = self._find_curr_line(prev=True)
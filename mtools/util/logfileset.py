@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""Set of rotated log files that is read as one time-ordered stream."""
+
+import glob
+import os
+import re
+from datetime import datetime
+
+from dateutil.tz import tzutc
+
+from mtools.util.input_source import InputSource
+from mtools.util.logfile import LogFile
+from mtools.util.logindex import LogIndex
+
+
+class LogFileSetMember(object):
+    """
+    One file of a LogFileSet.
+
+    Knows the time bounds of the file without opening it if the file name
+    carries a rotation timestamp, otherwise they are read from the file once
+    and then cached.
+    """
+
+    # suffix that mongod appends on log rotation, in UTC
+    rotation_pattern = re.compile(r'\.(\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2})Z?$')
+
+    # suffix that logrotate appends, higher numbers are older
+    number_pattern = re.compile(r'\.(\d+)$')
+
+    def __init__(self, path):
+        self.path = path
+        self.rotated = None
+        self.number = 0
+
+        match = self.rotation_pattern.search(path)
+        if match:
+            self.rotated = datetime.strptime(match.group(1),
+                                             '%Y-%m-%dT%H-%M-%S')
+            self.rotated = self.rotated.replace(tzinfo=tzutc())
+        else:
+            match = self.number_pattern.search(path)
+            if match:
+                self.number = int(match.group(1))
+
+        # lower bound of the first timestamp, from the previous rotation
+        self.after = None
+
+        self._start = None
+        self._end = None
+
+    @property
+    def sort_key(self):
+        """Order by rotation time, the current (unrotated) file goes last."""
+        return (self.rotated is None and self.number == 0,
+                self.rotated or datetime.min.replace(tzinfo=tzutc()),
+                -self.number, self.path)
+
+    def open(self):
+        """Return a new LogFile object for this file."""
+        return LogFile(open(self.path, 'rb'))
+
+    def _read_bounds(self):
+        logfile = self.open()
+        try:
+            self._start, self._end = logfile.start, logfile.end
+        finally:
+            logfile.filehandle.close()
+
+    @property
+    def start(self):
+        """Return the first timestamp of the file (opens it once)."""
+        if self._start is None:
+            self._read_bounds()
+        return self._start
+
+    @property
+    def end(self):
+        """Return the last timestamp of the file (opens it once)."""
+        if self._end is None:
+            self._read_bounds()
+        return self._end
+
+    def ends_before(self, dt):
+        """Return True if all lines of the file are older than dt."""
+        if self.rotated is not None:
+            return self.rotated < dt
+        return self.end is not None and self.end < dt
+
+    def starts_after(self, dt):
+        """Return True if all lines of the file are newer than dt."""
+        if self.after is not None:
+            return self.after > dt
+        return self.start is not None and self.start > dt
+
+
+class LogFileSet(InputSource):
+    """
+    Rotated log files of one process, read as one logical log file.
+
+    Created from a directory or a glob pattern. The files are ordered by their
+    rotation suffix and read one after the other, not merged. Files that lie
+    entirely before fast_forward() or after set_end_limit() are skipped
+    without reading them. Other log file properties (host, version, ...) are
+    those of the most recent file.
+    """
+
+    def __init__(self, paths, name=None):
+        """Create the set from a list of file paths."""
+        self.members = sorted((LogFileSetMember(path) for path in paths),
+                              key=lambda member: member.sort_key)
+        if not self.members:
+            raise ValueError("no log files found.")
+
+        # each rotation timestamp is a lower bound for the next file
+        for prev, member in zip(self.members, self.members[1:]):
+            member.after = prev.rotated
+
+        self.name = name or self.members[-1].path
+        self.from_stdin = False
+
+        self._start_limit = None
+        self._end_limit = None
+        self._latest = None
+        self._sample = None
+        self._sample_logfiles = []
+
+    @classmethod
+    def from_path(cls, path):
+        """
+        Return a LogFileSet for a directory or glob pattern, else None.
+
+        A directory includes all regular files in it, except index files.
+        """
+        if os.path.isdir(path):
+            paths = [os.path.join(path, name)
+                     for name in sorted(os.listdir(path))]
+        elif not os.path.exists(path) and glob.has_magic(path):
+            paths = glob.glob(path)
+        else:
+            return None
+
+        # leave out sidecar index files
+        paths = [p for p in paths if os.path.isfile(p) and
+                 not p.endswith(LogIndex.suffix)]
+        if not paths:
+            return None
+        return cls(paths, name=path)
+
+    @property
+    def latest(self):
+        """Return the LogFile object of the most recent file."""
+        if self._latest is None:
+            self._latest = self.members[-1].open()
+        return self._latest
+
+    # log file properties that are taken from the most recent file
+    delegated = frozenset(['logformat', 'timezone', 'datetime_format',
+                           'has_level', 'year_rollover', 'restarts',
+                           'rs_state', 'binary', 'clusterrole', 'hostname',
+                           'port', 'versions', 'repl_set', 'repl_set_members',
+                           'repl_set_version', 'repl_set_protocol',
+                           'storage_engine', 'shards', 'csrs',
+                           'chunks_moved_to', 'chunks_moved_from',
+                           'chunk_splits', 'num_lines_estimated'])
+
+    def __getattr__(self, name):
+        """Delegate other log file properties to the most recent file."""
+        if name not in self.delegated:
+            raise AttributeError(name)
+        return getattr(self.latest, name)
+
+    @property
+    def filesize(self):
+        """Return the total size of all files."""
+        return sum(os.path.getsize(member.path) for member in self.members)
+
+    @property
+    def start(self):
+        """Return the first timestamp of the oldest file."""
+        return self.members[0].start
+
+    @property
+    def end(self):
+        """Return the last timestamp of the most recent file."""
+        return self.members[-1].end
+
+    def __len__(self):
+        """Return the number of lines of all files."""
+        total = 0
+        for member in self.members:
+            logfile = member.open()
+            total += len(logfile)
+            logfile.filehandle.close()
+        return total
+
+    def fast_forward(self, start_dt):
+        """Skip all lines older than start_dt, including whole files."""
+        self._start_limit = start_dt
+
+    def set_end_limit(self, end_dt):
+        """Skip all files and lines newer than end_dt."""
+        self._end_limit = end_dt
+
+    def selected_members(self):
+        """Return the members within the start and end limits, in order."""
+        members = self.members
+        if self._start_limit is not None:
+            members = [m for m in members
+                       if not m.ends_before(self._start_limit)]
+        if self._end_limit is not None:
+            members = [m for m in members
+                       if not m.starts_after(self._end_limit)]
+        return members
+
+    def set_sample(self, **kwargs):
+        """Sample each file, see LogFile.set_sample()."""
+        # check arguments right away
+        self.latest.set_sample(**kwargs)
+        self._sample = kwargs
+
+    @property
+    def sample_counts(self):
+        """Return sampled and total units of all files of the last pass."""
+        counts = [lf.sample_counts for lf in self._sample_logfiles]
+        return (sum(c[0] for c in counts), sum(c[1] for c in counts))
+
+    @property
+    def sample_fraction(self):
+        """Return the fraction of all files covered by the sample."""
+        if not self._sample or all(self._sample.get(mode) is None
+                                   for mode in ('rate', 'lines', 'seek')):
+            return None
+        if self._sample.get('rate') is not None:
+            return self._sample['rate']
+        sampled, total = self.sample_counts
+        if not total:
+            return None
+        return min(1., float(sampled) / total)
+
+    def _open_member(self, index, member):
+        logfile = member.open()
+        if self._sample:
+            sample = dict(self._sample)
+            if sample.get('seed') is not None:
+                # different, but reproducible samples for each file
+                sample['seed'] += index
+            logfile.set_sample(**sample)
+            self._sample_logfiles.append(logfile)
+        return logfile
+
+    def __iter__(self):
+        """Iterate over the LogEvents of all selected files in order."""
+        self._sample_logfiles = []
+        for i, member in enumerate(self.selected_members()):
+            logfile = self._open_member(i, member)
+            try:
+                if i == 0 and self._start_limit is not None:
+                    logfile.fast_forward(self._start_limit)
+                if self._end_limit is not None:
+                    logfile.set_end_limit(self._end_limit)
+                for logevent in logfile:
+                    yield logevent
+            finally:
+                logfile.filehandle.close()
+
+    def follow(self, poll_interval=1.0, from_end=False):
+        """Read all selected files and then follow the most recent one."""
+        if not from_end:
+            members = self.selected_members()
+            if members and members[-1] is self.members[-1]:
+                members = members[:-1]
+            for i, member in enumerate(members):
+                logfile = member.open()
+                try:
+                    if i == 0 and self._start_limit is not None:
+                        logfile.fast_forward(self._start_limit)
+                    for logevent in logfile:
+                        yield logevent
+                finally:
+                    logfile.filehandle.close()
+
+        latest = self.members[-1].open()
+        if not from_end and self._start_limit is not None:
+            latest.fast_forward(self._start_limit)
+        for logevent in latest.follow(poll_interval, from_end):
+            yield logevent
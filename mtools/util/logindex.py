@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""Sidecar index of a log file, mapping field values to blocks of lines."""
+
+import base64
+import hashlib
+import json
+import os
+import tempfile
+
+from mtools.util.logevent import LogEvent
+
+
+def encode_postings(numbers):
+    """Encode a sorted list of non-negative integers as delta varints."""
+    out = bytearray()
+    prev = 0
+    for number in numbers:
+        delta = number - prev
+        prev = number
+        while delta >= 0x80:
+            out.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_postings(data):
+    """Decode delta varints back into a sorted list of integers."""
+    numbers = []
+    prev = 0
+    delta = 0
+    shift = 0
+    for byte in bytearray(data):
+        delta |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        prev += delta
+        numbers.append(prev)
+        delta = 0
+        shift = 0
+    return numbers
+
+
+class LogIndex(object):
+    """
+    Inverted index of a log file, stored next to it as `<logfile>.mtindex`.
+
+    The file is divided into blocks of whole lines of about `block_size`
+    bytes. For each namespace, thread (and conn id), component and query
+    pattern the index stores the blocks that contain it, as delta varint
+    encoded lists. A query returns the byte ranges of the blocks that can
+    contain matching lines, the lines still have to be filtered.
+
+    The index covers the file up to `size` bytes. It is fresh as long as the
+    file only grew, which is checked with the size and a hash of the first
+    bytes. update() then only indexes the new lines, lines after `size` are
+    not indexed and have to be read anyway.
+    """
+
+    suffix = '.mtindex'
+    version = 1
+
+    # default number of bytes per block
+    block_size = 64 * 1024
+
+    # number of bytes at the start of the file that identify it
+    head_bytes = 4096
+
+    def __init__(self, logpath, block_size=None):
+        """Create an empty index for the log file at logpath."""
+        self.logpath = logpath
+        self.block_size = block_size or self.block_size
+        self.size = 0
+        self.head = None
+        # start offsets of the blocks
+        self.blocks = []
+        self.postings = {}
+
+    @classmethod
+    def path_for(cls, logpath):
+        """Return the path of the index file of a log file."""
+        return logpath + cls.suffix
+
+    @classmethod
+    def load(cls, logpath):
+        """Return the index of a log file, or None if there is none."""
+        try:
+            with open(cls.path_for(logpath)) as f:
+                doc = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if doc.get('version') != cls.version:
+            return None
+
+        index = cls(logpath, doc['block_size'])
+        index.size = doc['size']
+        index.head = doc['head']
+        index.blocks = decode_postings(base64.b64decode(doc['blocks']))
+        index.postings = dict((key, decode_postings(base64.b64decode(value)))
+                              for key, value in doc['keys'].items())
+        return index
+
+    def save(self):
+        """Write the index next to the log file, atomically."""
+        doc = {'version': self.version,
+               'block_size': self.block_size,
+               'size': self.size,
+               'head': self.head,
+               'blocks': self._b64(self.blocks),
+               'keys': dict((key, self._b64(numbers))
+                            for key, numbers in self.postings.items())}
+        path = self.path_for(self.logpath)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                   suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(doc, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    @staticmethod
+    def _b64(numbers):
+        return base64.b64encode(encode_postings(numbers)).decode('ascii')
+
+    def _head_hash(self, filehandle, size):
+        filehandle.seek(0)
+        head = filehandle.read(min(size, self.head_bytes))
+        return hashlib.sha1(head).hexdigest()
+
+    def is_fresh(self):
+        """Return True if the log file only grew since the index was built."""
+        try:
+            size = os.path.getsize(self.logpath)
+            if size < self.size:
+                return False
+            with open(self.logpath, 'rb') as f:
+                return self._head_hash(f, self.size) == self.head
+        except OSError:
+            return False
+
+    @staticmethod
+    def keys(logevent):
+        """Return the index keys of a log event."""
+        keys = []
+        if logevent.namespace:
+            keys.append('namespace:' + logevent.namespace)
+        if logevent.thread:
+            keys.append('thread:' + logevent.thread)
+        if logevent.conn and logevent.conn != logevent.thread:
+            # --thread also matches connection ids
+            keys.append('thread:' + logevent.conn)
+        if logevent.component:
+            keys.append('component:' + logevent.component)
+        if logevent.pattern:
+            keys.append('pattern:' + logevent.pattern)
+        return keys
+
+    def update(self):
+        """
+        Index the lines added to the log file since the last update.
+
+        Starts from scratch if the index is not fresh. Returns the number of
+        bytes indexed.
+        """
+        if self.size and not self.is_fresh():
+            self.size = 0
+            self.blocks = []
+            self.postings = {}
+
+        with open(self.logpath, 'rb') as f:
+            f.seek(self.size)
+            offset = start = self.size
+            if self.blocks:
+                # continue the last block
+                block = len(self.blocks) - 1
+            else:
+                block = 0
+                self.blocks.append(0)
+
+            for line in iter(f.readline, b''):
+                if not line.endswith(b'\n'):
+                    # partially written, index it with the next update
+                    break
+
+                if offset - self.blocks[block] >= self.block_size:
+                    block += 1
+                    self.blocks.append(offset)
+                offset += len(line)
+
+                logevent = LogEvent(line.decode('utf-8', 'replace')
+                                    .rstrip('\n'))
+                for key in self.keys(logevent):
+                    numbers = self.postings.setdefault(key, [])
+                    if not numbers or numbers[-1] != block:
+                        numbers.append(block)
+
+            self.size = offset
+            self.head = self._head_hash(f, self.size)
+        return self.size - start
+
+    def ranges(self, key_groups):
+        """
+        Return the byte ranges that can contain lines matching the keys.
+
+        `key_groups` is a list of lists of keys, a line has to have at least
+        one key of every group. The ranges include everything after the
+        indexed part of the file.
+        """
+        end = os.path.getsize(self.logpath)
+
+        selected = None
+        for group in key_groups:
+            blocks = set()
+            for key in group:
+                blocks.update(self.postings.get(key, ()))
+            selected = blocks if selected is None else selected & blocks
+        if selected is None:
+            selected = range(len(self.blocks))
+
+        bounds = self.blocks + [self.size]
+        ranges = []
+        for block in sorted(selected):
+            ranges.append([bounds[block], bounds[block + 1]])
+        ranges.append([self.size, end])
+
+        # merge adjacent ranges
+        merged = []
+        for s, e in ranges:
+            if s >= e:
+                continue
+            if merged and merged[-1][1] == s:
+                merged[-1][1] = e
+            else:
+                merged.append([s, e])
+        return [tuple(r) for r in merged]
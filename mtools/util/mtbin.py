@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Binary interchange format for piping parsed log events between mtools.
+
+An mtbin stream starts with MAGIC, followed by frames. Each frame is a 4 byte
+big-endian length and a UTF-8 encoded JSON document of that length. The first
+frame is the header with the source name, its start and end and other log
+file properties, every other frame is one log event with all fields that
+were parsed upstream, so the downstream tool does not parse the line again.
+"""
+
+import json
+import os
+import struct
+import tempfile
+from datetime import datetime
+
+from dateutil.parser import isoparse
+
+from mtools.util.input_source import InputSource
+from mtools.util.logevent import LogEvent
+from mtools.util.logformat import LogFormat
+
+MAGIC = b'MTBIN1\n'
+
+_length = struct.Struct('>I')
+
+# log file properties that are passed on in the header
+header_fields = ['logformat', 'datetime_format', 'has_level', 'binary',
+                 'clusterrole', 'hostname', 'port', 'versions', 'repl_set',
+                 'repl_set_version', 'repl_set_protocol', 'storage_engine']
+
+# log event attributes that are cheaper to recalculate than to pass on
+_skipped = frozenset(['_split_tokens', '_split_tokens_calculated',
+                      '_full_line_str', '_client_metadata',
+                      '_client_metadata_calculated'])
+
+# attributes that every LogEvent sets in __init__, left out at these values
+_instance_defaults = {'_debug': False, '_doc': {}, '_year_rollover': False,
+                      'from_string': True, 'logformat': LogFormat.LEGACY}
+
+# flags of the lazily parsed fields, event_state() parses nearly all of them,
+# so only the ones that are still False are passed on (as '$lazy')
+_calculated = frozenset(key for key in dir(LogEvent)
+                        if key.endswith('_calculated') and
+                        key not in _skipped)
+
+_missing = object()
+
+
+def is_mtbin(stream):
+    """Return True if a binary stream starts with MAGIC, without reading."""
+    peek = getattr(stream, 'peek', None)
+    if peek is None:
+        return False
+    try:
+        return peek(len(MAGIC))[:len(MAGIC)] == MAGIC
+    except (OSError, ValueError):
+        return False
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'$date': value.isoformat()}
+    if isinstance(value, LogFormat):
+        return {'$logformat': value.name}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and len(value) == 1:
+        if '$date' in value:
+            # dateutil timezones, like the ones of the parsed log file
+            return isoparse(value['$date'])
+        if '$logformat' in value:
+            return LogFormat[value['$logformat']]
+    return value
+
+
+def _is_default(key, value):
+    default = _instance_defaults.get(key, _missing)
+    if default is _missing:
+        default = getattr(LogEvent, key, _missing)
+        if isinstance(default, property):
+            return False
+    return type(value) is type(default) and value == default
+
+
+def event_state(logevent):
+    """
+    Return the parsed fields of a log event as JSON-serializable dict.
+
+    Fields at their default value and a line_str that can be joined from the
+    line again are left out, so a frame stays close to the size of the line.
+    """
+    logevent.parse_all()
+    # trigger the remaining lazily parsed fields
+    logevent.command
+    logevent.conn
+    logevent.level
+    logevent.planSummary
+    logevent.line_str
+
+    fields = logevent.__dict__
+    state = dict((key, _encode(value))
+                 for key, value in fields.items()
+                 if key not in _skipped and key not in _calculated and
+                 value is not None and not _is_default(key, value))
+    lazy = sorted(key for key in _calculated if not fields.get(key))
+    if lazy:
+        state['$lazy'] = lazy
+    if (logevent.from_string and '_line_str' in state and
+            state['_line_str'] == ' '.join(
+                logevent.split_tokens[logevent._message_pos:])):
+        del state['_line_str']
+    return state
+
+
+def event_from_state(state):
+    """Return a LogEvent with the fields of event_state(), not parsed."""
+    logevent = LogEvent.__new__(LogEvent)
+    # start from the defaults of a legacy log line, then overwrite
+    logevent._line = ''
+    logevent._line_str = None
+    logevent._reset()
+    logevent.__dict__.update(_instance_defaults)
+    logevent._doc = {}
+    lazy = state.pop('$lazy', ())
+    logevent.__dict__.update((key, key not in lazy) for key in _calculated)
+    logevent.__dict__.update((key, _decode(value))
+                             for key, value in state.items())
+    if logevent._line_str is None and not logevent.from_string:
+        logevent._line_str = ''
+    return logevent
+
+
+class MtbinWriter(object):
+    """Write log events to a binary stream in mtbin format."""
+
+    def __init__(self, stream, header):
+        """Write MAGIC and the header dict, see header_for()."""
+        self.stream = stream
+        self.stream.write(MAGIC)
+        self._write_frame(header)
+
+    def _write_frame(self, doc):
+        try:
+            data = json.dumps(doc, separators=(',', ':'))
+        except TypeError:
+            # leave out fields that have no JSON representation
+            doc = dict((key, value) for key, value in doc.items()
+                       if self._serializable(value))
+            data = json.dumps(doc, separators=(',', ':'))
+        data = data.encode('utf-8')
+        self.stream.write(_length.pack(len(data)))
+        self.stream.write(data)
+
+    @staticmethod
+    def _serializable(value):
+        try:
+            json.dumps(value)
+        except TypeError:
+            return False
+        return True
+
+    def write(self, logevent):
+        """Write one log event."""
+        self._write_frame(event_state(logevent))
+
+    def flush(self):
+        self.stream.flush()
+
+    @staticmethod
+    def header_for(logfiles):
+        """Return the header for the events read from a list of log files."""
+        starts = [lf.start for lf in logfiles if lf.start]
+        ends = [lf.end for lf in logfiles if lf.end]
+        header = {'source': ' '.join(lf.name for lf in logfiles),
+                  'start': _encode(min(starts)) if starts else None,
+                  'end': _encode(max(ends)) if ends else None}
+        if len(logfiles) == 1:
+            # the properties of merged log files can differ, leave them out
+            for field in header_fields:
+                header[field] = _encode(getattr(logfiles[0], field, None))
+        return header
+
+
+class MtbinStream(InputSource):
+    """
+    Log events read from an mtbin stream.
+
+    Provides the start, end and other properties of the upstream log file
+    from the header. A stream that can not seek (stdin) is read only once and
+    its length is unknown, unless expect_passes() is called before the first
+    pass: then the frames are spooled to a temporary file while reading, for
+    the later passes.
+    """
+
+    def __init__(self, filehandle):
+        """Read the header from a binary file handle positioned at MAGIC."""
+        self.filehandle = filehandle
+        if filehandle.read(len(MAGIC)) != MAGIC:
+            raise ValueError("not an mtbin stream.")
+
+        data = self._read_data(filehandle)
+        if data is None:
+            raise ValueError("mtbin stream without header.")
+        self.header = json.loads(data.decode('utf-8'))
+
+        self.name = self.header.get('source') or filehandle.name
+        self.from_stdin = False
+        self.start = _decode(self.header.get('start'))
+        self.end = _decode(self.header.get('end'))
+        self.timezone = self.start.tzinfo if self.start else None
+
+        try:
+            self._events_offset = filehandle.tell()
+        except (OSError, ValueError):
+            self._events_offset = None
+        # temporary file with the frames read so far from a stream that can
+        # not seek, and the position where the next frame is written to
+        self._spool = None
+        self._spool_end = 0
+        self._started = False
+        self._complete = False
+
+    def __getattr__(self, name):
+        """Return log file properties of the header, None if unknown."""
+        if name not in header_fields:
+            raise AttributeError(name)
+        value = _decode(self.header.get(name))
+        if value is None and name == 'versions':
+            return []
+        return value
+
+    # properties that are not known for a stream
+    num_lines_estimated = False
+    sample_fraction = None
+    year_rollover = False
+    restarts = []
+    rs_state = []
+    repl_set_members = None
+    shards = []
+    csrs = None
+    chunks_moved_to = []
+    chunks_moved_from = []
+    chunk_splits = []
+
+    @property
+    def filesize(self):
+        try:
+            return os.fstat(self.filehandle.fileno()).st_size
+        except (OSError, ValueError, AttributeError):
+            return None
+
+    @property
+    def num_lines_unknown(self):
+        """Return True if the length can not be known before reading."""
+        return self._events_offset is None and not self._complete
+
+    def expect_passes(self, passes):
+        """Spool a stream that can not seek if it is read more than once."""
+        if (passes > 1 and self._events_offset is None and
+                self._spool is None and not self._started):
+            self._spool = tempfile.TemporaryFile()
+
+    @staticmethod
+    def _read_data(filehandle):
+        data = filehandle.read(_length.size)
+        if len(data) < _length.size:
+            return None
+        length, = _length.unpack(data)
+        data = filehandle.read(length)
+        if len(data) < length:
+            return None
+        return data
+
+    def _read_events(self, filehandle):
+        while True:
+            data = self._read_data(filehandle)
+            if data is None:
+                return
+            yield event_from_state(json.loads(data.decode('utf-8')))
+
+    def _spooled_events(self):
+        spool = self._spool
+        position = 0
+        while True:
+            if position < self._spool_end:
+                # read again what an earlier pass has spooled
+                spool.seek(position)
+                data = self._read_data(spool)
+                position = spool.tell()
+            elif self._complete:
+                return
+            else:
+                data = self._read_data(self.filehandle)
+                if data is None:
+                    self._complete = True
+                    return
+                spool.seek(self._spool_end)
+                spool.write(_length.pack(len(data)))
+                spool.write(data)
+                self._spool_end = position = spool.tell()
+            yield event_from_state(json.loads(data.decode('utf-8')))
+
+    def __iter__(self):
+        """Iterate over the log events of the stream."""
+        if self._events_offset is not None:
+            # seekable, read again from the first event
+            self.filehandle.seek(self._events_offset)
+            return self._read_events(self.filehandle)
+        if self._spool is not None:
+            return self._spooled_events()
+        if self._started:
+            raise ValueError("mtbin stream that can not seek was already "
+                             "read, call expect_passes() before the first "
+                             "pass.")
+        self._started = True
+        return self._read_events(self.filehandle)
+
+    def __len__(self):
+        """Return the number of log events, without decoding them."""
+        if self._events_offset is not None:
+            filehandle, offset = self.filehandle, self._events_offset
+        elif self._complete:
+            filehandle, offset = self._spool, 0
+        else:
+            raise TypeError("length of an mtbin stream that can not seek is "
+                            "unknown before it is read.")
+        filehandle.seek(offset)
+        count = 0
+        while True:
+            data = filehandle.read(_length.size)
+            if len(data) < _length.size:
+                return count
+            length, = _length.unpack(data)
+            filehandle.seek(length, os.SEEK_CUR)
+            count += 1
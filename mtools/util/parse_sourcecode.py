@@ -11,6 +11,7 @@ from distutils.spawn import find_executable
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
 
+from mtools.util.log2code_db import write_db
 from mtools.util.logcodeline import LogCodeLine
 
 # Path to a local git clone from https://github.com/mongodb/mongo.git
@@ -309,6 +310,8 @@ if __name__ == '__main__':
 
     pickle.dump((versions, logs_versions, logs_by_word, log_code_lines),
                  open('log2code.pickle', 'wb'), -1)
+    write_db('log2code.bin', versions, logs_versions, logs_by_word,
+             log_code_lines)
 
-    print("%i unique log messages imported and written to log2code.pickle"
-          % len(log_code_lines))
+    print("%i unique log messages imported and written to log2code.pickle "
+          "and log2code.bin" % len(log_code_lines))
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Streaming summary statistics with bounded memory."""
+
+from math import ceil, floor, log, sqrt
+
+
+class StreamingStats(object):
+    """
+    Summary statistics of a stream of numbers.
+
+    Count, sum, min, max and mean are exact. Percentiles are estimated with a
+    logarithmically bucketed sketch that guarantees the given relative
+    accuracy, so memory only grows with the dynamic range of the values and
+    not with the number of values added. Two sketches with the same accuracy
+    can be merged, which makes partial results from different files or
+    different parts of a file combinable.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        """Create an empty summary."""
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = log(self._gamma)
+
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+        self._zeros = 0
+        self._positive = {}
+        self._negative = {}
+
+    def _key(self, value):
+        return int(ceil(log(value) / self._log_gamma))
+
+    def _value(self, key):
+        return 2 * self._gamma ** key / (self._gamma + 1)
+
+    def add(self, value):
+        """Add a single value to the summary."""
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        if value > 0:
+            key = self._key(value)
+            self._positive[key] = self._positive.get(key, 0) + 1
+        elif value < 0:
+            key = self._key(-value)
+            self._negative[key] = self._negative.get(key, 0) + 1
+        else:
+            self._zeros += 1
+
+    def merge(self, other):
+        """Merge another StreamingStats object into this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("can only merge StreamingStats with the same "
+                             "relative accuracy.")
+        if not other.count:
+            return self
+
+        self.count += other.count
+        self.sum += other.sum
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+
+        self._zeros += other._zeros
+        for key, cnt in other._positive.items():
+            self._positive[key] = self._positive.get(key, 0) + cnt
+        for key, cnt in other._negative.items():
+            self._negative[key] = self._negative.get(key, 0) + cnt
+        return self
+
+    @property
+    def mean(self):
+        """Return the arithmetic mean, or None if no values were added."""
+        if not self.count:
+            return None
+        return self.sum / self.count
+
+    def percentile(self, q):
+        """
+        Return the estimated q-th percentile (0 <= q <= 100).
+
+        Like numpy.percentile, interpolates linearly between the two closest
+        ranks. The lowest and highest rank are the exact min and max, the
+        others are estimated with the relative accuracy.
+        """
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 100:
+            return self.max
+
+        pos = q / 100. * (self.count - 1)
+        rank = int(floor(pos))
+        lower = self._at_rank(rank)
+        if pos == rank:
+            return lower
+        return lower + (self._at_rank(rank + 1) - lower) * (pos - rank)
+
+    def _at_rank(self, rank):
+        """Return the estimated value at a rank of the sorted values."""
+        if rank <= 0:
+            return self.min
+        if rank >= self.count - 1:
+            return self.max
+
+        seen = 0
+        for key in sorted(self._negative, reverse=True):
+            seen += self._negative[key]
+            if seen > rank:
+                return self._clamp(-self._value(key))
+        seen += self._zeros
+        if seen > rank:
+            return self._clamp(0)
+        for key in sorted(self._positive):
+            seen += self._positive[key]
+            if seen > rank:
+                return self._clamp(self._value(key))
+        return self.max
+
+    def _clamp(self, value):
+        return min(max(value, self.min), self.max)
+
+    def __len__(self):
+        """Return the number of values added."""
+        return self.count
+
+
+def scale_count(count, fraction):
+    """
+    Extrapolate a count observed in a random sample to the full population.
+
+    Return a tuple of the estimate and the half-width of its 95% confidence
+    interval, assuming each item was sampled independently with probability
+    `fraction`.
+    """
+    if not fraction or fraction >= 1:
+        return count, 0
+    estimate = count / fraction
+    margin = 1.96 * sqrt(count * (1 - fraction)) / fraction
+    return estimate, margin
+
+
+def sample_note(fraction):
+    """Return a note that statistics were estimated from a sample."""
+    return ("note: estimated from a %.3g%% sample. Counts and sums are "
+            "extrapolated, +/- gives the 95%% confidence margin of the count."
+            % (fraction * 100))